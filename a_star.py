@@ -1,128 +1,263 @@
+## A* ENGINE
+### Path search over the explored map from a position back to the base (0, 0), or to another goal.
+###
+### The edge costs are the time charged by the environment to walk into a cell: COST_LINE or
+### COST_DIAG times its difficulty; walls (difficulty VS.OBST_WALL) and unknown cells cannot be
+### entered. The heuristic is the octile distance to the goal scaled by the minimum difficulty
+### of the map, which never overestimates the cost, so the paths are optimal.
+###
+### The search works on flat integer indices of the bounding box of the map, padded with a
+### border of blocked cells so the neighbors need no bounds checks. The costs and the
+### passable cells are kept per map in an _Engine and updated only with the cells changed
+### since the last search (Map.changed_since); they are rebuilt only when the bounds of the
+### map change. The g/parent buffers are reused between searches: a cell holds a valid
+### g-score only when its stamp equals the number of the current search, so resetting the
+### buffers costs nothing. The open set is a heap of (f, index).
+###
+### To count the expanded nodes with each heuristic:
+###    python a_star.py datasets/data_400v_90x90
+
 import heapq
+import random
+import weakref
+import argparse
+import numpy as np
 from map import Map
-from enum import Enum
-
-
-class Position(Enum):
-    EMPTY = ' '
-    START = 'S'
-    END = 'E'
-    BLOCK = 'B'
-    
-class Node:
-    def __init__(self, position:tuple, difficulty = 1, type = Position.EMPTY):
-        self.x = position[0]
-        self.y = position[1]
-        self.difficulty = difficulty
-        self.type = type
-        self.g = float('inf')  # custo do caminho do ponto inicial até este nó
-        self.h = float('inf')  # estimativa do custo do caminho deste nó até o ponto final
-        self.f = float('inf')  # custo total (f = g + h)
-        self.parent = None
-    
-    def __lt__(self, other):
-        return self.f < other.f
-    
-    def __eq__(self, __value: object) -> bool:
-        return self.x == __value.x and self.y == __value.y
-    
-class Grid:
-    def __init__(self, map:Map, end_position:tuple):
-        self.start_position = (end_position[0], end_position[1])
-        self.end_position = (0,0)
-        self.__g = self.generate_grid(map)
-        
-    def generate_grid(self, map:Map):
-        
-        data = map.map_data
-        
-        self.min_x = min(key[0] for key in data.keys())
-        self.max_x = max(key[0] for key in data.keys())
-        self.min_y = min(key[1] for key in data.keys())
-        self.max_y = max(key[1] for key in data.keys())
-        
-        self.size_x = self.max_x + abs(self.min_x) + 1
-        self.size_y = self.max_y + abs(self.min_y) + 1
-        
-        grid = {}
-        for y in range(self.min_y, self.max_y + 1):
-            for x in range(self.min_x, self.max_x + 1):
-                if (x, y) in data:
-                    grid[(x,y)] = Node((x, y), data[(x, y)][0])
-                else:
-                    grid[(x,y)] = Node((x, y), 100, Position.BLOCK)
-        
-        grid[self.start_position].type = Position.START
-        grid[self.end_position].type = Position.END
-        
-        return grid
-    
-    @property
-    def start_node(self):
-        return self.__g[self.start_position]
-    
+from vs.constants import VS
+
+# increments of the 8 directions
+MOVES = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx != 0 or dy != 0]
+
+
+class _Engine:
+    """ Cost arrays and search buffers of a map, reused by all the searches on the map """
+
+    def __init__(self, map:Map):
+        self.__map = weakref.ref(map)   # weak: the map is the key of the engine in _engines
+        self.epoch = 0
+        self.build()
+
     @property
-    def end_node(self):
-        return self.__g[self.end_position]
-    
-    def get(self, x, y) -> Node:
-        return self.__g[(x, y)]
+    def map(self):
+        return self.__map()
+
+    def build(self):
+        """ Rebuild the arrays for the current bounds of the map """
+        self.min_x, self.max_x, self.min_y, self.max_y = self.map.bounds()
+        self.version = self.map.version
+
+        # padded box: index = (x - min_x + 1) * stride + (y - min_y + 1)
+        width = self.max_x - self.min_x + 3
+        self.stride = self.max_y - self.min_y + 3
+        size = width * self.stride
+
+        _, _, difficulty, _, known = self.map.window()
+        passable = np.zeros((width, self.stride), dtype=bool)
+        passable[1:-1, 1:-1] = known & (difficulty < VS.OBST_WALL)
+        cost = np.zeros((width, self.stride), dtype=np.float64)
+        cost[1:-1, 1:-1] = difficulty
+        self.cost = cost.ravel().tolist()
+        self.passable = passable.ravel().tolist()
+        self.min_difficulty = float(cost[passable].min()) if passable.any() else 1.0
+        self.heuristics = {}         # (heuristic, cost_line, cost_diag) -> list of h per cell towards the base
+        self.uniform_cells = None    # computed on demand (see uniform)
+
+        self.g = [0.0] * size
+        self.parent = [-1] * size
+        self.seen = [0] * size       # == epoch: the cell has a g-score in the current search
+        self.closed = [0] * size     # == epoch: the cell is closed in the current search
+
+    def update(self):
+        """ Bring the arrays up to date with the map: apply the changed cells or rebuild if the bounds changed """
+        if self.map.version == self.version:
+            return
+        if self.map.bounds() != (self.min_x, self.max_x, self.min_y, self.max_y):
+            self.build()
+            return
+
+        changed = []
+        for x, y in self.map.changed_since(self.version):
+            difficulty = self.map.get((x, y))[0]
+            i = self.index(x, y)
+            changed.append(i)
+            self.cost[i] = difficulty
+            self.passable[i] = difficulty < VS.OBST_WALL
+            if self.passable[i] and difficulty < self.min_difficulty:
+                # the heuristics scaled by the former minimum difficulty could overestimate
+                self.min_difficulty = difficulty
+                self.heuristics = {}
+        self.version = self.map.version
+
+        if self.uniform_cells is not None:
+            offsets = [0] + [dx * self.stride + dy for dx, dy in MOVES]
+            for i in {i + offset for i in changed for offset in offsets}:
+                self.uniform_cells[i] = self.passable[i] and all(
+                    not self.passable[i + offset] or self.cost[i + offset] == self.cost[i] for offset in offsets)
+
+    def uniform(self):
+        """ @return: the list of the passable cells whose passable neighbors all have the same difficulty,
+            where the moves of a search are symmetric (see jump_point_search) """
+        if self.uniform_cells is None:
+            shape = (len(self.cost) // self.stride, self.stride)
+            cost = np.array(self.cost).reshape(shape)
+            passable = np.array(self.passable).reshape(shape)
+            inner = (slice(1, -1), slice(1, -1))
+            uniform = passable.copy()
+            for dx, dy in MOVES:
+                around = (slice(1 + dx, shape[0] - 1 + dx), slice(1 + dy, shape[1] - 1 + dy))
+                uniform[inner] &= ~passable[around] | (cost[around] == cost[inner])
+            self.uniform_cells = uniform.ravel().tolist()
+        return self.uniform_cells
+
+    def heuristic(self, name, cost_line, cost_diag, goal=(0, 0)):
+        """ @return: the list of the heuristic of every cell towards the goal; only the lists towards the
+            base (0, 0) are kept, one per goal would take the memory of a map per victim """
+        h = self.heuristics.get((name, cost_line, cost_diag)) if goal == (0, 0) else None
+        if h is None:
+            dx = np.abs(np.arange(self.min_x - 1, self.max_x + 2) - goal[0])[:, np.newaxis]
+            dy = np.abs(np.arange(self.min_y - 1, self.max_y + 2) - goal[1])[np.newaxis, :]
+            if name == "octile":
+                # straight steps for the difference, diagonal steps for the rest
+                diag = min(cost_diag, 2 * cost_line)
+                h = cost_line * np.abs(dx - dy) + diag * np.minimum(dx, dy)
+            elif name == "euclidean":
+                h = min(cost_line, cost_diag / 2 ** 0.5) * np.sqrt(dx ** 2 + dy ** 2)
+            else:
+                h = np.zeros((dx.shape[0], dy.shape[1]))
+            h = (self.min_difficulty * h).ravel().tolist()
+            if goal == (0, 0):
+                self.heuristics[(name, cost_line, cost_diag)] = h
+        return h
+
+    def index(self, x, y):
+        return (x - self.min_x + 1) * self.stride + (y - self.min_y + 1)
+
+    def coord(self, i):
+        x, y = divmod(i, self.stride)
+        return x - 1 + self.min_x, y - 1 + self.min_y
+
+
+# one engine per map, released with the map
+_engines = weakref.WeakKeyDictionary()
+
+
+def engine(map:Map):
+    """ @return: the engine of a map, up to date with its changes """
+    engine = _engines.get(map)
+    if engine is None:
+        engine = _Engine(map)
+        _engines[map] = engine
+    else:
+        engine.update()
+    return engine
+
 
 class AStar:
-    def __init__(self, map:Map, end_position:tuple):
-        self.grid = Grid(map, end_position)
-        self.open_set = []
-        self.closed_set = set()
-        self.start_node = self.grid.start_node
-        self.end_node = self.grid.end_node
-    
-    def euclidean_distance(self, node1:Node, node2:Node):
-        return ((node1.x - node2.x) ** 2 + (node1.y - node2.y) ** 2) ** 0.5
-    
-    def calculate_cost(self, current_node:Node, neighbor:Node):
-        return current_node.g + neighbor.difficulty
-    
-    def get_neighbors(self, node):
-        neighbors = []
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                if dx == 0 and dy == 0:
-                    continue
-                new_x = node.x + dx
-                new_y = node.y + dy
-                if self.grid.min_x <= new_x < self.grid.max_x and self.grid.min_y <= new_y < self.grid.max_y and self.grid.get(new_x,new_y).type != Position.BLOCK:
-                    neighbors.append(self.grid.get(new_x,new_y))
-        return neighbors
-    
-    def reconstruct_path(self, current_node):
+    HEURISTICS = ["octile", "euclidean", "none"]
+
+    def __init__(self, map:Map, end_position:tuple, cost_line=1.0, cost_diag=1.5, heuristic="octile", goal=(0, 0)):
+        """ @param map: the explored map
+            @param end_position: the position the search starts from
+            @param cost_line: cost of a horizontal or vertical step into a cell of difficulty 1
+            @param cost_diag: cost of a diagonal step into a cell of difficulty 1
+            @param heuristic: "octile", "euclidean" or "none" (Dijkstra)
+            @param goal: the position the path goes to (the base by default) """
+        self.engine = engine(map)
+        self.start_position = (end_position[0], end_position[1])
+        self.end_position = (goal[0], goal[1])
+        self.cost_line = cost_line
+        self.cost_diag = cost_diag
+        self.heuristic = heuristic
+        self.cost = None           # cost of the path found in the last run
+        self.expanded = 0          # number of nodes expanded in the last run
+
+    def reconstruct_path(self, current):
+        engine = self.engine
         path = []
-        while current_node is not None:
-            path.append((current_node.x, current_node.y))
-            current_node = current_node.parent
+        while current != -1:
+            path.append(engine.coord(current))
+            current = engine.parent[current]
         return path[::-1]
-    
+
     def run(self):
-        self.start_node.g = 0
-        self.start_node.h = self.euclidean_distance(self.start_node, self.end_node)
-        self.start_node.f = self.start_node.g + self.start_node.h
-        heapq.heappush(self.open_set, self.start_node)
-        
-        while self.open_set:
-            current_node = heapq.heappop(self.open_set)
-            if current_node == self.end_node:
-                return self.reconstruct_path(current_node)
-            
-            self.closed_set.add((current_node.x, current_node.y))
-            for neighbor in self.get_neighbors(current_node):
-                if (neighbor.x, neighbor.y) in self.closed_set:
+        """ @return: the list of positions from the start to the goal (both included), or None """
+        engine = self.engine
+        engine.epoch += 1
+        epoch = engine.epoch
+        cost, passable = engine.cost, engine.passable
+        g, parent, seen, closed = engine.g, engine.parent, engine.seen, engine.closed
+        h = engine.heuristic(self.heuristic, self.cost_line, self.cost_diag, self.end_position)
+        stride = engine.stride
+        moves = [(dx * stride + dy, self.cost_line if dx == 0 or dy == 0 else self.cost_diag) for dx, dy in MOVES]
+
+        self.cost = None
+        self.expanded = 0
+        for x, y in (self.start_position, self.end_position):
+            if not (engine.min_x <= x <= engine.max_x and engine.min_y <= y <= engine.max_y):
+                return None
+
+        start = engine.index(*self.start_position)
+        end = engine.index(*self.end_position)
+        g[start] = 0.0
+        parent[start] = -1
+        seen[start] = epoch
+        heap = [(h[start], start)]
+        expanded = 0
+
+        while heap:
+            _, current = heapq.heappop(heap)
+            if closed[current] == epoch:
+                continue        # outdated entry
+            closed[current] = epoch
+            expanded += 1
+
+            if current == end:
+                self.expanded = expanded
+                self.cost = g[current]
+                return self.reconstruct_path(current)
+
+            gc = g[current]
+            for offset, step in moves:
+                neighbor = current + offset
+                if not passable[neighbor] or closed[neighbor] == epoch:
                     continue
-                
-                tentative_g = current_node.g + self.calculate_cost(current_node, neighbor)
-                if tentative_g < neighbor.g:
-                    neighbor.parent = current_node
-                    neighbor.g = tentative_g
-                    neighbor.h = self.euclidean_distance(neighbor, self.end_node)
-                    neighbor.f = neighbor.g + neighbor.h
-                    heapq.heappush(self.open_set, neighbor)
-        
+
+                tentative_g = gc + step * cost[neighbor]
+                if seen[neighbor] != epoch or tentative_g < g[neighbor]:
+                    seen[neighbor] = epoch
+                    parent[neighbor] = current
+                    g[neighbor] = tentative_g
+                    heapq.heappush(heap, (tentative_g + h[neighbor], neighbor))
+
+        self.expanded = expanded
         return None  # Não foi possível encontrar um caminho
+
+
+if __name__ == '__main__':
+    from vs import scenario
+
+    parser = argparse.ArgumentParser(description="Expanded nodes and path costs of A* with each heuristic")
+    parser.add_argument("data_folder", nargs="?", default="datasets/data_400v_90x90")
+    parser.add_argument("--queries", type=int, default=100, help="number of random start positions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # the whole grid as an explored map, relative to the base
+    data = scenario.load(args.data_folder)
+    obst, (bx, by) = data["obst"], data["config"]["BASE"]
+    m = Map()
+    for x, y in zip(*np.nonzero(obst < VS.OBST_WALL)):
+        m.add((int(x) - bx, int(y) - by), float(obst[x, y]), VS.NO_VICTIM, [VS.CLEAR] * 8)
+
+    rng = random.Random(args.seed)
+    cells = m.coords()
+    starts = [rng.choice(cells) for _ in range(args.queries)]
+    print(f"{args.data_folder}: {len(cells)} cells, {args.queries} queries to the base")
+    for heuristic in AStar.HEURISTICS:
+        expanded = total = 0
+        for start in starts:
+            astar = AStar(m, start, heuristic=heuristic)
+            if astar.run() is not None:
+                total += astar.cost
+            expanded += astar.expanded
+        print(f"   {heuristic:10s} {expanded / args.queries:9.1f} expansions/query   total cost {total:.2f}")
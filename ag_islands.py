@@ -0,0 +1,132 @@
+## AG ISLANDS
+### Island model of ag_path.AGPath: AGPath.NUM_EXECUCOES populations (islands) evolve
+### independently, in this process or in a pool of processes, and, every INTERVALO_MIGRACAO
+### generations, the MIGRANTES best paths of each island replace the worst ones of the next
+### island (a ring).
+### Each island runs AGPath.MAX_GERACOES generations; the result is the best path of all.
+###
+### Every island has its own random generator, seeded from the seed of the run, and its state
+### travels with the island between the processes: the result depends only on the seed, not
+### on the number of processes. The random module is left as it was before the run.
+###
+### The pool is opt-in (workers > 1): rescuer.Rescuer plans in its own process, which may
+### already be one of the processes of batch.py.
+###
+### To compare with a single AGPath (speedup and fitness) on a cluster of data_400v_90x90:
+###    python ag_islands.py datasets/data_400v_90x90 --victims 100 --workers 4
+
+import os
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from ag_path import AGPath
+from map import Map
+
+INTERVALO_MIGRACAO = 5     # gerações entre duas migrações
+MIGRANTES = 2              # melhores caminhos enviados por cada ilha
+
+
+def _evoluir(ilha, geracoes):
+    """ Executa gerações de uma ilha com o gerador aleatório dela
+    @return: a ilha (um AGPath, com o estado do gerador em .estado) """
+    random.setstate(ilha.estado)
+    ilha.executar_geracoes(geracoes)
+    ilha.estado = random.getstate()
+    return ilha
+
+
+class IslandGA:
+    def __init__(self, mapa:Map, energia_inicial, posicao_inicial:tuple, lista_vitimas, ilhas=None,
+                 workers=None, seed=None):
+        """ @param mapa, energia_inicial, posicao_inicial, lista_vitimas: as in AGPath
+            @param ilhas: number of islands (default: AGPath.NUM_EXECUCOES)
+            @param workers: number of processes (default: 1, in this process)
+            @param seed: seed of the run (default: drawn from the random module) """
+        self.workers = min(workers or 1, ilhas or AGPath.NUM_EXECUCOES)
+        seed = random.getrandbits(32) if seed is None else seed
+
+        estado = random.getstate()
+        self.ilhas = []
+        for i in range(ilhas or AGPath.NUM_EXECUCOES):
+            random.seed(f"{seed}-{i}")
+            ilha = AGPath(mapa, energia_inicial, posicao_inicial, lista_vitimas)
+            ilha.estado = random.getstate()
+            self.ilhas.append(ilha)
+        random.setstate(estado)
+
+        self.melhor_caminho = None
+        self.melhor_fitness = float('-inf')
+
+    def executar(self):
+        """ @return: o melhor caminho (movimentos (dx, dy)) de todas as ilhas """
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        estado = random.getstate()     # the islands run with their own generators here (see _evoluir)
+        try:
+            feitas = 0
+            while feitas < AGPath.MAX_GERACOES:
+                geracoes = min(INTERVALO_MIGRACAO, AGPath.MAX_GERACOES - feitas)
+                if pool is None:
+                    self.ilhas = [_evoluir(ilha, geracoes) for ilha in self.ilhas]
+                else:
+                    self.ilhas = list(pool.map(_evoluir, self.ilhas, [geracoes] * len(self.ilhas)))
+                feitas += geracoes
+                if feitas < AGPath.MAX_GERACOES:
+                    self.__migrar()
+        finally:
+            random.setstate(estado)
+            if pool is not None:
+                pool.shutdown()
+
+        melhor = max(self.ilhas, key=lambda ilha: ilha.melhor_fitness)
+        self.melhor_caminho, self.melhor_fitness = melhor.melhor_caminho, melhor.melhor_fitness
+        return self.melhor_caminho
+
+    def __migrar(self):
+        """ Os melhores de cada ilha trocam os piores da ilha seguinte """
+        migrantes = [ilha.melhores(MIGRANTES) for ilha in self.ilhas]
+        for i, (caminhos, comprimentos) in enumerate(migrantes):
+            self.ilhas[(i + 1) % len(self.ilhas)].receber_migrantes(caminhos, comprimentos)
+
+
+if __name__ == '__main__':
+    from vs import scenario
+    from hpa_star import full_map
+
+    parser = argparse.ArgumentParser(description="Speedup and fitness of the island model against a single AGPath")
+    parser.add_argument("data_folder", nargs="?", default="datasets/data_400v_90x90")
+    parser.add_argument("--victims", type=int, default=100, help="number of victims of the cluster")
+    parser.add_argument("--energy", type=float, default=200.0, help="time limit of the rescuer")
+    parser.add_argument("--islands", type=int, default=AGPath.NUM_EXECUCOES)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = scenario.load(args.data_folder)
+    obst, (bx, by) = data["obst"], data["config"]["BASE"]
+    m = full_map(obst, (bx, by))
+    victims = [((int(x) - bx, int(y) - by), signals.tolist()) for (x, y), signals in zip(data["victims"], data["signals"])]
+    victims = [victim for victim in victims if m.in_map(victim[0])]
+    print(f"{args.data_folder}: clusters of {args.victims} victims, energy {args.energy:g}, "
+          f"{args.islands} islands, {os.cpu_count()} CPU(s)")
+
+    for run in range(args.runs):
+        cluster = random.Random(args.seed + run).sample(victims, min(args.victims, len(victims)))
+
+        random.seed(args.seed + run)
+        start = time.perf_counter()
+        single = AGPath(m, args.energy, (0, 0), cluster)
+        single.executar_ag()
+        single_time = time.perf_counter() - start
+
+        cache = single.estatisticas_cache()
+        line = (f"   run {run}: single AGPath {single.melhor_fitness:9.1f} in {single_time:6.2f} s "
+                f"(fitness cache hits {cache['taxa_acertos']:.0%})")
+        for workers in sorted({1, args.workers}):
+            start = time.perf_counter()
+            islands = IslandGA(m, args.energy, (0, 0), cluster, args.islands, workers, seed=args.seed + run)
+            islands.executar()
+            elapsed = time.perf_counter() - start
+            line += f" | islands, {workers} worker(s): {islands.melhor_fitness:9.1f} in {elapsed:6.2f} s"
+        print(line)
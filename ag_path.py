@@ -1,76 +1,35 @@
-from enum import Enum
 import math
 import random
+import os
+import hashlib
 import joblib
-import matplotlib.pyplot as plt
+import numpy as np
+from collections import OrderedDict
 
 from map import Map
 
-class Position(Enum):
-    EMPTY = ' '
-    START = 'S'
-    END = 'E'
-    BLOCK = 'B'
-    
-class Node:
-    def __init__(self, position:tuple, difficulty = 1, type = Position.EMPTY):
-        self.x = position[0]
-        self.y = position[1]
-        self.difficulty = difficulty
-        self.type = type
-    
-    def __lt__(self, other):
-        return self.f < other.f
-    
-    def __eq__(self, __value: object) -> bool:
-        return self.x == __value.x and self.y == __value.y
-    
-class Grid:
-    def __init__(self, map:Map, start_position:tuple):
-        self.start_position = (start_position[0], start_position[1])
-        self.__g = self.generate_grid(map)
-        
-    def generate_grid(self, map:Map):
-        
-        data = map.map_data
-        
-        self.min_x = min(key[0] for key in data.keys())
-        self.max_x = max(key[0] for key in data.keys())
-        self.min_y = min(key[1] for key in data.keys())
-        self.max_y = max(key[1] for key in data.keys())
-        
-        self.size_x = self.max_x + abs(self.min_x) + 1
-        self.size_y = self.max_y + abs(self.min_y) + 1
-        
-        grid = {}
-        for y in range(self.min_y, self.max_y + 1):
-            for x in range(self.min_x, self.max_x + 1):
-                if (x, y) in data:
-                    grid[(x,y)] = Node((x, y), data[(x, y)][0])
-                else:
-                    grid[(x,y)] = Node((x, y), 100, Position.BLOCK)
-        
-        grid[self.start_position].type = Position.START
-        
-        return grid
-    
-    @property
-    def start_node(self):
-        return self.__g[self.start_position]
-    
-    @property
-    def end_node(self):
-        return self.__g[self.end_position]
-    
-    def get(self, x, y) -> Node:
-        return self.__g[(x, y)]
-    
-mlp_priority = joblib.load('mlp_priority.pkl')
-    # Função para estimar prioridade
+# A população é uma matriz int8 (indivíduos x passos) de índices de DIRECOES. Um movimento ajustado
+# aos limites do mapa pode virar (0, 0) (PARADO), e VAZIO marca os passos além do fim de cada caminho.
+DIRECOES = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]  # 8 possíveis movimentos
+PARADO = 8
+VAZIO = -1
+
+# deslocamento de cada índice (o último elemento, 0, serve para VAZIO = -1)
+DX = np.array([d[0] for d in DIRECOES] + [0, 0])
+DY = np.array([d[1] for d in DIRECOES] + [0, 0])
+
+# índice do movimento (dx, dy), indexado por [dx + 1, dy + 1]
+MOVIMENTO = np.full((3, 3), PARADO, dtype=np.int8)
+for _i, (_dx, _dy) in enumerate(DIRECOES):
+    MOVIMENTO[_dx + 1, _dy + 1] = _i
+
+
+mlp_priority = joblib.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mlp_priority.pkl'))
+
+# Prioridade de uma vítima (linha [x1, gravity, x3, x4]), com a linha sozinha no predict: em lote, os últimos
+# bits mudam conforme as outras linhas do lote (BLAS), e a prioridade não seria função só da linha
 def estimate_priority(victim_data):
-    x1, gravity, x3, x4 = victim_data
-    priority = mlp_priority.predict([[x1, gravity, x3, x4]])[0]
-    return priority
+    return float(mlp_priority.predict(victim_data.reshape(1, -1))[0])
 
 class AGPath:
     NUM_EXECUCOES = 10        # número de execuções
@@ -78,146 +37,265 @@ class AGPath:
     MAX_GERACOES = 30         # máximo de gerações por execução
     PROB_CROSSOVER = 0.75     # probabilidade de cruzamento entre dois indivíduos
     PROB_MUTACAO = 0.04       # probabilidade de mutação sobre um indivíduo
-    
+    TAM_CACHE = 4096          # fitness guardados (os caminhos usados há mais tempo saem primeiro)
+
     def __init__(self, mapa: Map, energia_inicial, posicao_inicial: tuple, lista_vitimas):
         self.energia_inicial = energia_inicial
         self.posicao_inicial = posicao_inicial
         self.lista_vitimas = self.trata_list_vitimas(lista_vitimas)
-        self.mapa = Grid(mapa, posicao_inicial)
-        self.populacao = [self.criar_caminho_aleatorio() for _ in range(self.TAM_POP)]
+        self.generate_grid(mapa)
+
+        caminhos = [self.criar_caminho_aleatorio() for _ in range(self.TAM_POP)]
+        self.comprimentos = np.array([len(caminho) for caminho in caminhos])
+        self.populacao = np.full((self.TAM_POP, max(self.comprimentos.max(), 1)), VAZIO, dtype=np.int8)
+        for i, caminho in enumerate(caminhos):
+            self.populacao[i, :len(caminho)] = caminho
         self.melhor_caminho = None
         self.melhor_fitness = float('-inf')
-        
+
+        # cache de fitness: hash dos movimentos do caminho -> fitness
+        self.cache = OrderedDict()
+        self.cache_acertos = 0
+        self.cache_falhas = 0
+        self.cache_descartes = 0
+        self.prioridades = {}     # linha [x1, gravity, x3, x4] (bytes) -> prioridade (ver estimate_priorities)
+
+    def generate_grid(self, map:Map):
+        """ Matrizes do retângulo do mapa, indexadas por [x - min_x, y - min_y]: células livres (conhecidas),
+        dificuldade (100 nas desconhecidas), índice da vítima em lista_vitimas (-1 se não há) e o índice da
+        primeira direção livre a partir da célula (-1 se não há) """
+        self.min_x, self.max_x, self.min_y, self.max_y = map.bounds()
+        _, _, difficulty, _, known = map.window()
+        largura, altura = known.shape
+
+        self.livre = known.copy()
+        self.dificuldade = np.where(known, difficulty, 100.0)
+        self.vitima = np.full((largura, altura), -1)
+        for i, (v_pos, _) in reversed(list(enumerate(self.lista_vitimas))):
+            if self.min_x <= v_pos[0] <= self.max_x and self.min_y <= v_pos[1] <= self.max_y:
+                self.vitima[v_pos[0] - self.min_x, v_pos[1] - self.min_y] = i   # a primeira vítima da posição
+        self.gravidades = np.array([gravidade for _, gravidade in self.lista_vitimas], dtype=float)
+        self.distancias = np.array([math.dist(self.posicao_inicial, v_pos) for v_pos, _ in self.lista_vitimas])
+
+        livre = np.zeros((largura + 2, altura + 2), dtype=bool)
+        livre[1:-1, 1:-1] = known
+        self.primeira_direcao = np.full((largura, altura), -1, dtype=np.int8)
+        for i, (dx, dy) in reversed(list(enumerate(DIRECOES))):
+            vizinho = livre[1 + dx:largura + 1 + dx, 1 + dy:altura + 1 + dy]
+            self.primeira_direcao[vizinho] = i
+
+    def movimentos_validos(self, pos):
+        """ @return: os índices das direções que levam de pos a uma célula livre """
+        x, y = pos[0] - self.min_x, pos[1] - self.min_y
+        largura, altura = self.livre.shape
+        return [i for i, (dx, dy) in enumerate(DIRECOES)
+                if 0 <= x + dx < largura and 0 <= y + dy < altura and self.livre[x + dx, y + dy]]
+
     def criar_caminho_aleatorio(self):
         pos = self.posicao_inicial
         path = []
         energy = self.energia_inicial
-        directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]  # 8 possíveis movimentos
 
         while energy > 0:
-            valid_moves = [(d[0], d[1]) for d in directions
-                       if self.mapa.min_x <= (pos[0] + d[0]) <= self.mapa.max_x and self.mapa.min_y <= (pos[1] + d[1]) <= self.mapa.max_y and self.mapa.get(pos[0] + d[0], pos[1] + d[1]).type != Position.BLOCK]
-            
+            valid_moves = self.movimentos_validos(pos)
+
             if not valid_moves:
                 break  # Sem movimentos possíveis, termina o caminho
 
             direct = random.choice(valid_moves)
-            pos = (pos[0] + direct[0], pos[1] + direct[1])
+            pos = (pos[0] + DIRECOES[direct][0], pos[1] + DIRECOES[direct][1])
             path.append(direct)
-            energy -= self.mapa.get(pos[0], pos[1]).difficulty  # Subtrai o custo do movimento da energia
+            energy -= self.dificuldade[pos[0] - self.min_x, pos[1] - self.min_y]  # Subtrai o custo do movimento da energia
 
         return path
 
 
     def executar_ag(self):
-        for _ in range(self.MAX_GERACOES):
-            # Avaliação de fitness para cada caminho na população
-            fitness_scores = [self.calcular_fitness(caminho) for caminho in self.populacao]
-            novos_pais = self.selecionar(fitness_scores)
-            novos_filhos = self.aplicar_crossover(novos_pais)
-            self.aplicar_mutacao(novos_filhos)
-            self.populacao = novos_filhos  # Nova população para próxima geração
+        self.executar_geracoes(self.MAX_GERACOES)
+
+    def executar_geracoes(self, geracoes):
+        for _ in range(geracoes):
+            # Avaliação de fitness de toda a população
+            fitness_scores = self.fitness(self.populacao, self.comprimentos).tolist()
 
             # Atualizar o melhor caminho encontrado
             max_fitness = max(fitness_scores)
             if max_fitness > self.melhor_fitness:
                 self.melhor_fitness = max_fitness
-                self.melhor_caminho = self.populacao[fitness_scores.index(max_fitness)]
+                melhor = fitness_scores.index(max_fitness)
+                self.melhor_caminho = self.decodificar(self.populacao[melhor, :self.comprimentos[melhor]])
 
+            novos_pais = self.selecionar(fitness_scores)
+            novos_filhos, comprimentos = self.aplicar_crossover(novos_pais)
+            self.aplicar_mutacao(novos_filhos, comprimentos)
+            self.populacao, self.comprimentos = novos_filhos, comprimentos  # Nova população para próxima geração
 
+    @staticmethod
+    def decodificar(caminho):
+        """ @return: a lista de movimentos (dx, dy) de uma linha da população """
+        return [(int(DX[d]), int(DY[d])) for d in caminho]
 
-    def calcular_fitness(self, caminho):
-        energia_usada = 0
-        vitimas_resgatadas = 0
-        gravidade_resgatadas = 0
-        prioridade_resgatadas = 0
-        ultimo_idx_resgate = None
-        
-        pos = self.posicao_inicial
-        pos_vitima = []
-        difficulty = 0
-
-        for idx, move in enumerate(caminho):
-            pos, new_move = self.validar_posicao(pos, move)
-            caminho[idx] = new_move
-            difficulty += self.mapa.get(pos[0], pos[1]).difficulty
-
-            for v_pos, gravidade in self.lista_vitimas:
-                if v_pos == pos and v_pos not in pos_vitima:
-                    vitimas_resgatadas += 1
-                    gravidade_resgatadas += gravidade
-                    ultimo_idx_resgate = idx  # Atualizar o índice do último resgate
-                    pos_vitima.append(v_pos)
-                    
-                    # Estimar prioridade usando a função estimate_priority
-                    distancia = math.dist(self.posicao_inicial, pos)
-                    priority = estimate_priority([difficulty, gravidade, distancia, len(pos_vitima)])
-                    prioridade_resgatadas += priority
-
-        if vitimas_resgatadas == len(self.lista_vitimas) and ultimo_idx_resgate is not None:
-            pos = self.posicao_inicial
-            for idx, move in enumerate(caminho[:ultimo_idx_resgate + 1]):
-                pos, caminho[idx] = self.validar_posicao(pos, move)
-                energia_usada += self.mapa.get(pos[0], pos[1]).difficulty
+    def posicoes(self, caminhos):
+        """ @return: (x, y) de cada passo de cada caminho, relativos a (min_x, min_y): somas acumuladas dos
+            movimentos, limitadas ao mapa (os passos VAZIO repetem a última posição) """
+        x = self.posicao_inicial[0] - self.min_x + np.cumsum(DX[caminhos], axis=1)
+        y = self.posicao_inicial[1] - self.min_y + np.cumsum(DY[caminhos], axis=1)
+        largura, altura = self.livre.shape
+        return np.clip(x, 0, largura - 1), np.clip(y, 0, altura - 1)
 
+    def fitness(self, caminhos, comprimentos):
+        """ Fitness de vários caminhos pelo cache: só os caminhos que não estão no cache são calculados
+        (calcular_fitness), uma vez cada um, e guardados
+        @return: o vetor de fitness """
+        chaves = [hashlib.blake2b(caminho[:comprimento].tobytes(), digest_size=16).digest()
+                  for caminho, comprimento in zip(caminhos, comprimentos.tolist())]
+        fitness = np.empty(len(chaves))
+        faltam = {}     # chave -> linhas com esse caminho
+        for i, chave in enumerate(chaves):
+            valor = self.cache.get(chave)
+            if valor is None:
+                faltam.setdefault(chave, []).append(i)
+            else:
+                self.cache.move_to_end(chave)
+                fitness[i] = valor
+        self.cache_acertos += len(chaves) - len(faltam)
+        self.cache_falhas += len(faltam)
+
+        if faltam:
+            linhas = [iguais[0] for iguais in faltam.values()]
+            valores = self.calcular_fitness(caminhos[linhas], comprimentos[linhas]).tolist()
+            for (chave, iguais), valor in zip(faltam.items(), valores):
+                fitness[iguais] = valor
+                self.cache[chave] = valor
+                if len(self.cache) > self.TAM_CACHE:
+                    self.cache.popitem(last=False)
+                    self.cache_descartes += 1
+        return fitness
+
+    def estatisticas_cache(self):
+        """ @return: os contadores do cache de fitness e a taxa de acertos """
+        consultas = self.cache_acertos + self.cache_falhas
+        return {"acertos": self.cache_acertos, "falhas": self.cache_falhas, "descartes": self.cache_descartes,
+                "entradas": len(self.cache), "taxa_acertos": self.cache_acertos / consultas if consultas else 0.0}
+
+    def calcular_fitness(self, caminhos, comprimentos):
+        """ Fitness de vários caminhos (válidos, ver validar_caminhos) de uma vez
+        @return: o vetor de fitness """
+        n = len(caminhos)
+        ativo = np.arange(caminhos.shape[1]) < comprimentos[:, np.newaxis]
+        x, y = self.posicoes(caminhos)
+
+        # dificuldade acumulada em cada passo
+        difficulty = np.cumsum(np.where(ativo, self.dificuldade[x, y], 0.0), axis=1)
+
+        # primeira passagem de cada caminho por cada vítima, em ordem de caminho e de passo
+        vitimas = np.where(ativo, self.vitima[x, y], -1)
+        ind, passo = np.nonzero(vitimas >= 0)
+        _, primeira = np.unique(ind * len(self.lista_vitimas) + vitimas[ind, passo], return_index=True)
+        primeira.sort()
+        ind, passo = ind[primeira], passo[primeira]
+        vitima = vitimas[ind, passo]
+        ordem = np.arange(len(ind)) - np.searchsorted(ind, ind) + 1   # número do resgate no caminho
+
+        gravidade = self.gravidades[vitima]
+        prioridade = self.estimate_priorities(np.column_stack((difficulty[ind, passo], gravidade,
+                                                               self.distancias[vitima], ordem)))
+
+        vitimas_resgatadas = np.bincount(ind, minlength=n)
+        gravidade_resgatadas = np.bincount(ind, weights=gravidade, minlength=n)
+        prioridade_resgatadas = np.bincount(ind, weights=prioridade, minlength=n)
+        ultimo_idx_resgate = np.full(n, -1)
+        np.maximum.at(ultimo_idx_resgate, ind, passo)
+
+        # a energia conta só quando todas as vítimas são resgatadas, até o último resgate
+        completo = (vitimas_resgatadas == len(self.lista_vitimas)) & (ultimo_idx_resgate >= 0)
+        energia_usada = np.where(completo, difficulty[np.arange(n), np.maximum(ultimo_idx_resgate, 0)], 0.0)
         energia_restante = self.energia_inicial - energia_usada
 
         # Fitness é uma combinação de vítimas resgatadas, sua prioridade, gravidade e a energia restante
         fitness = (vitimas_resgatadas * 100) + (gravidade_resgatadas * 100) + (prioridade_resgatadas * 100) + energia_restante
         return fitness
 
-    def validar_posicao(self, pos_inicial, move):
-        pos = (pos_inicial[0] + move[0], pos_inicial[1] + move[1])
-        new_move = move
-        if pos[0] < self.mapa.min_x:
-            pos = (self.mapa.min_x, pos[1])
-            new_move = (new_move[0] + 1, new_move[1])
-        elif pos[0] > self.mapa.max_x:
-            pos = (self.mapa.max_x, pos[1])
-            new_move = (new_move[0] - 1, new_move[1])
-        
-        if pos[1] < self.mapa.min_y:
-            pos = (pos[0], self.mapa.min_y)
-            new_move = (new_move[0], new_move[1] + 1)
-        elif pos[1] > self.mapa.max_y:
-            pos = (pos[0], self.mapa.max_y)
-            new_move = (new_move[0], new_move[1] - 1)
-        
-        if self.mapa.get(pos[0], pos[1]).type == Position.BLOCK:
-            # Se a posição é bloqueada, tenta encontrar um movimento válido a partir da posição inicial
-            for d in [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]:
-                new_pos = (pos_inicial[0] + d[0], pos_inicial[1] + d[1])
-                if self.mapa.min_x <= new_pos[0] <= self.mapa.max_x and self.mapa.min_y <= new_pos[1] <= self.mapa.max_y and self.mapa.get(new_pos[0], new_pos[1]).type != Position.BLOCK:
-                    new_move = d
-                    pos = new_pos
-                    break
-
-        return pos, new_move
-    
-    def aplicar_mutacao(self, filhos):
-        directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]  # 8 possíveis movimentos
-        for filho in filhos:
+    def estimate_priorities(self, linhas):
+        """ Prioridades de vários resgates; cada linha diferente passa uma vez pelo modelo, sozinha
+        (estimate_priority), e a prioridade fica guardada: a de um resgate depende só da sua linha, e o fitness
+        guardado no cache é igual, bit a bit, ao calculado de novo
+        @return: o vetor de prioridades """
+        prioridades = np.empty(len(linhas))
+        for i, linha in enumerate(np.ascontiguousarray(linhas, dtype=np.float64)):
+            chave = linha.tobytes()
+            prioridade = self.prioridades.get(chave)
+            if prioridade is None:
+                prioridade = self.prioridades[chave] = estimate_priority(linha)
+            prioridades[i] = prioridade
+        return prioridades
+
+    def validar_caminhos(self, caminhos, comprimentos, linhas=None):
+        """ Ajusta os movimentos dos caminhos, passo a passo, para manter as posições dentro do mapa e fora
+        das células bloqueadas: um movimento para fora do mapa é limitado à borda e um movimento para uma
+        célula bloqueada é trocado pela primeira direção livre a partir da posição anterior
+        @param linhas: os índices dos caminhos a ajustar (todos por padrão) """
+        if linhas is None:
+            linhas = np.arange(len(caminhos))
+        if len(linhas) == 0:
+            return
+        largura, altura = self.livre.shape
+        x = np.full(len(linhas), self.posicao_inicial[0] - self.min_x)
+        y = np.full(len(linhas), self.posicao_inicial[1] - self.min_y)
+        comprimento = comprimentos[linhas]
+
+        for passo in range(int(comprimento.max())):
+            ativo = passo < comprimento
+            d = caminhos[linhas, passo]
+            nx = np.clip(x + DX[d], 0, largura - 1)
+            ny = np.clip(y + DY[d], 0, altura - 1)
+
+            alternativa = self.primeira_direcao[x, y]
+            troca = ~self.livre[nx, ny] & (alternativa >= 0)
+            nx = np.where(troca, x + DX[alternativa], nx)
+            ny = np.where(troca, y + DY[alternativa], ny)
+
+            caminhos[linhas, passo] = np.where(ativo, MOVIMENTO[nx - x + 1, ny - y + 1], d)
+            x = np.where(ativo, nx, x)
+            y = np.where(ativo, ny, y)
+
+    def aplicar_mutacao(self, filhos, comprimentos):
+        mutados = []
+        for k in range(len(filhos)):
             if random.random() < self.PROB_MUTACAO:
-                pos_mut = random.randint(0, len(filho) - 1)
-                pos = self.posicao_inicial
+                pos_mut = random.randint(0, comprimentos[k] - 1)
 
-                i = 0
                 # Calcula a posição atual antes da mutação
-                for move in filho[:pos_mut]:
-                    i +=1
-                    pos = (pos[0] + move[0], pos[1] + move[1])
+                pos = (self.posicao_inicial[0] + int(DX[filhos[k, :pos_mut]].sum()),
+                       self.posicao_inicial[1] + int(DY[filhos[k, :pos_mut]].sum()))
 
                 # Gera uma nova direção válida
-                valid_moves = [(d[0], d[1]) for d in directions
-                            if self.mapa.min_x <= (pos[0] + d[0]) <= self.mapa.max_x and self.mapa.min_y <= (pos[1] + d[1]) <= self.mapa.max_y and self.mapa.get(pos[0] + d[0], pos[1] + d[1]).type != Position.BLOCK]
+                valid_moves = self.movimentos_validos(pos)
 
                 if valid_moves:
-                    new_move = random.choice(valid_moves)
-                    filho[pos_mut] = new_move
+                    filhos[k, pos_mut] = random.choice(valid_moves)
+                mutados.append(k)
+
+        # Verificar e ajustar posições após a mutação
+        self.validar_caminhos(filhos, comprimentos, np.array(mutados, dtype=int))
 
-                # Verificar e ajustar posições após a mutação
-                for i in range(pos_mut, len(filho)):
-                    pos, filho[i] = self.validar_posicao(pos, filho[i])
+    def melhores(self, quantidade):
+        """ @return: (caminhos, comprimentos) dos melhores indivíduos da população atual """
+        fitness = self.fitness(self.populacao, self.comprimentos)
+        melhores = np.argsort(-fitness, kind="stable")[:quantidade]
+        return self.populacao[melhores].copy(), self.comprimentos[melhores].copy()
+
+    def receber_migrantes(self, caminhos, comprimentos):
+        """ Troca os piores indivíduos da população pelos caminhos (válidos) vindos de outra população """
+        largura = max(self.populacao.shape[1], caminhos.shape[1])
+        if largura > self.populacao.shape[1]:
+            self.populacao = np.pad(self.populacao, ((0, 0), (0, largura - self.populacao.shape[1])),
+                                    constant_values=VAZIO)
+        fitness = self.fitness(self.populacao, self.comprimentos)
+        piores = np.argsort(fitness, kind="stable")[:len(caminhos)]
+        self.populacao[piores] = VAZIO
+        self.populacao[piores, :caminhos.shape[1]] = caminhos
+        self.comprimentos[piores] = comprimentos
 
     def selecionar(self, fitness_scores):
         total_fitness = sum(fitness_scores)
@@ -228,59 +306,31 @@ class AGPath:
     def imprimir_resultados(self):
         print(f"Melhor fitness: {self.melhor_fitness}")
         print(f"Melhor caminho: {self.melhor_caminho}")
-    
+
     def aplicar_crossover(self, pais):
-        filhos = []
+        filhos = np.full_like(self.populacao, VAZIO)
+        comprimentos = np.zeros(len(pais), dtype=int)
         for i in range(0, len(pais), 2):
-            pai1, pai2 = self.populacao[pais[i]], self.populacao[pais[i+1]]
+            pai1, pai2 = pais[i], pais[i+1]
+            len1, len2 = self.comprimentos[pai1], self.comprimentos[pai2]
             if random.random() < self.PROB_CROSSOVER:
-                ponto_corte = random.randint(1, len(pai1) - 1)
-                filho1 = pai1[:ponto_corte] + pai2[ponto_corte:]
-                filho2 = pai2[:ponto_corte] + pai1[ponto_corte:]
+                ponto_corte = random.randint(1, len1 - 1)
+                filho1 = np.concatenate((self.populacao[pai1, :ponto_corte], self.populacao[pai2, ponto_corte:len2]))
+                filho2 = np.concatenate((self.populacao[pai2, :min(ponto_corte, len2)], self.populacao[pai1, ponto_corte:len1]))
             else:
-                filho1, filho2 = pai1, pai2
+                filho1, filho2 = self.populacao[pai1, :len1], self.populacao[pai2, :len2]
 
-            # Verificar e ajustar posições dos filhos após o crossover
-            filho1 = self.validar_caminho(filho1)
-            filho2 = self.validar_caminho(filho2)
-            
-            filhos.extend([filho1, filho2])
-        return filhos
+            for j, filho in ((i, filho1), (i + 1, filho2)):
+                filhos[j, :len(filho)] = filho
+                comprimentos[j] = len(filho)
 
-    def validar_caminho(self, caminho):
-        pos = self.posicao_inicial
-        for i in range(len(caminho)):
-            pos, caminho[i] = self.validar_posicao(pos, caminho[i])
-        return caminho
+        # Verificar e ajustar posições dos filhos após o crossover
+        self.validar_caminhos(filhos, comprimentos)
+        return filhos, comprimentos
 
-    
-    def generate_grid(self, map:Map):
-        
-        data = map.map_data
-        
-        self.min_x = min(key[0] for key in data.keys())
-        self.max_x = max(key[0] for key in data.keys())
-        self.min_y = min(key[1] for key in data.keys())
-        self.max_y = max(key[1] for key in data.keys())
-        
-        self.size_x = self.max_x + abs(self.min_x) + 1
-        self.size_y = self.max_y + abs(self.min_y) + 1
-        
-        grid = {}
-        for y in range(self.min_y, self.max_y + 1):
-            for x in range(self.min_x, self.max_x + 1):
-                if (x, y) in data:
-                    grid[(x,y)] = Node((x, y), data[(x, y)][0])
-                else:
-                    grid[(x,y)] = Node((x, y), 100, Position.BLOCK)
-        
-        grid[self.posicao_inicial].type = Position.START
-        
-        return grid
-    
     def trata_list_vitimas(self, list_vitimas):
         vitimas = []
         for vitima in list_vitimas:
             vitimas.append((vitima[0], vitima[1][6]))
-        
-        return vitimas
\ No newline at end of file
+
+        return vitimas
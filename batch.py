@@ -0,0 +1,181 @@
+## BATCH RUNNER
+### Runs the explorer/rescuer stack of main.py in headless mode for every
+### combination of scenario folder x seed x agent configuration, in parallel
+### processes, and aggregates the final stats of the environment. Each scenario is
+### compiled (see vs/scenario.py) once, before the processes start.
+###
+### Example:
+###    python batch.py datasets/data_10v_12X12 datasets/data_400v_90x90 --seeds 0 1 2 3 \
+###        --agents default --agents long=cfg/explorer_long.txt,cfg/rescuer_long.txt \
+###        --csv summary.csv --json batch.json
+
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import warnings
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from scipy import stats
+from vs import scenario
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+# Metrics collected from Env.get_results for each run
+METRICS = ["Ve1", "Ve2", "Ve3", "Ve4", "Ve", "Veg",
+           "Vs1", "Vs2", "Vs3", "Vs4", "Vs", "Vsg",
+           "consumed_time", "cycles", "elapsed"]
+
+
+def parse_agents(value):
+    """ Parse an agent configuration given as NAME or NAME=EXPLORER_CFG,RESCUER_CFG
+    @return: a dictionary {name, explorer_file, rescuer_file}; None means the file of the data folder """
+
+    name, _, files = value.partition("=")
+    explorer_file = rescuer_file = None
+    if files:
+        explorer_file, _, rescuer_file = files.partition(",")
+        explorer_file = os.path.abspath(explorer_file) if explorer_file else None
+        rescuer_file = os.path.abspath(rescuer_file) if rescuer_file else None
+
+    return {"name": name, "explorer_file": explorer_file, "rescuer_file": rescuer_file}
+
+
+def run_one(data_folder, seed, agents):
+    """ Run one mission in headless mode. Executed in a worker process.
+    @return: a dictionary with the scenario, the configuration, the seed and the METRICS (or the error) """
+
+    import main   # loads the models once per worker process
+
+    row = {"scenario": data_folder, "agents": agents["name"], "seed": seed}
+    random.seed(seed)
+    np.random.seed(seed)
+
+    cwd = os.getcwd()
+    start = time.perf_counter()
+    try:
+        # the rescuers write their output files in the current folder: one folder per run
+        with tempfile.TemporaryDirectory() as run_folder, warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            os.chdir(run_folder)
+            try:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    results = main.main(data_folder, headless=True,
+                                        explorer_file=agents["explorer_file"],
+                                        rescuer_file=agents["rescuer_file"])
+            finally:
+                os.chdir(cwd)
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+        return row
+
+    row.update({key: value for key, value in results["found"].items() if key in METRICS})
+    row.update({key: value for key, value in results["saved"].items() if key in METRICS})
+    row["consumed_time"] = sum(agent["consumed_time"] for agent in results["agents"])
+    row["cycles"] = results["cycles"]
+    row["elapsed"] = time.perf_counter() - start
+    return row
+
+
+def summarize(rows, confidence=0.95):
+    """ Mean and confidence interval (Student's t) of the METRICS per scenario and agent configuration
+    @return: a list of dictionaries {scenario, agents, runs, <metric>_mean, <metric>_ci} """
+
+    groups = {}
+    for row in rows:
+        if "error" not in row:
+            groups.setdefault((row["scenario"], row["agents"]), []).append(row)
+
+    summary = []
+    for (scenario, agents), group in groups.items():
+        line = {"scenario": scenario, "agents": agents, "runs": len(group)}
+        n = len(group)
+        for metric in METRICS:
+            values = np.array([row[metric] for row in group], dtype=float)
+            line[f"{metric}_mean"] = float(values.mean())
+            if n > 1:
+                half = stats.t.ppf((1 + confidence) / 2, n - 1) * values.std(ddof=1) / math.sqrt(n)
+                line[f"{metric}_ci"] = float(half)
+            else:
+                line[f"{metric}_ci"] = float("nan")
+        summary.append(line)
+
+    return summary
+
+
+def write_csv(file_name, rows):
+    """ Write a list of dictionaries as a CSV table """
+    if not rows:
+        return
+    fields = list(rows[0].keys())
+    for row in rows:
+        fields += [key for key in row if key not in fields]
+    with open(file_name, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_batch(data_folders, seeds, agents_list, workers=None):
+    """ Run every scenario x seed x agent configuration in a process pool
+    @return: the list of rows returned by run_one, in submission order """
+
+    tasks = [(os.path.abspath(folder), seed, agents)
+             for folder in data_folders for agents in agents_list for seed in seeds]
+    rows = [None] * len(tasks)
+
+    # compile each scenario here, once, instead of in every worker that starts on it
+    for folder in dict.fromkeys(task[0] for task in tasks):
+        try:
+            scenario.load(folder)
+        except Exception:
+            pass    # reported by run_one for each run of the folder
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_one, *task): i for i, task in enumerate(tasks)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            rows[i] = future.result()
+            status = rows[i].get("error", f"Vs={rows[i].get('Vs')} Vsg={rows[i].get('Vsg', 0):.2f}")
+            print(f"BATCH: [{done}/{len(tasks)}] {rows[i]['scenario']} {rows[i]['agents']} seed {rows[i]['seed']}: {status}",
+                  file=sys.stderr)
+
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run scenarios x seeds x agent configurations in headless mode")
+    parser.add_argument("data_folders", nargs="+", help="scenario folders")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0], help="random seeds (default: 0)")
+    parser.add_argument("--agents", action="append", type=parse_agents,
+                        help="agent configuration NAME or NAME=EXPLORER_CFG,RESCUER_CFG (repeatable; default: the files of each data folder)")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument("--confidence", type=float, default=0.95, help="level of the confidence intervals")
+    parser.add_argument("--csv", help="write the summary table (means and confidence intervals) to this CSV file")
+    parser.add_argument("--runs-csv", help="write one line per run to this CSV file")
+    parser.add_argument("--json", help="write the runs and the summary to this JSON file")
+    args = parser.parse_args()
+
+    agents_list = args.agents or [parse_agents("default")]
+    rows = run_batch(args.data_folders, args.seeds, agents_list, args.workers)
+    summary = summarize(rows, args.confidence)
+
+    if args.csv:
+        write_csv(args.csv, summary)
+    if args.runs_csv:
+        write_csv(args.runs_csv, rows)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"runs": rows, "summary": summary}, file, indent=2)
+
+    for line in summary:
+        print(f"\n{line['scenario']} [{line['agents']}] {line['runs']} runs")
+        for metric in METRICS:
+            print(f"   {metric:14s} = {line[metric + '_mean']:10.3f} +/- {line[metric + '_ci']:.3f}")
@@ -0,0 +1,356 @@
+## D* LITE
+### Incremental replanner for agents on a map that keeps growing. It has the interface of
+### a_star.AStar: DStarLite(map, position).run() returns the path from the position to the
+### base, but the search state is kept per map between calls. When cells are added to the map
+### or their difficulty changes (Map.changed_since), only the affected part of the search is
+### repaired; when the agent moves, the priorities are corrected by the km offset of D* Lite.
+###
+### The search goes backwards from the base: g(s) is the cost to go from s to the base.
+### Walking into a cell costs COST_LINE or COST_DIAG times its difficulty, as charged by the
+### environment; walls (difficulty VS.OBST_WALL) cannot be entered. The heuristic is the octile
+### distance times the minimum difficulty of the map (if a cell with a lower difficulty appears,
+### the search restarts, because the heuristic must not overestimate).
+###
+### S. Koenig and M. Likhachev. D* Lite. AAAI 2002.
+###
+### To compare replanning with searching from scratch:
+###    python d_star_lite.py datasets/data_400v_90x90
+###    python d_star_lite.py --generate 1000
+
+import time
+import heapq
+import random
+import weakref
+import argparse
+from map import Map
+from vs.constants import VS
+
+INF = float("inf")
+
+# increments of the 8 directions
+NEIGHBORS = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)]
+
+
+class _Planner:
+    """ Search state of D* Lite on a map, towards a goal, kept between the searches """
+
+    def __init__(self, map:Map, goal, cost_line, cost_diag):
+        self.__map = weakref.ref(map)   # weak: the map is the key of the planner in _planners
+        self.goal = goal
+        self.cost_line = cost_line
+        self.cost_diag = min(cost_diag, 2 * cost_line)   # for the heuristic only
+        self.cost_diag_step = cost_diag
+        self.version = 0
+        self.difficulty = {}        # difficulty of the known cells, as last seen in the map
+        self.min_difficulty = None  # scale of the heuristic
+        self.start = None
+        self.expanded = 0
+        self.reset()
+
+    @property
+    def map(self):
+        return self.__map()
+
+    def reset(self):
+        self.g = {}
+        self.rhs = {self.goal: 0.0}
+        self.km = 0.0
+        self.open = []              # heap of (k1, k2, cell)
+        self.keys = {}              # key of the cells in the open list
+        self.last_start = self.start
+        self.__push(self.goal, (self.h(self.goal), 0.0))
+
+    def h(self, cell):
+        """ Heuristic from the current start to cell """
+        if self.start is None:
+            return 0.0
+        return self.octile(self.start, cell)
+
+    def octile(self, a, b):
+        """ Octile distance between a and b, scaled by the minimum difficulty: a lower bound of the cost """
+        if self.min_difficulty is None:
+            return 0.0
+        dx = abs(a[0] - b[0])
+        dy = abs(a[1] - b[1])
+        if dx < dy:
+            dx, dy = dy, dx
+        return self.min_difficulty * (self.cost_line * (dx - dy) + self.cost_diag * dy)
+
+    def cost(self, cell, to):
+        """ Cost of walking from cell into the neighbor to """
+        difficulty = self.difficulty.get(to)
+        if difficulty is None or difficulty >= VS.OBST_WALL:
+            return INF
+        if cell[0] == to[0] or cell[1] == to[1]:
+            return self.cost_line * difficulty
+        return self.cost_diag_step * difficulty
+
+    def key(self, cell):
+        best = min(self.g.get(cell, INF), self.rhs.get(cell, INF))
+        return (best + self.h(cell) + self.km, best)
+
+    def __push(self, cell, key):
+        self.keys[cell] = key
+        heapq.heappush(self.open, (key[0], key[1], cell))
+
+    def neighbors(self, cell):
+        x, y = cell
+        for dx, dy in NEIGHBORS:
+            neighbor = (x + dx, y + dy)
+            if neighbor in self.difficulty:
+                yield neighbor
+
+    def best_rhs(self, cell):
+        best = INF
+        for neighbor in self.neighbors(cell):
+            value = self.cost(cell, neighbor) + self.g.get(neighbor, INF)
+            if value < best:
+                best = value
+        return best
+
+    def update_vertex(self, cell):
+        if self.g.get(cell, INF) != self.rhs.get(cell, INF):
+            self.__push(cell, self.key(cell))
+        else:
+            self.keys.pop(cell, None)
+
+    def top(self):
+        """ @return: the (k1, k2, cell) of the open list with the lowest key, dropping outdated entries """
+        while self.open:
+            k1, k2, cell = self.open[0]
+            if self.keys.get(cell) == (k1, k2):
+                return self.open[0]
+            heapq.heappop(self.open)
+        return None
+
+    def apply_changes(self):
+        """ Update the edge costs with the cells changed in the map since the last search """
+        if self.map.version == self.version:
+            return
+        changed = self.map.changed_since(self.version)
+        self.version = self.map.version
+
+        restart = False
+        for cell in changed:
+            difficulty = self.map.get(cell)[0]
+            if self.min_difficulty is None or difficulty < self.min_difficulty:
+                self.min_difficulty = difficulty
+                restart = True
+
+            # edges into the cell changed cost, and a new cell has new edges out of it
+            old_costs = {neighbor: self.cost(neighbor, cell) for neighbor in self.neighbors(cell)}
+            is_new = cell not in self.difficulty
+            self.difficulty[cell] = difficulty
+            if restart:
+                continue
+
+            g_cell = self.g.get(cell, INF)
+            for neighbor, old_cost in old_costs.items():
+                if neighbor == self.goal:
+                    continue
+                new_cost = self.cost(neighbor, cell)
+                if new_cost < old_cost:
+                    self.rhs[neighbor] = min(self.rhs.get(neighbor, INF), new_cost + g_cell)
+                elif self.rhs.get(neighbor, INF) == old_cost + g_cell:
+                    self.rhs[neighbor] = self.best_rhs(neighbor)
+                self.update_vertex(neighbor)
+
+            if is_new and cell != self.goal:
+                self.rhs[cell] = self.best_rhs(cell)
+                self.update_vertex(cell)
+
+        # a lower difficulty lowers the heuristic, which must not overestimate: search again from scratch
+        if restart:
+            self.reset()
+
+    def compute_shortest_path(self):
+        start = self.start
+        while True:
+            top = self.top()
+            if top is None:
+                break
+            k_old = (top[0], top[1])
+            start_key = self.key(start)
+            if not (k_old < start_key or self.rhs.get(start, INF) > self.g.get(start, INF)):
+                break
+
+            cell = top[2]
+            self.expanded += 1
+            k_new = self.key(cell)
+            if k_old < k_new:
+                self.__push(cell, k_new)
+            elif self.g.get(cell, INF) > self.rhs.get(cell, INF):
+                self.g[cell] = self.rhs[cell]
+                del self.keys[cell]
+                g_cell = self.g[cell]
+                for neighbor in self.neighbors(cell):
+                    if neighbor != self.goal:
+                        value = self.cost(neighbor, cell) + g_cell
+                        if value < self.rhs.get(neighbor, INF):
+                            self.rhs[neighbor] = value
+                        self.update_vertex(neighbor)
+            else:
+                g_old = self.g.get(cell, INF)
+                self.g[cell] = INF
+                for neighbor in list(self.neighbors(cell)) + [cell]:
+                    if neighbor != self.goal and \
+                            (neighbor == cell or self.rhs.get(neighbor, INF) == self.cost(neighbor, cell) + g_old):
+                        self.rhs[neighbor] = self.best_rhs(neighbor)
+                    self.update_vertex(neighbor)
+
+    def plan(self, start):
+        """ @return: the path from start to the goal (both included) or None """
+        self.apply_changes()
+        if start not in self.difficulty:
+            return None
+
+        if self.last_start is not None and start != self.last_start:
+            self.km += self.octile(self.last_start, start)
+        self.start = start
+        self.last_start = start
+
+        self.expanded = 0
+        self.compute_shortest_path()
+        if self.g.get(start, INF) == INF and self.rhs.get(start, INF) == INF:
+            return None
+
+        # follow the best successors
+        path = [start]
+        cell = start
+        while cell != self.goal:
+            best, best_value = None, INF
+            for neighbor in self.neighbors(cell):
+                value = self.cost(cell, neighbor) + self.g.get(neighbor, INF)
+                if value < best_value:
+                    best, best_value = neighbor, value
+            if best is None or len(path) > len(self.difficulty):
+                return None
+            path.append(best)
+            cell = best
+        return path
+
+
+# one planner per map and (goal, costs), released with the map
+_planners = weakref.WeakKeyDictionary()
+
+
+class DStarLite:
+    def __init__(self, map:Map, end_position:tuple, cost_line=1.0, cost_diag=1.5, goal=(0, 0), keep_state=True):
+        """ @param map: the explored map
+            @param end_position: the position the search starts from (the agent)
+            @param goal: the position the path goes to (by default, the base)
+            @param keep_state: False to search from scratch, without reusing or keeping the search state """
+        if keep_state:
+            planners = _planners.setdefault(map, {})
+            planner = planners.get((goal, cost_line, cost_diag))
+            if planner is None:
+                planner = _Planner(map, goal, cost_line, cost_diag)
+                planners[(goal, cost_line, cost_diag)] = planner
+        else:
+            planner = _Planner(map, goal, cost_line, cost_diag)
+
+        self.planner = planner
+        self.start_position = (end_position[0], end_position[1])
+        self.end_position = goal
+        self.expanded = 0          # number of nodes taken from the open list in the last run
+
+    def run(self):
+        path = self.planner.plan(self.start_position)
+        self.expanded = self.planner.expanded
+        return path
+
+
+def benchmark(obst, base, steps=1500, every=10, radius=2, seed=0, astar=False):
+    """ An agent walks away from the base revealing the cells around it (as an explorer does) and,
+    every few steps, plans its way back: with the kept D* Lite state, with a D* Lite search from
+    scratch and, optionally, with a_star.AStar
+    @param obst: the difficulty of the cells of the grid, indexed [x, y] (absolute coordinates)
+    @return: a dictionary planner: (number of plans, total time in seconds, total expansions) """
+
+    from a_star import AStar
+
+    rng = random.Random(seed)
+    width, height = obst.shape
+    m = Map()
+
+    def reveal(x, y):
+        for i in range(max(0, x - radius), min(width, x + radius + 1)):
+            for j in range(max(0, y - radius), min(height, y + radius + 1)):
+                if not m.in_map((i - base[0], j - base[1])):
+                    m.add((i - base[0], j - base[1]), float(obst[i, j]), VS.NO_VICTIM, [VS.CLEAR] * 8)
+
+    x, y = base
+    visited = {base}
+    target = (rng.randrange(width), rng.randrange(height))
+    reveal(x, y)
+    results = {"D* Lite (kept state)": [0, 0.0, 0], "D* Lite (from scratch)": [0, 0.0, 0]}
+    if astar:
+        results["a_star.AStar"] = [0, 0.0, 0]
+
+    for step in range(1, steps + 1):
+        # a step towards the target (mostly), preferring cells not visited yet
+        moves = [(dx, dy) for dx, dy in NEIGHBORS
+                 if 0 <= x + dx < width and 0 <= y + dy < height and obst[x + dx, y + dy] < VS.OBST_WALL]
+        if not moves:
+            break
+        moves.sort(key=lambda d: ((x + d[0], y + d[1]) in visited,
+                                  max(abs(x + d[0] - target[0]), abs(y + d[1] - target[1]))))
+        dx, dy = moves[0] if rng.random() < 0.8 else rng.choice(moves)
+        x, y = x + dx, y + dy
+        visited.add((x, y))
+        reveal(x, y)
+        if (x, y) == target or rng.random() < 0.005:
+            target = (rng.randrange(width), rng.randrange(height))
+
+        if step % every:
+            continue
+
+        position = (x - base[0], y - base[1])
+        for name, keep_state in (("D* Lite (kept state)", True), ("D* Lite (from scratch)", False)):
+            planner = DStarLite(m, position, keep_state=keep_state)
+            start = time.perf_counter()
+            planner.run()
+            results[name][1] += time.perf_counter() - start
+            results[name][0] += 1
+            results[name][2] += planner.expanded
+        if astar:
+            start = time.perf_counter()
+            planner = AStar(m, position)
+            planner.run()
+            results["a_star.AStar"][1] += time.perf_counter() - start
+            results["a_star.AStar"][0] += 1
+            results["a_star.AStar"][2] += planner.expanded
+
+    return results, len(m)
+
+
+if __name__ == '__main__':
+    import numpy as np
+    from vs import scenario
+
+    parser = argparse.ArgumentParser(description="Replanning cost of D* Lite against searching from scratch")
+    parser.add_argument("data_folder", nargs="?", help="scenario folder (default: data_400v_90x90)")
+    parser.add_argument("--generate", type=int, metavar="SIZE", help="use a generated SIZE x SIZE map instead")
+    parser.add_argument("--steps", type=int, default=1500, help="steps of the agent")
+    parser.add_argument("--every", type=int, default=10, help="plan every EVERY steps")
+    parser.add_argument("--radius", type=int, default=2, help="cells revealed around the agent")
+    parser.add_argument("--astar", action="store_true", help="also time a_star.AStar (same costs, no state kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.generate:
+        from scenario_generator import generate_obstacles, DIFFICULTIES
+        base = (args.generate // 2, args.generate // 2)
+        obst = generate_obstacles(np.random.default_rng(args.seed), args.generate, args.generate, 0.1,
+                                  DIFFICULTIES, 4, base)
+        name = f"generated {args.generate}x{args.generate}"
+    else:
+        name = args.data_folder or "datasets/data_400v_90x90"
+        data = scenario.load(name)
+        obst, base = data["obst"], tuple(data["config"]["BASE"])
+
+    results, cells = benchmark(obst, base, args.steps, args.every, args.radius, args.seed, args.astar)
+    print(f"{name}: {args.steps} steps, {cells} cells revealed")
+    for planner, (plans, elapsed, expanded) in results.items():
+        print(f"   {planner:24s} {plans:5d} plans  {elapsed / max(plans, 1) * 1000:9.3f} ms/plan  "
+              f"{expanded / max(plans, 1):10.1f} expansions/plan")
@@ -1,9 +1,10 @@
+import os
 import pickle
 
 
 class DecisionTree():
     def __init__(self):
-        with open('decision_tree_model.pkl', 'rb') as file:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'decision_tree_model.pkl'), 'rb') as file:
             self.loaded_model = pickle.load(file)
 
     def compute(self, pa, pulso, resp):
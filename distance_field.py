@@ -0,0 +1,152 @@
+## DISTANCE FIELD
+### Cost to go back to the base from every explored cell: a single-source shortest-path
+### tree rooted at the base, with the cost and the next cell towards the base of each cell.
+###
+### Walking into a cell costs COST_LINE or COST_DIAG times its difficulty, as charged by
+### the environment; cells with difficulty VS.OBST_WALL cannot be entered.
+###
+### The tree is kept up to date incrementally (dynamic SSSP) with the cells changed in the map
+### since the last update (Map.changed_since):
+### - a new cell, or a cell whose difficulty decreased, can only shorten paths: the change is
+###   propagated Dijkstra-style from the cell;
+### - when the difficulty of a cell increases, the cells whose path enters it (its subtree) lose
+###   their cost; they are seeded again from their unaffected neighbors and propagated.
+### So the cost of going home is an O(1) lookup and the path an O(path) walk over the parents.
+
+import heapq
+from map import Map
+from vs.constants import VS
+
+INF = float("inf")
+
+# increments of the 8 directions
+NEIGHBORS = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)]
+
+
+class DistanceField:
+    def __init__(self, map:Map, cost_line=1.0, cost_diag=1.5, base=(0, 0)):
+        """ @param map: the map of the explored cells; the field follows its changes
+            @param cost_line: cost of a horizontal or vertical step into a cell of difficulty 1
+            @param cost_diag: cost of a diagonal step into a cell of difficulty 1
+            @param base: the root of the tree """
+        self.map = map
+        self.cost_line = cost_line
+        self.cost_diag = cost_diag
+        self.base = base
+
+        self.dist = {base: 0.0}    # cost to go to the base from each cell
+        self.parent = {base: None} # next cell towards the base
+        self.difficulty = {}       # difficulty of the cells as last seen in the map
+        self.version = 0           # version of the map already applied
+        self.update()
+
+    def cost(self, coord):
+        """ @return: the cost to walk from coord to the base, or None if the base cannot be reached """
+        self.update()
+        dist = self.dist.get(coord, INF)
+        return None if dist == INF else dist
+
+    def path(self, coord):
+        """ @return: the list of positions from coord to the base (both included), or None if unreachable """
+        if self.cost(coord) is None:
+            return None
+
+        path = [coord]
+        while coord != self.base:
+            coord = self.parent[coord]
+            path.append(coord)
+        return path
+
+    def update(self):
+        """ Apply the cells changed in the map since the last update """
+        if self.map.version == self.version:
+            return
+
+        changed = self.map.changed_since(self.version)
+        self.version = self.map.version
+
+        heap = []
+        increased = []
+        for coord in changed:
+            difficulty = self.map.get(coord)[0]
+            old = self.difficulty.get(coord)
+            self.difficulty[coord] = difficulty
+            if old is None:
+                # new cell: its cost comes from its neighbors; then it may shorten theirs
+                self.__seed(coord, heap)
+            elif difficulty < old:
+                # entering the cell is cheaper: propagate from the cell
+                if coord in self.dist:
+                    heapq.heappush(heap, (self.dist[coord], coord))
+            elif difficulty > old:
+                increased.append(coord)
+
+        if increased:
+            # the cells whose path enters an increased cell lose their cost...
+            affected = []
+            for coord in increased:
+                self.__detach_children(coord, affected)
+            # ... and get it again from their neighbors
+            for coord in affected:
+                self.__seed(coord, heap)
+            for coord in increased:
+                if coord in self.dist:
+                    heapq.heappush(heap, (self.dist[coord], coord))
+
+        self.__propagate(heap)
+
+    def __step(self, coord, to):
+        """ Cost of walking from coord into the neighbor cell to """
+        difficulty = self.difficulty[to]
+        if difficulty >= VS.OBST_WALL:
+            return INF
+        if coord[0] == to[0] or coord[1] == to[1]:
+            return self.cost_line * difficulty
+        return self.cost_diag * difficulty
+
+    def __seed(self, coord, heap):
+        """ Set the cost of coord from its neighbors that have a cost """
+        if coord == self.base:
+            return
+        x, y = coord
+        for dx, dy in NEIGHBORS:
+            neighbor = (x + dx, y + dy)
+            dist = self.dist.get(neighbor)
+            if dist is None or neighbor not in self.difficulty:
+                continue
+            candidate = dist + self.__step(coord, neighbor)
+            if candidate < self.dist.get(coord, INF):
+                self.dist[coord] = candidate
+                self.parent[coord] = neighbor
+        if coord in self.dist:
+            heapq.heappush(heap, (self.dist[coord], coord))
+
+    def __detach_children(self, coord, affected):
+        """ Remove the cost of the cells whose path to the base enters coord (its subtree) """
+        stack = [coord]
+        while stack:
+            x, y = stack.pop()
+            for dx, dy in NEIGHBORS:
+                child = (x + dx, y + dy)
+                if self.parent.get(child) == (x, y) and child in self.dist:
+                    del self.dist[child]
+                    del self.parent[child]
+                    affected.append(child)
+                    stack.append(child)
+
+    def __propagate(self, heap):
+        """ Dijkstra from the cells in the heap: relax the neighbors that can walk into each cell """
+        while heap:
+            dist, coord = heapq.heappop(heap)
+            if dist != self.dist.get(coord):
+                continue    # outdated entry
+            x, y = coord
+            for dx, dy in NEIGHBORS:
+                neighbor = (x + dx, y + dy)
+                if neighbor not in self.difficulty or neighbor == self.base:
+                    continue
+                candidate = dist + self.__step(neighbor, coord)
+                if candidate < self.dist.get(neighbor, INF):
+                    self.dist[neighbor] = candidate
+                    self.parent[neighbor] = coord
+                    heapq.heappush(heap, (candidate, neighbor))
@@ -9,12 +9,21 @@ import os
 import random
 import math
 from abc import ABC, abstractmethod
-from global_resources import GlobalResources
+from global_resources import GlobalResources, VictimLog
 from vs.abstract_agent import AbstAgent
 from vs.constants import VS
 from map import Map
 import time
+from distance_field import DistanceField
 from a_star import AStar
+from jump_point_search import JumpPointSearch
+from hpa_star import HPAStar
+from d_star_lite import DStarLite
+from path_cache import CachedAStar
+
+# engines for the way back to the base, chosen by the PATHFINDER keyword of the config file;
+# "field" (the default) walks the shortest-path tree of the DistanceField
+PATHFINDERS = {"astar": AStar, "cached": CachedAStar, "jps": JumpPointSearch, "hpa": HPAStar, "dstar": DStarLite}
 
 class Stack:
     def __init__(self):
@@ -39,6 +48,8 @@ class Explorer(AbstAgent):
         """
 
         super().__init__(env, config_file)
+        if self.PATHFINDER != "field" and self.PATHFINDER not in PATHFINDERS:
+            raise ValueError(f"unknown PATHFINDER {self.PATHFINDER}: expected field or one of {list(PATHFINDERS)}")
         self.walk_stack = Stack()  # a stack to store the movements
         self.set_state(VS.ACTIVE)  # explorer is active since the begin
         self.resc = resc           # reference to the rescuer agent
@@ -46,7 +57,8 @@ class Explorer(AbstAgent):
         self.y = 0                 # current y position relative to the origin 0
         self.time_to_comeback = math.ceil(self.TLIM * 0.6)  # set the time to come back to the base
         self.map = Map()           # create a map for representing the environment
-        self.victims = {}          # a dictionary of found victims: (seq): ((x,y), [<vs>])
+        self.home = DistanceField(self.map, self.COST_LINE, self.COST_DIAG)  # cost and path to the base from each explored cell
+        self.victims = VictimLog() # a dictionary of found victims: (seq): ((x,y), [<vs>])
                                    # the key is the seq number of the victim,(x,y) the position, <vs> the list of vital signals
                                    
         self.visited = set()       # a set to store the visited cells
@@ -135,8 +147,19 @@ class Explorer(AbstAgent):
             self.map.add((self.x, self.y), difficulty, seq, self.check_walls_and_lim())
             print(f"{self.NAME}:at ({self.x}, {self.y}), diffic: {difficulty:.2f} vict: {seq} rtime: {self.get_rtime()}")
 
+        # publish the new cells in the shared map
+        self.global_resources.publish_map(self)
         return
 
+    def way_home(self):
+        """ @return: the path from the current position to the base (both included) """
+        if self.PATHFINDER in PATHFINDERS:
+            planner = PATHFINDERS[self.PATHFINDER](self.map, (self.x, self.y), self.COST_LINE, self.COST_DIAG)
+            path = planner.run()
+            if path is not None:
+                return path
+        return self.home.path((self.x, self.y))
+
     def come_back(self):
         # dx, dy = self.walk_stack.pop()coming back
         # dx = dx * -1
@@ -172,13 +195,6 @@ class Explorer(AbstAgent):
             self.y += dy
             print(f"{self.NAME}: couldn't calculate the path at ({self.x}, {self.y}), rtime: {self.get_rtime()}")
        
-    def calculate_way_cust(self, way):
-        total_difficulty = 0
-        for node in way:
-            total_difficulty += self.map.get(node)[0]
-            
-        return total_difficulty
-         
     def deliberate(self) -> bool:
         """ The agent chooses the next action. The simulator calls this
         method at each cycle. Must be implemented in every agent"""
@@ -187,18 +203,18 @@ class Explorer(AbstAgent):
 
         if self.get_rtime() <= self.time_to_comeback and len(self.return_way) == 0:
             
-            astar = AStar(self.map, (self.x, self.y))
-            come_back_way = astar.run()
+            # time to walk back to the base from the current position
+            cust = self.home.cost((self.x, self.y))
             
-            if come_back_way == None:
+            if cust == None:
                 self.back_step()
                 self.force_return = True
             else:
-                cust = self.calculate_way_cust(come_back_way)
                 self.force_return = False
             
                 if self.get_rtime() <= cust * 1.6:
-                    come_back_way.pop(0) # remove the base from the way because the agent is already there
+                    come_back_way = self.way_home()
+                    come_back_way.pop(0) # remove the current position from the way because the agent is already there
                     self.return_way = come_back_way
                 else:
                     self.time_to_comeback = cust + self.get_rtime() / 2
@@ -1,27 +1,84 @@
 from matplotlib import pyplot as plt
 import numpy as np
 from map import Map
+from victim_distances import distance_matrix
 from vs.constants import VS
 
+class VictimLog(dict):
+    """ The dictionary of the victims found by an explorer, {seq: ((x, y), vital signals)}, that keeps the
+    version of the last change of each key (as Map), so that the victims added or read again since a merge
+    are merged without scanning the whole dictionary """
+
+    def __init__(self):
+        super().__init__()
+        self.version = 0        # number of changes
+        self.__changed = {}     # key -> version of its last change, in order of version
+        self.__order = {}       # key -> order of its first insertion
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+        self.__changed.pop(key, None)
+        self.__changed[key] = self.version
+        self.__order.setdefault(key, len(self.__order))
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def changed_since(self, version):
+        """ @return: the keys changed after a version, in the order of the dictionary """
+        changed = []
+        for key, last in reversed(self.__changed.items()):
+            if last <= version:
+                break
+            changed.append(key)
+        return sorted(changed, key=self.__order.__getitem__)
+
+
 class GlobalResources:
     def __init__(self):
         self.map = Map()
         self.explorers = []
         self.rescuers = []
         self.victims = {}
+        self.map_versions = []     # per explorer: the version of its map already merged into self.map
+        self.victims_merged = []   # per explorer: the version of its victims already merged into self.victims
         
     def add_explorer(self, explorer):
         self.explorers.append(explorer)
+        self.map_versions.append(0)
+        self.victims_merged.append(0)
         return self
         
     def add_rescuer(self, rescuer):
         self.rescuers.append(rescuer)
         return self
     
+    def publish_map(self, explorer):
+        """ Merge into the shared map the cells changed in the map of an explorer since its last publication.
+        When two explorers disagree on a cell, the one added last to the global resources wins """
+        i = self.explorers.index(explorer)
+        self.map_versions[i] = self.map.merge(explorer.map, self.map_versions[i], priority=i)
+
+    def map_changed_since(self, version):
+        """ @return: the current version of the shared map and the cells changed since the given version """
+        return self.map.version, self.map.changed_since(version)
+
+    def victim_distances(self, cost_line=1.0, cost_diag=1.5):
+        """ @return: the DistanceMatrix of the base and all the victims over the shared map, computed once per
+            map version; the rescuers take the submatrices of their victims (see victim_distances) """
+        positions = [(0, 0)] + [position for position, _ in self.victims.values()]
+        return distance_matrix(self.map, positions, cost_line, cost_diag)
+
     def _update_map(self):
         for explorer in self.explorers:
-            map_data = explorer.map.map_data
-            self.map.add_map_data(map_data)
+            self.publish_map(explorer)
         
     def all_explorers_finished(self):
         for explorer in self.explorers:
@@ -30,13 +87,23 @@ class GlobalResources:
         return True
     
     def release_rescuers(self):
+        # one distance matrix for the rescuers that plan the order of the victims, shared by their clusters
+        for rescuer in self.rescuers:
+            if rescuer.PLANNER == "order":
+                self.victim_distances(rescuer.COST_LINE, rescuer.COST_DIAG)
         for rescuer in self.rescuers:
             rescuer.start_work(self.map)
             print(f"ENV: {rescuer.NAME} is now active")
             
     def _add_victim(self):
-        for explorer in self.explorers:
-            self.victims.update(explorer.victims)
+        # only the victims found or read again since the last update (the whole dictionary if it is not a VictimLog)
+        for i, explorer in enumerate(self.explorers):
+            victims = explorer.victims
+            if isinstance(victims, VictimLog):
+                self.victims.update((key, victims[key]) for key in victims.changed_since(self.victims_merged[i]))
+                self.victims_merged[i] = victims.version
+            else:
+                self.victims.update(victims)
                 
     def update_explorers_data(self):
         self._update_map()
@@ -77,10 +144,7 @@ class GlobalResources:
         plt.xlabel('Eixo X')
         plt.ylabel('Eixo Y')
         
-        min_x = min(key[0] for key in self.map.map_data.keys())
-        max_x = max(key[0] for key in self.map.map_data.keys())
-        min_y = min(key[1] for key in self.map.map_data.keys())
-        max_y = max(key[1] for key in self.map.map_data.keys())
+        min_x, max_x, min_y, max_y = self.map.bounds()
         plt.axis([min_x - 1, max_x + 1, max_y + 1, min_y - 1])
                     
         plt.scatter(0, 0, color='black', marker='*', label='Base')
@@ -0,0 +1,418 @@
+## HPA* (HIERARCHICAL PATHFINDING)
+### Path search on large explored maps. The map is split into square clusters of
+### CLUSTER_SIZE x CLUSTER_SIZE cells. Where two neighboring clusters touch, the crossings
+### between their border cells are grouped into entrances, each represented by one or two
+### transitions (a pair of adjacent cells, one on each side). The cells of the transitions
+### are the nodes of an abstract graph, whose edges are the transitions themselves and the
+### costs between the nodes of a same cluster, precomputed with a Dijkstra restricted to the
+### cluster. A query links the start and the goal to the nodes of their clusters, searches
+### the small abstract graph with A* and refines only the abstract path into cells, cluster
+### by cluster.
+###
+### Walking into a cell costs COST_LINE or COST_DIAG times its difficulty, as charged by the
+### environment; walls (difficulty VS.OBST_WALL) and unknown cells cannot be entered (the same
+### cost model as a_star.AStar). Paths are near-optimal: they pass through the transitions.
+###
+### The hierarchy is kept per map and updated with the cells changed since the last query
+### (Map.changed_since): only the borders and the clusters around the changed cells are
+### computed again. The searches inside the clusters run on scipy's sparse graphs.
+###
+### A. Botea, M. Müller and J. Schaeffer. Near Optimal Hierarchical Path-Finding. JOGD 2004.
+###
+### Interface of a_star.AStar, with any goal (the base by default):
+###    HPAStar(map, position).run()              -> path from position to the base
+###    HPAStar(map, victim, goal=other).run()    -> path between two victims
+### To compare with a_star.AStar:
+###    python hpa_star.py --generate 1000
+
+import time
+import heapq
+import random
+import weakref
+import argparse
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from map import Map
+from vs.constants import VS
+
+INF = float("inf")
+CLUSTER_SIZE = 16
+RUN_SPLIT = 6      # entrances at least this long get a transition at each end, shorter ones in the middle
+
+# increments of the 8 directions
+NEIGHBORS = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)]
+
+
+class _Hierarchy:
+    """ Clusters, transitions and abstract graph of a map, for one cluster size and cost model """
+
+    def __init__(self, map:Map, size, cost_line, cost_diag):
+        self.__map = weakref.ref(map)   # weak: the map is the key of the hierarchy in _hierarchies
+        self.size = size
+        self.cost_line = cost_line
+        self.cost_diag = cost_diag
+        self.borders = {}          # (cluster, cluster) -> list of transitions (cell of the first, cell of the second)
+        self.nodes = {}            # cluster -> list of its nodes (cells of transitions)
+        self.edges = {}            # node -> [(node, cost)]: its transitions and the nodes reachable inside its cluster
+        self.min_difficulty = INF  # lower bound of the difficulty of the passable cells, for the heuristic
+        self.version = 0
+        self.update()
+
+    @property
+    def map(self):
+        return self.__map()
+
+    def cluster(self, coord):
+        return coord[0] // self.size, coord[1] // self.size
+
+    def step(self, coord, to, difficulty):
+        if coord[0] == to[0] or coord[1] == to[1]:
+            return self.cost_line * difficulty
+        return self.cost_diag * difficulty
+
+    def update(self):
+        """ Compute again the borders and the clusters around the cells changed since the last update """
+        if self.map.version == self.version:
+            return
+        changed = self.map.changed_since(self.version)
+        self.version = self.map.version
+
+        coords = np.array(changed, dtype=np.int64)
+        touched = set(map(tuple, np.unique(coords // self.size, axis=0).tolist()))
+        (x0, y0), (x1, y1) = coords.min(axis=0), coords.max(axis=0)
+        difficulty, _ = self.map.region(int(x0), int(y0), int(x1 - x0 + 1), int(y1 - y0 + 1))
+        difficulty = difficulty[coords[:, 0] - x0, coords[:, 1] - y0]
+        difficulty = difficulty[difficulty < VS.OBST_WALL]
+        if difficulty.size:
+            self.min_difficulty = min(self.min_difficulty, float(difficulty.min()))
+
+        # the neighbors of the touched clusters are connected again only if their common border changed
+        borders = set()
+        for cx, cy in touched:
+            for dx, dy in NEIGHBORS:
+                other = (cx + dx, cy + dy)
+                borders.add(min((cx, cy), other) + max((cx, cy), other))
+        changed = set(changed)
+        for cx1, cy1, cx2, cy2 in borders:
+            if self.__border((cx1, cy1), (cx2, cy2), changed):
+                touched.add((cx1, cy1))
+                touched.add((cx2, cy2))
+        for cluster in touched:
+            self.__connect(cluster)
+
+    def graph(self, cluster):
+        """ @return: the sparse graph of the moves inside a cluster; the local index of (x, y) is
+            (x - x0) * size + (y - y0), and the weight of an edge is the cost of entering its target """
+        size = self.size
+        difficulty, known = self.map.region(cluster[0] * self.size, cluster[1] * self.size, size, size)
+        passable = known & (difficulty < VS.OBST_WALL)
+        index = np.arange(size * size).reshape(size, size)
+        rows, cols, weights = [], [], []
+        for dx, dy in NEIGHBORS:
+            source = (slice(max(0, -dx), size - max(0, dx)), slice(max(0, -dy), size - max(0, dy)))
+            target = (slice(max(0, dx), size - max(0, -dx)), slice(max(0, dy), size - max(0, -dy)))
+            ok = known[source] & passable[target]
+            step = self.cost_line if dx == 0 or dy == 0 else self.cost_diag
+            rows.append(index[source][ok])
+            cols.append(index[target][ok])
+            weights.append(step * difficulty[target][ok])
+        return csr_matrix((np.concatenate(weights), (np.concatenate(rows), np.concatenate(cols))),
+                          shape=(size * size, size * size))
+
+    def local(self, cluster, coord):
+        return (coord[0] - cluster[0] * self.size) * self.size + coord[1] - cluster[1] * self.size
+
+    def __border(self, first, second, changed):
+        """ Find the transitions between two neighboring clusters (first < second)
+            @param changed: the cells changed in the map
+            @return: True if the transitions or the cost of crossing them changed """
+        size = self.size
+        dx, dy = second[0] - first[0], second[1] - first[1]
+        transitions = []
+        if dx == 0 or dy == 0:
+            # side: the last line of cells of the first cluster against the first line of the second
+            if dx:
+                x0, y0 = second[0] * size - 1, first[1] * size
+                difficulty, known = self.map.region(x0, y0, 2, size)
+                cell = lambda side, k: (x0 + side, y0 + k)
+            else:
+                x0, y0 = first[0] * size, second[1] * size - 1
+                difficulty, known = self.map.region(x0, y0, size, 2)
+                difficulty, known = difficulty.T, known.T
+                cell = lambda side, k: (x0 + k, y0 + side)
+            passable = (known & (difficulty < VS.OBST_WALL)).tolist()
+            a, b = passable
+            straight = [a[k] and b[k] for k in range(size)]
+
+            # entrances: runs of straight crossings
+            k = 0
+            while k < size:
+                if not straight[k]:
+                    k += 1
+                    continue
+                end = k
+                while end + 1 < size and straight[end + 1]:
+                    end += 1
+                ends = (k, end) if end - k + 1 >= RUN_SPLIT else ((k + end) // 2,)
+                transitions.extend((cell(0, i), cell(1, i)) for i in ends)
+                k = end + 1
+
+            # diagonal crossings whose cells are not in an entrance
+            for k in range(size):
+                for other in (k - 1, k + 1):
+                    if 0 <= other < size and a[k] and b[other] and not straight[k] and not straight[other]:
+                        transitions.append((cell(0, k), cell(1, other)))
+        else:
+            # corner: a diagonal step between the corner cells
+            a = (second[0] * size - 1, first[1] * size if dy < 0 else second[1] * size - 1)
+            b = (a[0] + 1, a[1] + dy)
+            if self.__passable(a) and self.__passable(b):
+                transitions.append((a, b))
+
+        key = first + second
+        if self.borders.get(key, []) == transitions:
+            return any(a in changed or b in changed for a, b in transitions)
+        if transitions:
+            self.borders[key] = transitions
+        else:
+            del self.borders[key]
+        return True
+
+    def __passable(self, coord):
+        item = self.map.get(coord)
+        return item is not None and item[0] < VS.OBST_WALL
+
+    def __connect(self, cluster):
+        """ Compute the nodes of a cluster, their transitions and the costs between them """
+        cx, cy = cluster
+        entrances = {}
+        for dx, dy in NEIGHBORS:
+            other = (cx + dx, cy + dy)
+            if cluster < other:
+                pairs = self.borders.get(cluster + other, ())
+            else:
+                pairs = [(b, a) for a, b in self.borders.get(other + cluster, ())]
+            for a, b in pairs:
+                entrances.setdefault(a, []).append((b, self.step(a, b, self.map.get(b)[0])))
+        for node in self.nodes.pop(cluster, ()):
+            del self.edges[node]
+        if not entrances:
+            return
+
+        nodes = list(entrances)
+        dist = dijkstra(self.graph(cluster), indices=[self.local(cluster, node) for node in nodes])
+        dist = dist[:, [self.local(cluster, node) for node in nodes]].tolist()
+        self.nodes[cluster] = nodes
+        for u, row in zip(nodes, dist):
+            self.edges[u] = entrances[u] + [(v, d) for v, d in zip(nodes, row) if d < INF and v != u]
+
+    def size_of_graph(self):
+        """ @return: the number of nodes and of edges of the abstract graph """
+        return len(self.edges), sum(len(edges) for edges in self.edges.values())
+
+
+# one hierarchy per map and cost model, released with the map
+_hierarchies = weakref.WeakKeyDictionary()
+
+
+class HPAStar:
+    def __init__(self, map:Map, end_position:tuple, cost_line=1.0, cost_diag=1.5, goal=(0, 0),
+                 cluster_size=CLUSTER_SIZE):
+        """ @param map: the explored map
+            @param end_position: the position the search starts from
+            @param cost_line: cost of a horizontal or vertical step into a cell of difficulty 1
+            @param cost_diag: cost of a diagonal step into a cell of difficulty 1
+            @param goal: the position the path goes to (the base by default)
+            @param cluster_size: side of the clusters """
+        hierarchies = _hierarchies.setdefault(map, {})
+        hierarchy = hierarchies.get((cluster_size, cost_line, cost_diag))
+        if hierarchy is None:
+            hierarchy = _Hierarchy(map, cluster_size, cost_line, cost_diag)
+            hierarchies[(cluster_size, cost_line, cost_diag)] = hierarchy
+        else:
+            hierarchy.update()
+
+        self.hierarchy = hierarchy
+        self.start_position = (end_position[0], end_position[1])
+        self.end_position = (goal[0], goal[1])
+        self.cost = None           # cost of the path found in the last run
+        self.expanded = 0          # number of abstract nodes expanded in the last run
+
+    def run(self):
+        """ @return: the list of positions from the start to the goal (both included), or None """
+        hierarchy = self.hierarchy
+        start, goal = self.start_position, self.end_position
+        self.cost = None
+        self.expanded = 0
+        if not hierarchy.map.in_map(start) or not hierarchy.map.in_map(goal):
+            return None
+        if start == goal:
+            self.cost = 0.0
+            return [start]
+
+        # link the start and the goal to the nodes of their clusters
+        first, last = hierarchy.cluster(start), hierarchy.cluster(goal)
+        graphs = {first: hierarchy.graph(first)}
+        if last not in graphs:
+            graphs[last] = hierarchy.graph(last)
+        from_start = self.__costs(first, graphs[first], start, hierarchy.nodes.get(first, []) + [goal])
+        to_goal = self.__costs(last, graphs[last].T, goal, hierarchy.nodes.get(last, []))
+
+        abstract = self.__search(from_start, to_goal)
+        if abstract is None:
+            return None
+
+        # refine the abstract path: transitions are single steps, the rest is walked inside the clusters
+        path = [start]
+        for p, q in zip(abstract, abstract[1:]):
+            cluster = hierarchy.cluster(p)
+            if cluster != hierarchy.cluster(q):
+                path.append(q)
+                continue
+            graph = graphs.get(cluster)
+            if graph is None:
+                graph = graphs[cluster] = hierarchy.graph(cluster)
+            _, predecessors = dijkstra(graph, indices=hierarchy.local(cluster, p), return_predecessors=True)
+            segment = []
+            i = hierarchy.local(cluster, q)
+            while i >= 0 and i != hierarchy.local(cluster, p):
+                segment.append((cluster[0] * hierarchy.size + i // hierarchy.size,
+                                cluster[1] * hierarchy.size + i % hierarchy.size))
+                i = predecessors[i]
+            path.extend(reversed(segment))
+        return path
+
+    def __costs(self, cluster, graph, source, targets):
+        """ @return: {target: cost} of the targets of the cluster reachable from the source inside the cluster """
+        hierarchy = self.hierarchy
+        dist = dijkstra(graph, indices=hierarchy.local(cluster, source)).tolist()
+        return {target: dist[hierarchy.local(cluster, target)] for target in targets
+                if target != source and hierarchy.cluster(target) == cluster
+                and dist[hierarchy.local(cluster, target)] < INF}
+
+    def __search(self, from_start, to_goal):
+        """ A* over the abstract graph
+            @return: the list of nodes from the start to the goal, or None """
+        hierarchy = self.hierarchy
+        start, goal = self.start_position, self.end_position
+        edges = hierarchy.edges
+        scale = hierarchy.min_difficulty if hierarchy.min_difficulty < INF else 1.0
+        line = scale * hierarchy.cost_line
+        diag = scale * min(hierarchy.cost_diag, 2 * hierarchy.cost_line) - line
+        gx, gy = goal
+
+        def h(coord):
+            # octile distance: line * max(dx, dy) + (diag - line) * min(dx, dy)
+            dx, dy = abs(coord[0] - gx), abs(coord[1] - gy)
+            return line * dx + diag * dy if dx > dy else line * dy + diag * dx
+
+        g = {start: 0.0}
+        parent = {start: None}
+        closed = set()
+        heap = [(h(start), start)]
+        while heap:
+            _, current = heapq.heappop(heap)
+            if current in closed:
+                continue        # outdated entry
+            closed.add(current)
+            self.expanded += 1
+            if current == goal:
+                self.cost = g[goal]
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = parent[current]
+                return path[::-1]
+
+            successors = edges.get(current, ())
+            if current == start:
+                successors = list(successors) + list(from_start.items())
+            if current in to_goal:
+                successors = list(successors) + [(goal, to_goal[current])]
+
+            gc = g[current]
+            for neighbor, cost in successors:
+                tentative_g = gc + cost
+                if neighbor not in closed and tentative_g < g.get(neighbor, INF):
+                    g[neighbor] = tentative_g
+                    parent[neighbor] = current
+                    heapq.heappush(heap, (tentative_g + h(neighbor), neighbor))
+        return None
+
+
+def full_map(obst, base):
+    """ @return: a Map with the passable cells of a grid, relative to the base """
+    m = Map()
+    for x, y in zip(*np.nonzero(obst < VS.OBST_WALL)):
+        m.add((int(x) - base[0], int(y) - base[1]), float(obst[x, y]), VS.NO_VICTIM, [VS.CLEAR] * 8)
+    return m
+
+
+if __name__ == '__main__':
+    from a_star import AStar
+    from vs import scenario
+
+    parser = argparse.ArgumentParser(description="Preprocessing, latency and path costs of HPA* against A*")
+    parser.add_argument("data_folder", nargs="?", help="scenario folder (default: data_400v_90x90)")
+    parser.add_argument("--generate", type=int, metavar="SIZE", help="use a generated SIZE x SIZE map instead")
+    parser.add_argument("--cluster", type=int, default=CLUSTER_SIZE, help="side of the clusters")
+    parser.add_argument("--queries", type=int, default=50, help="number of random start positions")
+    parser.add_argument("--changes", type=int, default=100, help="cells changed before the last query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.generate:
+        from scenario_generator import generate_obstacles, DIFFICULTIES
+        base = (args.generate // 2, args.generate // 2)
+        obst = generate_obstacles(np.random.default_rng(args.seed), args.generate, args.generate, 0.1,
+                                  DIFFICULTIES, 4, base)
+        name = f"generated {args.generate}x{args.generate}"
+    else:
+        name = args.data_folder or "datasets/data_400v_90x90"
+        data = scenario.load(name)
+        obst, base = data["obst"], tuple(data["config"]["BASE"])
+
+    m = full_map(obst, base)
+    rng = random.Random(args.seed)
+    cells = m.coords()
+    queries = [(rng.choice(cells), rng.choice([(0, 0), rng.choice(cells)])) for _ in range(args.queries)]
+    print(f"{name}: {len(cells)} cells, {args.queries} queries, clusters of {args.cluster}x{args.cluster}")
+
+    start = time.perf_counter()
+    HPAStar(m, (0, 0), cluster_size=args.cluster)
+    nodes, edges = _hierarchies[m][(args.cluster, 1.0, 1.5)].size_of_graph()
+    print(f"   preprocessing {time.perf_counter() - start:8.3f} s   {nodes} abstract nodes, {edges} edges")
+
+    # a_star.AStar only goes to the base: it is compared on those queries
+    results = {"HPAStar": [0.0, 0.0, 0], "AStar": [0.0, 0.0, 0]}
+    ratios = []
+    for source, goal in queries:
+        start = time.perf_counter()
+        hpa = HPAStar(m, source, goal=goal, cluster_size=args.cluster)
+        hpa.run()
+        results["HPAStar"][0] += time.perf_counter() - start
+        results["HPAStar"][2] += hpa.expanded
+        if goal != (0, 0):
+            continue
+        start = time.perf_counter()
+        astar = AStar(m, source)
+        astar.run()
+        results["AStar"][0] += time.perf_counter() - start
+        results["AStar"][2] += astar.expanded
+        if astar.cost:
+            ratios.append(hpa.cost / astar.cost)
+    to_base = len(ratios)
+    for planner, (elapsed, _, expanded) in results.items():
+        n = args.queries if planner == "HPAStar" else max(to_base, 1)
+        print(f"   {planner:8s} {n:5d} queries  {elapsed / n * 1000:9.3f} ms/query  {expanded / n:10.1f} expansions/query")
+    if ratios:
+        print(f"   HPA* path cost / optimal cost: mean {np.mean(ratios):.4f}, max {max(ratios):.4f}")
+
+    # incremental update: change some difficulties and plan again
+    for _ in range(args.changes):
+        coord = rng.choice(cells)
+        m.add(coord, rng.choice([1.0, 2.0, 3.0, VS.OBST_WALL]), VS.NO_VICTIM, [VS.CLEAR] * 8)
+    start = time.perf_counter()
+    HPAStar(m, queries[0][0], cluster_size=args.cluster).run()
+    print(f"   {args.changes} changed cells: update and query {(time.perf_counter() - start) * 1000:.1f} ms")
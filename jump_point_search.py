@@ -0,0 +1,230 @@
+## JUMP POINT SEARCH
+### An alternative to a_star.AStar for maps with large regions of equal difficulty, with the
+### same interface and cost model: JumpPointSearch(map, position).run() returns the optimal
+### path from the position to the base.
+###
+### In a region where all the cells have the same difficulty, many paths between two cells
+### have the same cost, and A* expands all of them. JPS expands only the jump points: from a
+### cell it goes straight (or diagonally) while the cells ahead have nothing that could make
+### another path shorter (a wall next to the line: a forced neighbor), and only the cell
+### where it stops is put in the open set.
+###
+### Weighted variant: the pruning is valid only where the moves cost the same, so a jump
+### also stops at a cell with a neighbor of a different difficulty (not uniform, see
+### a_star._Engine.uniform), and such cells are expanded in all the 8 directions as in A*.
+### Diagonal moves may cut corners, as in the environment.
+###
+### D. Harabor and A. Grastien. Online Graph Pruning for Pathfinding on Grid Maps. AAAI 2011.
+###
+### To compare with a_star.AStar:
+###    python jump_point_search.py datasets/data_400v_90x90
+###    python jump_point_search.py --generate 400 --uniform
+
+import time
+import heapq
+import random
+import argparse
+import numpy as np
+from map import Map
+from vs.constants import VS
+import a_star
+
+
+class JumpPointSearch:
+    def __init__(self, map:Map, end_position:tuple, cost_line=1.0, cost_diag=1.5):
+        """ @param map: the explored map
+            @param end_position: the position the search starts from; the path goes to the base (0, 0)
+            @param cost_line: cost of a horizontal or vertical step into a cell of difficulty 1
+            @param cost_diag: cost of a diagonal step into a cell of difficulty 1 """
+        self.engine = a_star.engine(map)
+        self.start_position = (end_position[0], end_position[1])
+        self.end_position = (0, 0)
+        self.cost_line = cost_line
+        self.cost_diag = cost_diag
+        self.cost = None           # cost of the path found in the last run
+        self.expanded = 0          # number of jump points expanded in the last run
+
+    def reconstruct_path(self, current):
+        """ @return: the cells from the start to current, filling the lines between the jump points """
+        engine = self.engine
+        path = [engine.coord(current)]
+        while engine.parent[current] != -1:
+            x, y = engine.coord(current)
+            px, py = engine.coord(engine.parent[current])
+            dx, dy = (px > x) - (px < x), (py > y) - (py < y)
+            while (x, y) != (px, py):
+                x, y = x + dx, y + dy
+                path.append((x, y))
+            current = engine.parent[current]
+        return path[::-1]
+
+    def run(self):
+        """ @return: the list of positions from the start to the base (both included), or None """
+        engine = self.engine
+        engine.epoch += 1
+        epoch = engine.epoch
+        cost, passable = engine.cost, engine.passable
+        g, parent, seen, closed = engine.g, engine.parent, engine.seen, engine.closed
+        h = engine.heuristic("octile", self.cost_line, self.cost_diag)
+        uniform = engine.uniform()
+        stride = engine.stride
+
+        self.cost = None
+        self.expanded = 0
+        if not (engine.min_x <= self.start_position[0] <= engine.max_x and
+                engine.min_y <= self.start_position[1] <= engine.max_y):
+            return None
+
+        start = engine.index(*self.start_position)
+        end = engine.index(*self.end_position)
+        g[start] = 0.0
+        parent[start] = -1
+        seen[start] = epoch
+        heap = [(h[start], start)]
+        expanded = 0
+
+        while heap:
+            _, current = heapq.heappop(heap)
+            if closed[current] == epoch:
+                continue        # outdated entry
+            closed[current] = epoch
+            expanded += 1
+
+            if current == end:
+                self.expanded = expanded
+                self.cost = g[current]
+                return self.reconstruct_path(current)
+
+            if parent[current] == -1 or not uniform[current]:
+                directions = a_star.MOVES
+            else:
+                x, y = divmod(current, stride)
+                px, py = divmod(parent[current], stride)
+                directions = self.__prune(current, (x > px) - (x < px), (y > py) - (y < py))
+
+            gc = g[current]
+            for dx, dy in directions:
+                # first step inline: in the regions of variable difficulty the jumps stop there, as in A*
+                neighbor = current + dx * stride + dy
+                if not passable[neighbor]:
+                    continue
+                if neighbor == end or not uniform[neighbor]:
+                    step = (self.cost_line if dx == 0 or dy == 0 else self.cost_diag) * cost[neighbor]
+                else:
+                    jump = self.__jump(current, dx, dy, end)
+                    if jump is None:
+                        continue
+                    neighbor, step = jump
+                if closed[neighbor] == epoch:
+                    continue
+
+                tentative_g = gc + step
+                if seen[neighbor] != epoch or tentative_g < g[neighbor]:
+                    seen[neighbor] = epoch
+                    parent[neighbor] = current
+                    g[neighbor] = tentative_g
+                    heapq.heappush(heap, (tentative_g + h[neighbor], neighbor))
+
+        self.expanded = expanded
+        return None
+
+    def __prune(self, i, dx, dy):
+        """ @return: the directions to search from cell i reached moving in (dx, dy): the natural and the forced ones """
+        passable, stride = self.engine.passable, self.engine.stride
+        if dx and dy:
+            directions = [(dx, 0), (0, dy), (dx, dy)]
+            if not passable[i - dx * stride] and passable[i - dx * stride + dy]:
+                directions.append((-dx, dy))
+            if not passable[i - dy] and passable[i + dx * stride - dy]:
+                directions.append((dx, -dy))
+        elif dx:
+            directions = [(dx, 0)]
+            for side in (-1, 1):
+                if not passable[i + side] and passable[i + dx * stride + side]:
+                    directions.append((dx, side))
+        else:
+            directions = [(0, dy)]
+            for side in (-1, 1):
+                if not passable[i + side * stride] and passable[i + side * stride + dy]:
+                    directions.append((side, dy))
+        return directions
+
+    def __jump(self, i, dx, dy, end):
+        """ Walk from cell i in the direction (dx, dy) until a jump point
+            @return: (jump point, cost of the walk), or None if the walk hits a wall """
+        engine = self.engine
+        passable, cost, uniform, stride = engine.passable, engine.cost, engine.uniform_cells, engine.stride
+        offset = dx * stride + dy
+        step = self.cost_line if dx == 0 or dy == 0 else self.cost_diag
+        walked = 0.0
+        while True:
+            i += offset
+            if not passable[i]:
+                return None
+            walked += step * cost[i]
+            if i == end or not uniform[i]:
+                return i, walked
+
+            if dx and dy:
+                if (not passable[i - dx * stride] and passable[i - dx * stride + dy]) or \
+                   (not passable[i - dy] and passable[i + dx * stride - dy]):
+                    return i, walked
+                # a jump point reachable straight from here makes this cell a jump point
+                if self.__jump(i, dx, 0, end) is not None or self.__jump(i, 0, dy, end) is not None:
+                    return i, walked
+            elif dx:
+                if (not passable[i + 1] and passable[i + offset + 1]) or \
+                   (not passable[i - 1] and passable[i + offset - 1]):
+                    return i, walked
+            else:
+                if (not passable[i + stride] and passable[i + offset + stride]) or \
+                   (not passable[i - stride] and passable[i + offset - stride]):
+                    return i, walked
+
+
+if __name__ == '__main__':
+    from vs import scenario
+    from hpa_star import full_map
+
+    parser = argparse.ArgumentParser(description="Expanded nodes and latency of JPS against A*")
+    parser.add_argument("data_folder", nargs="?", help="scenario folder (default: data_400v_90x90)")
+    parser.add_argument("--generate", type=int, metavar="SIZE", help="use a generated SIZE x SIZE map instead")
+    parser.add_argument("--uniform", action="store_true", help="generate all the cells with difficulty 1")
+    parser.add_argument("--queries", type=int, default=100, help="number of random start positions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.generate:
+        from scenario_generator import generate_obstacles, DIFFICULTIES
+        base = (args.generate // 2, args.generate // 2)
+        obst = generate_obstacles(np.random.default_rng(args.seed), args.generate, args.generate, 0.1,
+                                  {1.0: 1} if args.uniform else DIFFICULTIES, 4, base)
+        name = f"generated {args.generate}x{args.generate}"
+    else:
+        name = args.data_folder or "datasets/data_400v_90x90"
+        data = scenario.load(name)
+        obst, base = data["obst"], tuple(data["config"]["BASE"])
+
+    m = full_map(obst, base)
+    rng = random.Random(args.seed)
+    cells = m.coords()
+    starts = [rng.choice(cells) for _ in range(args.queries)]
+    uniform = a_star.engine(m).uniform()
+    print(f"{name}: {len(cells)} cells ({sum(uniform) / len(cells):.0%} uniform), {args.queries} queries to the base")
+
+    costs = {}
+    for planner in (a_star.AStar, JumpPointSearch):
+        elapsed = expanded = 0
+        costs[planner] = []
+        for start in starts:
+            search = planner(m, start)
+            begin = time.perf_counter()
+            search.run()
+            elapsed += time.perf_counter() - begin
+            expanded += search.expanded
+            costs[planner].append(search.cost)
+        print(f"   {planner.__name__:16s} {elapsed / args.queries * 1000:9.3f} ms/query  "
+              f"{expanded / args.queries:10.1f} expansions/query")
+    same = all(a == b or (a is not None and b is not None and abs(a - b) < 1e-6)
+               for a, b in zip(costs[a_star.AStar], costs[JumpPointSearch]))
+    print(f"   same path costs: {same}")
@@ -1,6 +1,7 @@
 import sys
 import os
 import time
+import argparse
 import joblib
 
 # Importa classes
@@ -12,8 +13,9 @@ from explorer import Explorer
 from fuzzy import Fuzzy
 
 # Carregar modelos treinados
-mlp_regressor = joblib.load('mlp_regressor.pkl')
-tree_regressor = joblib.load('tree_regressor.pkl')
+models_folder = os.path.dirname(os.path.abspath(__file__))
+mlp_regressor = joblib.load(os.path.join(models_folder, 'mlp_regressor.pkl'))
+tree_regressor = joblib.load(os.path.join(models_folder, 'tree_regressor.pkl'))
 
 # Função para estimar gravidade
 def estimate_gravity(vital_signs):
@@ -22,17 +24,19 @@ def estimate_gravity(vital_signs):
     return gravity
 
 
-def main(data_folder_name):
+def main(data_folder_name, headless=False, explorer_file=None, rescuer_file=None, log_file=None):
     # Set the path to config files and data files for the environment
     current_folder = os.path.abspath(os.getcwd())
     data_folder = os.path.abspath(os.path.join(current_folder, data_folder_name))
 
     # Instantiate the environment
-    env = Env(data_folder)
+    env = Env(data_folder, headless=headless)
     
-    # Config files for the agents
-    rescuer_file = os.path.join(data_folder, "rescuer_config.txt")
-    explorer_file = os.path.join(data_folder, "explorer_config.txt")
+    # Config files for the agents (by default, the ones of the data folder)
+    if rescuer_file is None:
+        rescuer_file = os.path.join(data_folder, "rescuer_config.txt")
+    if explorer_file is None:
+        explorer_file = os.path.join(data_folder, "explorer_config.txt")
     
     fuzzy = Fuzzy()
     decision_tree = DecisionTree()
@@ -67,15 +71,16 @@ def main(data_folder_name):
     expl4.add_global_resources(global_resources)
 
     # Run the environment simulator
-    env.run()
+    return env.run(log_file)
     
 if __name__ == '__main__':
     """ To get data from a different folder than the default called data
-    pass it by the argument line"""
+    pass it by the argument line. Use --headless to run without window and prompts"""
     
-    if len(sys.argv) > 1:
-        data_folder_name = sys.argv[1]
-    else:
-        data_folder_name = os.path.join("datasets", "data_10v_12X12")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data_folder", nargs="?", default=os.path.join("datasets", "data_10v_12X12"))
+    parser.add_argument("--headless", action="store_true", help="run without pygame window, delay and prompts")
+    parser.add_argument("--record", metavar="LOG_FILE", help="record the actions of the agents for replay (python -m vs.action_log LOG_FILE)")
+    args = parser.parse_args()
         
-    main(data_folder_name)
+    main(args.data_folder, args.headless, log_file=args.record)
@@ -2,10 +2,9 @@
 # @Author: Cesar A. Tacla, UTFPR
 #
 ## A map representing the explored region of the 2D grid
-## The map is a dictionaire whose keys are pairs (x, y).
-## The map contains only visited positions.
+## The map is indexed by pairs (x, y) relative to the base and contains only visited positions.
 ##
-## Associated to each key, there are:
+## Associated to each position, there are:
 ## - the degree of difficulty to access the cell
 ## - the victim seq number (if there is one) or VS.NO_VICTIM if there is no victim
 ## - the known actions' results from the cell represented as vector of 8 integers, in the following
@@ -16,43 +15,185 @@
 ##   VS.WALL the agent cannot execute the action (there is a wall),
 ##   VS.END  the agent cannot execute the action (end of grid)
 ##   VS.CLEAR the agent can execute the action
+##
+## The data is kept in NumPy arrays that grow (doubling) to cover the explored region:
+## difficulty (float64), victim seq (int32), actions' results packed in 2 bits per
+## direction (uint16), a known bitmap and the priority of the source of merged cells (int16),
+## 17 bytes per cell of the bounding box.
+## The bounds of the explored region are kept up to date by add.
+## map_data is a read-only dictionary-like view {(x, y): (difficulty, victim_seq, actions_res)}.
+##
+## Every change of a cell increments the version of the map, and the map keeps the version of the
+## last change of each cell (one entry per cell, however many times it changes).
+## changed_since(version) returns the cells changed after a version, and merge copies only those
+## cells from another map (see GlobalResources).
 
+from collections.abc import Mapping
+import numpy as np
 from vs.constants import VS
 
+
+class MapData(Mapping):
+    """ Read-only view of a Map as a dictionary {(x, y): (difficulty, victim_seq, actions_res)} """
+
+    def __init__(self, map):
+        self.map = map
+
+    def __getitem__(self, coord):
+        item = self.map.get(coord)
+        if item is None:
+            raise KeyError(coord)
+        return item
+
+    def __contains__(self, coord):
+        return self.map.in_map(coord)
+
+    def __iter__(self):
+        return iter(self.map.coords())
+
+    def __len__(self):
+        return len(self.map)
+
+
 class Map:
+    INITIAL_SIZE = 16        # initial side of the arrays, centered at the base
+
     def __init__(self):
-        self.map_data = {}
+        self.__ox = -Map.INITIAL_SIZE // 2     # coordinates of the cell at index [0, 0] of the arrays
+        self.__oy = -Map.INITIAL_SIZE // 2
+        shape = (Map.INITIAL_SIZE, Map.INITIAL_SIZE)
+        self.difficulty = np.zeros(shape, dtype=np.float64)
+        self.victim_seq = np.full(shape, VS.NO_VICTIM, dtype=np.int32)
+        self.actions = np.zeros(shape, dtype=np.uint16)
+        self.known = np.zeros(shape, dtype=bool)
+        self.source = np.full(shape, -1, dtype=np.int16)   # priority of the map a cell was merged from (see merge)
+        self.__size = 0
+        self.__version = 0       # number of changes made to the map
+        self.__changed = {}      # position -> version of its last change, in order of version
+
+        # bounds of the known cells (inclusive); None while the map is empty
+        self.min_x = self.max_x = self.min_y = self.max_y = None
+        self.__decoded = {}      # packed actions -> tuple of 8 results
+        self.__encoded = {}      # tuple of 8 results -> packed actions
+
+    @property
+    def map_data(self):
+        return MapData(self)
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def version(self):
+        """ @return: the number of changes made to the map so far """
+        return self.__version
+
+    def changed_since(self, version):
+        """ @param version: a previous value of self.version
+            @return: the positions (x, y) changed after that version, without repetitions, in order of their last change """
+        changed = []
+        for coord, last in reversed(self.__changed.items()):
+            if last <= version:
+                break
+            changed.append(coord)
+        return changed[::-1]
+
+    def __log(self, coords):
+        """ Record a change of each position """
+        changed = self.__changed
+        for coord in coords:
+            self.__version += 1
+            changed.pop(coord, None)
+            changed[coord] = self.__version
 
     def in_map(self, coord):
-        if coord in self.map_data:
-            return True
+        i = coord[0] - self.__ox
+        j = coord[1] - self.__oy
+        if 0 <= i < self.known.shape[0] and 0 <= j < self.known.shape[1]:
+            return bool(self.known[i, j])
 
         return False
 
     def get(self, coord):
-        """ @param coord: a pair (x, y), the key of the dictionary"""
-        return self.map_data.get(coord)
+        """ @param coord: a pair (x, y)
+            @return: a tuple (difficulty, victim_seq, actions_res) or None if the position is not in the map"""
+        if not self.in_map(coord):
+            return None
+
+        i = coord[0] - self.__ox
+        j = coord[1] - self.__oy
+        return (float(self.difficulty[i, j]), int(self.victim_seq[i, j]), list(self.__decode(int(self.actions[i, j]))))
 
     def add(self, coord, difficulty, victim_seq, actions_res):
         """ @param coord: a pair (x, y)
             @param difficulty: the degree of difficulty to acess the cell at coord
             @param victim_seq: the sequential number of the victim returned by the Environment
             @param actions_res: the results of the possible actions from the position (x, y) """
-        self.map_data[coord] = (difficulty, victim_seq, actions_res)
+        x, y = coord
+        self.__cover(x, y, x, y)
+
+        i = x - self.__ox
+        j = y - self.__oy
+        if not self.known[i, j]:
+            self.known[i, j] = True
+            self.__size += 1
+        self.difficulty[i, j] = difficulty
+        self.victim_seq[i, j] = victim_seq
+        key = tuple(actions_res)
+        packed = self.__encoded.get(key)
+        if packed is None:
+            packed = Map.encode_actions(key)
+            self.__encoded[key] = packed
+        self.actions[i, j] = packed
+        self.__log(((x, y),))
+
+    def bounds(self):
+        """ @return: (min_x, max_x, min_y, max_y) of the known cells, inclusive, or None if the map is empty """
+        if self.__size == 0:
+            return None
+        return self.min_x, self.max_x, self.min_y, self.max_y
+
+    def window(self):
+        """ The arrays restricted to the bounding box of the known cells (views, not copies)
+        @return: (min_x, min_y, difficulty, victim_seq, known), indexed by [x - min_x, y - min_y] """
+        if self.__size == 0:
+            return None
+        box = (slice(self.min_x - self.__ox, self.max_x - self.__ox + 1),
+               slice(self.min_y - self.__oy, self.max_y - self.__oy + 1))
+        return self.min_x, self.min_y, self.difficulty[box], self.victim_seq[box], self.known[box]
+
+    def region(self, x0, y0, width, height):
+        """ The arrays of any rectangle of positions (copies; the positions outside the arrays are unknown)
+        @return: (difficulty, known), indexed by [x - x0, y - y0] """
+        difficulty = np.zeros((width, height), dtype=np.float64)
+        known = np.zeros((width, height), dtype=bool)
+        w, h = self.known.shape
+        i0, j0 = max(x0 - self.__ox, 0), max(y0 - self.__oy, 0)
+        i1, j1 = min(x0 + width - self.__ox, w), min(y0 + height - self.__oy, h)
+        if i0 < i1 and j0 < j1:
+            box = (slice(i0 + self.__ox - x0, i1 + self.__ox - x0), slice(j0 + self.__oy - y0, j1 + self.__oy - y0))
+            difficulty[box] = self.difficulty[i0:i1, j0:j1]
+            known[box] = self.known[i0:i1, j0:j1]
+        return difficulty, known
+
+    def coords(self):
+        """ @return: the list of the known positions (x, y) """
+        xs, ys = np.nonzero(self.known)
+        return list(zip((xs + self.__ox).tolist(), (ys + self.__oy).tolist()))
+
+    def nbytes(self):
+        """ @return: memory used by the arrays in bytes """
+        return (self.difficulty.nbytes + self.victim_seq.nbytes + self.actions.nbytes + self.known.nbytes +
+                self.source.nbytes)
 
     def draw(self):
-        if not self.map_data:
+        if self.__size == 0:
             print("Map is empty.")
             return
 
-        min_x = min(key[0] for key in self.map_data.keys())
-        max_x = max(key[0] for key in self.map_data.keys())
-        min_y = min(key[1] for key in self.map_data.keys())
-        max_y = max(key[1] for key in self.map_data.keys())
-
-        for y in range(min_y, max_y + 1):
+        for y in range(self.min_y, self.max_y + 1):
             row = ""
-            for x in range(min_x, max_x + 1):
+            for x in range(self.min_x, self.max_x + 1):
                 item = self.get((x, y))
                 if item:
                     if item[1] == VS.NO_VICTIM:
@@ -64,6 +205,106 @@ class Map:
             print(row)
 
     def add_map_data(self, map_data):
-        self.map_data.update(map_data)
+        """ Copy the positions of another map (a Map, its map_data or a dictionary), replacing the known ones """
+        if isinstance(map_data, MapData):
+            map_data = map_data.map
+        if not isinstance(map_data, Map):
+            for coord, (difficulty, victim_seq, actions_res) in map_data.items():
+                self.add(coord, difficulty, victim_seq, actions_res)
+            return
+
+        window = map_data.window()
+        if window is None:
+            return
+
+        min_x, min_y, difficulty, victim_seq, known = window
+        self.__cover(min_x, min_y, map_data.max_x, map_data.max_y)
+
+        box = (slice(min_x - self.__ox, map_data.max_x - self.__ox + 1),
+               slice(min_y - self.__oy, map_data.max_y - self.__oy + 1))
+        other_box = (slice(min_x - map_data.__ox, map_data.max_x - map_data.__ox + 1),
+                     slice(min_y - map_data.__oy, map_data.max_y - map_data.__oy + 1))
+
+        self.__size += int(np.count_nonzero(known & ~self.known[box]))
+        self.known[box] |= known
+        self.difficulty[box][known] = difficulty[known]
+        self.victim_seq[box][known] = victim_seq[known]
+        self.actions[box][known] = map_data.actions[other_box][known]
+        self.__log(map_data.coords())
+
+    def merge(self, other, since=0, priority=0):
+        """ Copy the cells of another map changed since one of its versions. Conflicts are resolved
+        deterministically, whatever the order of the merges: a cell merged from a map of higher
+        priority is not replaced by a map of lower priority; with the same priority, the last
+        change wins.
+        @param other: the map to merge from
+        @param since: the version of the other map already merged (0 for the whole map)
+        @param priority: the priority of the other map (e.g. the index of the explorer)
+        @return: the current version of the other map, to be passed as since in the next merge """
+
+        coords = other.changed_since(since)
+        if not coords:
+            return other.version
+
+        xs, ys = np.array(coords, dtype=np.int64).T
+        self.__cover(int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max()))
+
+        i, j = xs - self.__ox, ys - self.__oy
+        keep = self.source[i, j] <= priority
+        i, j = i[keep], j[keep]
+        oi, oj = xs[keep] - other.__ox, ys[keep] - other.__oy
+
+        self.__size += int(np.count_nonzero(~self.known[i, j]))
+        self.known[i, j] = True
+        self.difficulty[i, j] = other.difficulty[oi, oj]
+        self.victim_seq[i, j] = other.victim_seq[oi, oj]
+        self.actions[i, j] = other.actions[oi, oj]
+        self.source[i, j] = priority
+        self.__log(coord for coord, kept in zip(coords, keep.tolist()) if kept)
+
+        return other.version
+
+    @staticmethod
+    def encode_actions(actions_res):
+        """ Pack the 8 results {UNK, CLEAR, WALL, END} in 2 bits per direction (result + 1) """
+        packed = 0
+        for i, res in enumerate(actions_res):
+            packed |= (res + 1) << (2 * i)
+        return packed
+
+    def __decode(self, packed):
+        states = self.__decoded.get(packed)
+        if states is None:
+            states = tuple(((packed >> (2 * i)) & 3) - 1 for i in range(8))
+            self.__decoded[packed] = states
+        return states
+
+    def __cover(self, x0, y0, x1, y1):
+        """ Grow the arrays, at least doubling the side that grows, to contain the rectangle
+        (x0, y0)-(x1, y1), and update the bounds of the known cells to include it """
+
+        width, height = self.known.shape
+        ox, oy = self.__ox, self.__oy
+        if x0 < ox or y0 < oy or x1 >= ox + width or y1 >= oy + height:
+            nx0 = min(x0, ox - width) if x0 < ox else ox
+            ny0 = min(y0, oy - height) if y0 < oy else oy
+            nx1 = max(x1 + 1, ox + 2 * width) if x1 >= ox + width else ox + width
+            ny1 = max(y1 + 1, oy + 2 * height) if y1 >= oy + height else oy + height
+
+            shape = (nx1 - nx0, ny1 - ny0)
+            box = (slice(ox - nx0, ox - nx0 + width), slice(oy - ny0, oy - ny0 + height))
+            for name, fill in (("difficulty", 0), ("victim_seq", VS.NO_VICTIM), ("actions", 0), ("known", False),
+                               ("source", -1)):
+                old = getattr(self, name)
+                new = np.full(shape, fill, dtype=old.dtype)
+                new[box] = old
+                setattr(self, name, new)
+            self.__ox, self.__oy = nx0, ny0
 
-    
+        if self.min_x is None:
+            self.min_x, self.max_x, self.min_y, self.max_y = x0, x1, y0, y1
+        else:
+            self.min_x = min(self.min_x, x0)
+            self.max_x = max(self.max_x, x1)
+            self.min_y = min(self.min_y, y0)
+            self.max_y = max(self.max_y, y1)
@@ -0,0 +1,288 @@
+## PATH CACHE
+### LRU cache of the paths found on a map, keyed by (start, goal, cost_line, cost_diag), with
+### hit/miss counters. CachedAStar has the interface of a_star.AStar (the goal included: the
+### legs between two victims are cached as well as the ways back to the base) and searches
+### only when the path is not in the cache.
+###
+### The entries are kept valid with the cells changed in the map since the last lookup
+### (Map.changed_since). An entry is removed when:
+### - the difficulty of a cell of its path changed (its cost is no longer right);
+### - a cell off its path was added or became cheaper, and a path through the cell could be
+###   cheaper than the cached one: the octile distances start -> cell -> goal times the minimum
+###   difficulty of the map, a lower bound of such a path, are below its cost.
+### The other changes (a cell made harder off the path, a cell too far away) keep the entry.
+###
+### So that a changed cell is not tested against every entry, each entry is registered in the
+### BUCKET x BUCKET squares of the map that hold the cells able to pass the second test (its
+### region, see __region); a changed cell is tested only against the entries of its square.
+### The regions are clipped to the bounds of the map and computed with its minimum difficulty,
+### so they are computed again when the bounds grow or the minimum difficulty drops.
+###
+### To measure the hit rate on queries repeated while the map changes:
+###    python path_cache.py datasets/data_400v_90x90
+
+import time
+import random
+import weakref
+import argparse
+from collections import OrderedDict
+import numpy as np
+from map import Map
+from vs.constants import VS
+from a_star import AStar
+
+CAPACITY = 256
+BUCKET = 16          # side of the squares of the index of the entries
+INF = float("inf")
+
+
+class PathCache:
+    def __init__(self, map:Map, capacity=CAPACITY):
+        """ @param map: the map the paths are searched on
+            @param capacity: maximum number of paths kept; the least recently used is evicted """
+        self.__map = weakref.ref(map)  # weak: the map is the key of the cache in _caches
+        self.capacity = capacity
+        self.entries = OrderedDict()   # (start, goal, cost_line, cost_diag) -> (path, cost)
+        self.on_path = {}              # cell -> {key of an entry whose path enters the cell: difficulty of the cell}
+        self.buckets = {}              # square -> keys of the entries whose region meets the square (None: any cell)
+        self.regions = {}              # key -> squares of its region
+        self.bounds = map.bounds()     # bounds of the map the regions are clipped to
+        self.version = map.version
+        window = map.window()
+        passable = window[2][window[4] & (window[2] < VS.OBST_WALL)] if window else np.empty(0)
+        self.min_difficulty = float(passable.min()) if passable.size else INF
+        # difficulty of the cells before the changes: a copy of the map when the cache was created, and the
+        # difficulties seen in the changes since then
+        self.snapshot = (window[0], window[1], window[2].copy(), window[4].copy()) if window else None
+        self.difficulty = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.evicted = 0
+
+    @property
+    def map(self):
+        return self.__map()
+
+    def stats(self):
+        """ @return: a dictionary with the counters and the number of entries """
+        return {"hits": self.hits, "misses": self.misses, "invalidated": self.invalidated,
+                "evicted": self.evicted, "entries": len(self.entries)}
+
+    def get(self, start, goal, cost_line, cost_diag, search):
+        """ @param search: function called on a miss, returning (path or None, cost or None)
+            @return: (a copy of the path or None, its cost or None) """
+        self.__sync()
+        key = (start, goal, cost_line, cost_diag)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = search()
+            self.__store(key, *entry)
+        path, cost = entry
+        return (None, None) if path is None else (list(path), cost)
+
+    def __store(self, key, path, cost):
+        self.entries[key] = (path, cost if path is not None else INF)
+        for cell in path[1:] if path else ():
+            self.on_path.setdefault(cell, {})[key] = self.map.get(cell)[0]
+        self.__index(key)
+        if len(self.entries) > self.capacity:
+            self.__remove(next(iter(self.entries)))
+            self.evicted += 1
+
+    def __remove(self, key):
+        path, _ = self.entries.pop(key)
+        for cell in path[1:] if path else ():
+            keys = self.on_path[cell]
+            keys.pop(key, None)
+            if not keys:
+                del self.on_path[cell]
+        for square in self.regions.pop(key):
+            keys = self.buckets[square]
+            keys.discard(key)
+            if not keys:
+                del self.buckets[square]
+
+    def __index(self, key):
+        """ Register an entry in the squares of its region """
+        region = self.__region(key)
+        self.regions[key] = region
+        for square in region:
+            self.buckets.setdefault(square, set()).add(key)
+
+    def __reindex(self):
+        """ Compute the regions of all the entries again (new bounds or minimum difficulty) """
+        self.buckets = {}
+        self.regions = {}
+        self.bounds = self.map.bounds()
+        for key in self.entries:
+            self.__index(key)
+
+    def __region(self, key):
+        """ A cell c can only make a path cheaper than the one of the entry if
+            lower_bound(start, c) + lower_bound(c, goal) < cost. The lower bound is at least
+            unit * chebyshev distance, and the chebyshev distances start -> c -> goal add up to at
+            least |start.x - goal.x| + 2 * (distance from c.x to the interval [start.x, goal.x]),
+            the same for y: c is in the box of the start and the goal widened by
+            (cost / unit - |start.x - goal.x|) / 2 in x, and the same in y.
+            @return: the squares of the box clipped to the bounds of the map, or [None] if the entry
+            has no path (any cell can give it one) """
+        (start, goal, cost_line, cost_diag), (_, cost) = key, self.entries[key]
+        unit = self.min_difficulty * min(cost_line, cost_diag, 2 * cost_line)
+        if cost == INF or not unit > 0:
+            return [None]
+        reach = cost / unit + 1     # + 1: margin for the rounding
+        min_x, max_x, min_y, max_y = self.bounds
+        box = []
+        for a, b, low, high in ((start[0], goal[0], min_x, max_x), (start[1], goal[1], min_y, max_y)):
+            slack = (reach - abs(a - b)) / 2
+            if slack <= 0:
+                return []
+            box.append((max(low, min(a, b) - slack), min(high, max(a, b) + slack)))
+        (x0, x1), (y0, y1) = box
+        return [(i, j) for i in range(int(x0) // BUCKET, int(x1) // BUCKET + 1)
+                for j in range(int(y0) // BUCKET, int(y1) // BUCKET + 1)]
+
+    def __sync(self):
+        """ Remove the entries the cells changed since the last lookup may have made wrong """
+        if self.map.version == self.version:
+            return
+        changed = []
+        min_difficulty = self.min_difficulty
+        for cell in self.map.changed_since(self.version):
+            difficulty = self.map.get(cell)[0]
+            changed.append((cell, difficulty, self.__previous(cell)))
+            self.difficulty[cell] = difficulty
+            if difficulty < VS.OBST_WALL:
+                self.min_difficulty = min(self.min_difficulty, difficulty)
+        self.version = self.map.version
+        if self.min_difficulty < min_difficulty or self.map.bounds() != self.bounds:
+            self.__reindex()
+
+        removed = set()
+        for cell, difficulty, previous in changed:
+            on_path = self.on_path.get(cell, {})
+            for key, old in list(on_path.items()):
+                if difficulty != old:
+                    removed.add(key)
+                    self.__remove(key)
+            if difficulty >= VS.OBST_WALL or (previous is not None and difficulty >= previous):
+                continue    # not cheaper than before: no new shorter path
+            square = (cell[0] // BUCKET, cell[1] // BUCKET)
+            for key in list(self.buckets.get(square, ())) + list(self.buckets.get(None, ())):
+                if key in on_path or key not in self.entries:
+                    continue
+                start, goal, cost_line, cost_diag = key
+                cost = self.entries[key][1]
+                if self.__lower_bound(start, cell, cost_line, cost_diag) + \
+                   self.__lower_bound(cell, goal, cost_line, cost_diag) < cost:
+                    removed.add(key)
+                    self.__remove(key)
+        self.invalidated += len(removed)
+
+    def __previous(self, cell):
+        """ @return: the difficulty of a cell before the current changes, or None if it was unknown """
+        if cell in self.difficulty:
+            return self.difficulty[cell]
+        if self.snapshot is not None:
+            min_x, min_y, difficulty, known = self.snapshot
+            i, j = cell[0] - min_x, cell[1] - min_y
+            if 0 <= i < known.shape[0] and 0 <= j < known.shape[1] and known[i, j]:
+                return float(difficulty[i, j])
+        return None
+
+    def __lower_bound(self, a, b, cost_line, cost_diag):
+        """ @return: the minimum cost of walking from a to b """
+        dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+        diag = min(cost_diag, 2 * cost_line)
+        return self.min_difficulty * (cost_line * abs(dx - dy) + diag * min(dx, dy))
+
+
+# one cache per map, released with the map
+_caches = weakref.WeakKeyDictionary()
+
+
+def path_cache(map:Map):
+    """ @return: the path cache of a map """
+    cache = _caches.get(map)
+    if cache is None:
+        cache = _caches[map] = PathCache(map)
+    return cache
+
+
+class CachedAStar:
+    def __init__(self, map:Map, end_position:tuple, cost_line=1.0, cost_diag=1.5, heuristic="octile", goal=(0, 0)):
+        """ a_star.AStar through the path cache of the map (same parameters); the AStar is created
+            only when the path is not in the cache """
+        self.map = map
+        self.cache = path_cache(map)
+        self.start_position = (end_position[0], end_position[1])
+        self.end_position = (goal[0], goal[1])
+        self.cost_line = cost_line
+        self.cost_diag = cost_diag
+        self.heuristic = heuristic
+        self.cost = None           # cost of the path found in the last run
+        self.expanded = 0          # number of nodes expanded in the last run (0 on a hit)
+
+    def run(self):
+        """ @return: the list of positions from the start to the goal (both included), or None """
+        self.expanded = 0
+
+        def search():
+            astar = AStar(self.map, self.start_position, self.cost_line, self.cost_diag, self.heuristic,
+                          self.end_position)
+            path = astar.run()
+            self.expanded = astar.expanded
+            return path, astar.cost
+
+        path, self.cost = self.cache.get(self.start_position, self.end_position, self.cost_line,
+                                         self.cost_diag, search)
+        return path
+
+
+if __name__ == '__main__':
+    from vs import scenario
+    from hpa_star import full_map
+
+    parser = argparse.ArgumentParser(description="Hit rate and latency of the path cache while the map changes")
+    parser.add_argument("data_folder", nargs="?", default="datasets/data_400v_90x90")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--starts", type=int, default=100, help="number of distinct start positions")
+    parser.add_argument("--change", type=float, default=0.2, help="probability of changing a cell before a query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = scenario.load(args.data_folder)
+    obst, base = data["obst"], data["config"]["BASE"]
+    m = full_map(obst, base)
+    rng = random.Random(args.seed)
+    cells = m.coords()
+    starts = [rng.choice(cells) for _ in range(args.starts)]
+
+    cached_time = plain_time = 0.0
+    for _ in range(args.queries):
+        if rng.random() < args.change:
+            m.add(rng.choice(cells), rng.choice([0.5, 1.0, 2.0, 3.0, VS.OBST_WALL]), VS.NO_VICTIM, [VS.CLEAR] * 8)
+        start = starts[min(int(rng.expovariate(5 / args.starts)), args.starts - 1)]
+
+        begin = time.perf_counter()
+        cached = CachedAStar(m, start)
+        cached.run()
+        cached_time += time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        plain = AStar(m, start)
+        plain.run()
+        plain_time += time.perf_counter() - begin
+        assert plain.cost == cached.cost or abs(plain.cost - cached.cost) < 1e-9, (plain.cost, cached.cost)
+
+    stats = path_cache(m).stats()
+    print(f"{args.data_folder}: {args.queries} queries from {args.starts} starts, "
+          f"a cell changed before {args.change:.0%} of them")
+    print(f"   {stats}")
+    print(f"   hit rate {stats['hits'] / args.queries:.1%}   AStar {plain_time / args.queries * 1000:.3f} ms/query   "
+          f"CachedAStar {cached_time / args.queries * 1000:.3f} ms/query   same costs")
@@ -0,0 +1,209 @@
+## RESCUE ORDER
+### A rescue planner that searches the order of the victims instead of the steps of the walk
+### (see ag_path.AGPath): an individual is a permutation of the victims of the cluster, and
+### the walk between two consecutive victims is the shortest path of the distance matrix of
+### the base and the victims (victim_distances.distance_matrix).
+###
+### The fitness of an order is computed in O(victims) from the matrix: the rescuer goes to the
+### victims in that order while it can still give first aid and come back to the base within
+### TLIM; the first victim that does not fit ends the rescue. As in AGPath, each rescued
+### victim is worth 100 plus 100 times its gravity, plus the time left at the base.
+### The population is evaluated, crossed (order crossover, OX) and mutated (inversion of a
+### segment) as NumPy arrays.
+###
+### The best order is expanded into the (dx, dy) steps of Rescuer.deliberate, coming back to the
+### base at the end.
+###
+### To time the planner on clusters of data_400v_90x90 (the map fully known):
+###    python rescue_order.py datasets/data_400v_90x90 --victims 100
+
+import time
+import random
+import argparse
+import numpy as np
+from victim_distances import DistanceMatrix
+
+BASE = (0, 0)
+
+
+class RescueOrder:
+    POP_SIZE = 32             # number of orders of the population
+    MAX_GENERATIONS = 1000    # maximum number of generations
+    STALL = 50                # stops after these generations without a better order
+    PROB_CROSSOVER = 0.9      # probability of crossing two parents
+    PROB_MUTATION = 0.3       # probability of inverting a segment of a child
+    ELITE = 2                 # best orders kept in the next generation
+
+    def __init__(self, matrix:DistanceMatrix, victims, tlim, cost_first_aid, seed=None):
+        """ @param matrix: the DistanceMatrix of the base and the victims (it must have BASE and their positions)
+            @param victims: list of (position, gravity)
+            @param tlim: time available to rescue the victims and come back to the base
+            @param cost_first_aid: time to give first aid to a victim
+            @param seed: seed of the random generator (default: drawn from the random module) """
+        self.matrix = matrix
+        self.positions = [position for position, _ in victims]
+        self.tlim = tlim
+        self.cost_first_aid = cost_first_aid
+        self.rng = np.random.default_rng(random.getrandbits(32) if seed is None else seed)
+
+        # costs between the base (index 0) and the victims (1..n)
+        rows = [matrix.index[position] for position in [BASE] + self.positions]
+        self.cost = matrix.cost[np.ix_(rows, rows)]
+        self.value = 100.0 + 100.0 * np.array([gravity for _, gravity in victims], dtype=float)
+
+        self.best_order = []       # indices of the rescued victims, in order
+        self.best_fitness = self.tlim
+        self.generations = 0
+
+    def evaluate(self, orders):
+        """ @param orders: matrix of permutations of the victims (one per row)
+            @return: (fitness, number of victims rescued) of each order """
+        n = orders.shape[1]
+        nodes = orders + 1
+        legs = np.empty(orders.shape)
+        legs[:, 0] = self.cost[0, nodes[:, 0]]
+        legs[:, 1:] = self.cost[nodes[:, :-1], nodes[:, 1:]]
+
+        # time at the base when the rescue ends after each victim
+        done = np.cumsum(legs, axis=1) + self.cost_first_aid * np.arange(1, n + 1)
+        back = done + self.cost[nodes, 0]
+        rescued = np.logical_and.accumulate(back <= self.tlim, axis=1)
+        count = rescued.sum(axis=1)
+
+        used = np.where(count > 0, back[np.arange(len(orders)), np.maximum(count - 1, 0)], 0.0)
+        return (self.value[orders] * rescued).sum(axis=1) + self.tlim - used, count
+
+    def run(self):
+        """ @return: the indices of the victims to rescue, in order """
+        n = len(self.positions)
+        if n == 0:
+            return []
+        rng = self.rng
+        population = np.argsort(rng.random((self.POP_SIZE, n)), axis=1)
+        population[0] = self.greedy()
+
+        best = -np.inf
+        stall = 0
+        for self.generations in range(1, self.MAX_GENERATIONS + 1):
+            fitness, count = self.evaluate(population)
+            i = int(np.argmax(fitness))
+            if fitness[i] > best:
+                best, stall = fitness[i], 0
+                self.best_fitness = float(fitness[i])
+                self.best_order = population[i, :count[i]].tolist()
+            else:
+                stall += 1
+                if stall >= self.STALL:
+                    break
+
+            elite = population[np.argsort(-fitness)[:self.ELITE]]
+            parents = self.__select(fitness, 2 * (self.POP_SIZE - self.ELITE))
+            children = self.__crossover(population[parents[0::2]], population[parents[1::2]])
+            self.__mutate(children)
+            population = np.concatenate((elite, children))
+        return self.best_order
+
+    def greedy(self):
+        """ @return: the order that goes each time to the victim of highest value per unit of time """
+        left = list(range(len(self.positions)))
+        order, current = [], 0
+        while left:
+            k = max(range(len(left)), key=lambda k: self.value[left[k]] / (self.cost[current, left[k] + 1] + 1e-9))
+            current = left.pop(k) + 1
+            order.append(current - 1)
+        return order
+
+    def __select(self, fitness, k):
+        """ Binary tournament
+            @return: the indices of k parents """
+        a = self.rng.integers(len(fitness), size=k)
+        b = self.rng.integers(len(fitness), size=k)
+        return np.where(fitness[a] >= fitness[b], a, b)
+
+    def __crossover(self, first, second):
+        """ Order crossover: each child keeps a segment of the first parent and takes the other
+            victims in the order of the second one
+            @return: the children (the first parents where there is no crossover) """
+        rows, n = first.shape
+        cut = np.sort(self.rng.integers(n + 1, size=(rows, 2)), axis=1)
+        columns = np.arange(n)
+        segment = (columns >= cut[:, :1]) & (columns < cut[:, 1:])
+
+        # victims of the segment, marked by victim
+        taken = np.zeros((rows, n), dtype=bool)
+        taken[np.arange(rows)[:, np.newaxis], first] = segment
+        keep = ~taken[np.arange(rows)[:, np.newaxis], second]
+
+        children = first.copy()
+        children[~segment] = second[keep]      # same count per row: n minus the segment length
+        cross = self.rng.random(rows) < self.PROB_CROSSOVER
+        return np.where(cross[:, np.newaxis], children, first)
+
+    def __mutate(self, children):
+        """ Invert a random segment of some children, or move one victim of a child to another place """
+        rows, n = children.shape
+        mutate = self.rng.random(rows) < self.PROB_MUTATION
+        invert = self.rng.random(rows) < 0.5
+        cut = self.rng.integers(n, size=(rows, 2))
+        columns = np.arange(n)
+
+        low, high = np.sort(cut, axis=1).T[:, :, np.newaxis]
+        inside = (columns >= low) & (columns <= high)
+        inversion = np.where(inside, low + high - columns, columns)
+
+        # insertion: the victim at cut[0] goes to cut[1], the ones in between shift by one
+        source, target = cut.T[:, :, np.newaxis]
+        shift = np.where(source < target, 1, -1)
+        insertion = np.where(inside, columns + shift, columns)
+        insertion = np.where(columns == target, source, insertion)
+
+        index = np.where(invert[:, np.newaxis], inversion, insertion)
+        index = np.where(mutate[:, np.newaxis], index, columns)
+        children[:] = np.take_along_axis(children, index, axis=1)
+
+    def route(self, order):
+        """ @return: the positions visited rescuing the victims in order and coming back to the base """
+        stops = [BASE] + [self.positions[i] for i in order] + [BASE]
+        route = [BASE]
+        for source, target in zip(stops, stops[1:]):
+            route.extend(self.matrix.route(source, target)[1:])
+        return route
+
+    def plan(self, order=None):
+        """ @return: the (dx, dy) steps of the route of an order (default: the best one) """
+        route = self.route(self.best_order if order is None else order)
+        return [(b[0] - a[0], b[1] - a[1]) for a, b in zip(route, route[1:])]
+
+
+if __name__ == '__main__':
+    from vs import scenario
+    from hpa_star import full_map
+    from victim_distances import distance_matrix
+
+    parser = argparse.ArgumentParser(description="Time and quality of the rescue order planner")
+    parser.add_argument("data_folder", nargs="?", default="datasets/data_400v_90x90")
+    parser.add_argument("--victims", type=int, default=100, help="number of victims of the cluster")
+    parser.add_argument("--tlim", type=float, default=1000.0)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = scenario.load(args.data_folder)
+    obst, (bx, by) = data["obst"], data["config"]["BASE"]
+    m = full_map(obst, (bx, by))
+    gravity = data["signals"][:, 6]
+    victims = [((int(x) - bx, int(y) - by), float(g)) for (x, y), g in zip(data["victims"], gravity)]
+    victims = [victim for victim in victims if m.in_map(victim[0])]
+    matrix = distance_matrix(m, [BASE] + [position for position, _ in victims])
+
+    rng = random.Random(args.seed)
+    for run in range(args.runs):
+        cluster = rng.sample(victims, min(args.victims, len(victims)))
+        planner = RescueOrder(matrix, cluster, args.tlim, 1.0, seed=args.seed + run)
+        start = time.perf_counter()
+        order = planner.run()
+        elapsed = time.perf_counter() - start
+        greedy = planner.evaluate(np.array([planner.greedy()]))[0][0]
+        print(f"{len(cluster)} victims: {elapsed * 1000:7.1f} ms, {planner.generations:4d} generations, "
+              f"{len(order)} rescued, fitness {planner.best_fitness:.1f} (greedy {greedy:.1f}), "
+              f"{len(planner.plan())} steps")
@@ -8,6 +8,9 @@
 import os
 import random
 from ag_path import AGPath
+from ag_islands import IslandGA
+from rescue_order import RescueOrder
+from victim_distances import distance_matrix
 from map import Map
 from vs.abstract_agent import AbstAgent
 from vs.physical_agent import PhysAgent
@@ -16,6 +19,11 @@ from abc import ABC, abstractmethod
 import numpy as np
 import math
 
+# rescue planners, chosen by the PLANNER keyword of the config file: "ga" evolves the steps of the
+# walk (ag_path.AGPath), "islands" evolves them in several populations in parallel (ag_islands.IslandGA),
+# "order" evolves the order of the victims (rescue_order.RescueOrder)
+PLANNERS = ("ga", "islands", "order")
+
 ## Classe que define o Agente Rescuer com um plano fixo
 class Rescuer(AbstAgent):
     def __init__(self, env, config_file, id, classification, estimativa_grav):
@@ -24,6 +32,8 @@ class Rescuer(AbstAgent):
         @param config_file: the absolute path to the agent's config file"""
 
         super().__init__(env, config_file)
+        if self.PLANNER not in PLANNERS:
+            raise ValueError(f"unknown PLANNER {self.PLANNER}: expected one of {list(PLANNERS)}")
 
         # Specific initialization for the rescuer
         self.id = id
@@ -47,6 +57,7 @@ class Rescuer(AbstAgent):
         self.returning = False
         
         self.arq_seq_content = ""
+        self.headless = env.headless  # in batch mode, do not wait for the user
                 
         # Starts in IDLE state.
         # It changes to ACTIVE when the map arrives
@@ -174,9 +185,15 @@ class Rescuer(AbstAgent):
         # Besides, it has a flag indicating that a first-aid kit must be delivered when the move is completed.
         # For instance (0,1,True) means the agent walk to (x+0,y+1) and after walking, it leaves the kit.
 
-        path_generator = AGPath(self.map, self.TLIM, (0,0), self.victim)
-        path_generator.executar_ag()
-        path = path_generator.melhor_caminho
+        if self.PLANNER == "order":
+            path = self.__order_plan()
+            self.returning = True   # the plan already comes back to the base
+        elif self.PLANNER == "islands":
+            path = IslandGA(self.map, self.TLIM, (0,0), self.victim).executar()
+        else:
+            path_generator = AGPath(self.map, self.TLIM, (0,0), self.victim)
+            path_generator.executar_ag()
+            path = path_generator.melhor_caminho
         
         # priorizacao_data = []
         # pos_x = 0
@@ -209,6 +226,36 @@ class Rescuer(AbstAgent):
         #self.plan = self.plan + come_back_plan
         
         
+    def __order_plan(self):
+        """ Plans the order of the victims over the distance matrix of the base and the victims
+        @return: the (dx, dy) steps from the base, through the victims, back to the base """
+        positions = [(0, 0)] + [position for position, _ in self.victim]
+        matrix = distance_matrix(self.map, positions, self.COST_LINE, self.COST_DIAG)
+        planner = RescueOrder(matrix, [(position, data[6]) for position, data in self.victim],
+                              self.TLIM, self.COST_FIRST_AID)
+        order = planner.run()
+        print(f"{self.NAME} rescue order of {len(order)} victims in {planner.generations} generations")
+
+        # deliberate gives first aid at every victim cell the walk enters, also the ones on the way
+        # to another victim: drop the last victims until the walk fits in the time limit
+        plan = planner.plan(order)
+        while order and self.__plan_time(plan) > self.TLIM:
+            order.pop()
+            plan = planner.plan(order)
+        return plan
+
+    def __plan_time(self, plan):
+        """ @return: the time deliberate takes to execute a plan from the base """
+        victims = {position for position, _ in self.victim}
+        x, y = 0, 0
+        time = 0.0
+        for dx, dy in plan:
+            x, y = x + dx, y + dy
+            time += (self.COST_LINE if dx == 0 or dy == 0 else self.COST_DIAG) * self.map.get((x, y))[0]
+            if (x, y) in victims:
+                time += self.COST_FIRST_AID
+        return time
+
     def distancia_euclidiana(ponto1, ponto2):
         """
         Calcula a distância euclidiana entre dois pontos no plano cartesiano.
@@ -230,7 +277,8 @@ class Rescuer(AbstAgent):
 
         # No more actions to do
         if self.plan == []:  # empty list, no more actions to do
-           input(f"{self.NAME} has finished the plan [ENTER]")
+           if not self.headless:
+               input(f"{self.NAME} has finished the plan [ENTER]")
            return False
         else:
             # There is at least one action to do
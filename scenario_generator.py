@@ -0,0 +1,187 @@
+## SCENARIO GENERATOR
+### Writes a scenario folder with env_config.txt, env_obst.txt, env_victims.txt,
+### env_vital_signals.txt, explorer_config.txt and rescuer_config.txt (and the
+### compiled env_compiled.npz, see vs/scenario.py) for scaling benchmarks.
+### Everything is generated with NumPy arrays, so large maps take seconds.
+###
+### Example:
+###    python scenario_generator.py --width 1000 --height 1000 --victims 50000 --walls 0.15 --seed 7
+###    -> datasets/data_50000v_1000x1000
+
+import os
+import argparse
+import numpy as np
+from vs.constants import VS
+from vs import scenario
+
+# Proportion of each severity label (1=critical, 2=unstable, 3=potentially unstable, 4=stable)
+# and ranges of the vital signals from datasets/data_800v/readme.md
+LABEL_PROBS = [0.14875, 0.56875, 0.26375, 0.01875]
+GRAVITY_RANGES = [(0, 25), (25, 50), (50, 75), (75, 100)]   # grav by label; 100 is the least severe
+SIGNAL_RANGES = {"pSist": (5, 22), "pDiast": (0, 15), "pulso": (0, 200), "fResp": (0, 22)}
+
+# qPA is derived from pSist and pDiast (readme). Its plateaus in data_800v and data_4000v, per range of
+# pDiast (low < 4 < normal < 11 < high), ramp with pSist between these points: (pSist, qPA)
+QPA_LOW_DIAST = ([7, 11], [-8.733333, -4.333333])
+QPA_NORMAL_DIAST = ([12, 15], [0.0, 4.666667])
+QPA_HIGH_DIAST = 8.733333
+
+# Default distribution of the difficulty of the cells that are not walls (value: weight)
+DIFFICULTIES = {0.5: 1, 1.0: 4, 1.5: 2, 2.0: 1, 3.0: 0.5}
+
+
+def generate_obstacles(rng, width, height, walls, difficulties, block=1, base=(0, 0)):
+    """ @param walls: probability of a cell being a wall
+        @param difficulties: dictionary difficulty: weight for the other cells
+        @param block: side of the square regions sharing the same difficulty
+        @return: float64 array width x height of difficulties ]0, 100] """
+
+    values = np.array(list(difficulties.keys()), dtype=np.float64)
+    weights = np.array(list(difficulties.values()), dtype=np.float64)
+
+    # difficulties drawn by block and expanded to the cells
+    bw = -(-width // block)
+    bh = -(-height // block)
+    coarse = rng.choice(values, size=(bw, bh), p=weights / weights.sum())
+    obst = np.repeat(np.repeat(coarse, block, axis=0), block, axis=1)[:width, :height]
+
+    obst[rng.random((width, height)) < walls] = VS.OBST_WALL
+    obst[base[0], base[1]] = VS.OBST_NONE
+    return obst
+
+
+def generate_victims(rng, obst, nb_victims, base=(0, 0)):
+    """ Victims at distinct cells that are neither walls nor the base
+    @return: int32 array (nb_victims, 2) of coordinates """
+
+    free = obst != VS.OBST_WALL
+    free[base[0], base[1]] = False
+    cells = np.flatnonzero(free)
+    if nb_victims > len(cells):
+        raise ValueError(f"{nb_victims} victims do not fit in {len(cells)} free cells")
+
+    chosen = rng.choice(cells, size=nb_victims, replace=False)
+    x, y = np.unravel_index(chosen, obst.shape)
+    return np.column_stack((x, y)).astype(np.int32)
+
+
+def generate_signals(rng, nb_victims):
+    """ Vital signals [seq, pSist, pDiast, qPA, pulso, fResp, grav, label] of each victim
+    @return: float64 array (nb_victims, 8) """
+
+    labels = rng.choice(4, size=nb_victims, p=LABEL_PROBS) + 1
+    ranges = np.array(GRAVITY_RANGES, dtype=np.float64)[labels - 1]
+    gravity = rng.uniform(ranges[:, 0], ranges[:, 1])
+
+    signals = np.empty((nb_victims, 8), dtype=np.float64)
+    signals[:, 0] = np.arange(nb_victims)
+    signals[:, 1] = rng.uniform(*SIGNAL_RANGES["pSist"], nb_victims)
+    # the diastolic pressure is below the systolic one, as in the datasets
+    low, high = SIGNAL_RANGES["pDiast"]
+    signals[:, 2] = rng.uniform(low, np.minimum(high, signals[:, 1]))
+    signals[:, 3] = quality_of_pressure(signals[:, 1], signals[:, 2])
+    signals[:, 4] = rng.uniform(*SIGNAL_RANGES["pulso"], nb_victims)
+    signals[:, 5] = rng.uniform(*SIGNAL_RANGES["fResp"], nb_victims)
+    signals[:, 6] = gravity
+    signals[:, 7] = labels
+
+    # rounded as written in env_vital_signals.txt, so the compiled file matches the text files
+    return signals.round(6)
+
+
+def quality_of_pressure(p_sist, p_diast):
+    """ qPA from the pressures: the qPA of each range of pDiast, weighted by the membership of pDiast in
+    the range (trapezoids overlapping over one unit, summing 1)
+    @return: array of qPA in [-10, 10] """
+    low = np.clip(5 - p_diast, 0, 1)
+    high = np.clip(p_diast - 10, 0, 1)
+    normal = 1 - low - high
+    return (low * np.interp(p_sist, *QPA_LOW_DIAST) + normal * np.interp(p_sist, *QPA_NORMAL_DIAST) +
+            high * QPA_HIGH_DIAST)
+
+
+def write_agent_config(file_name, name, color, trace_color, tlim):
+    with open(file_name, "w") as file:
+        file.write(f"NAME {name}\n")
+        file.write(f"COLOR ({color[0]}, {color[1]}, {color[2]})\n")
+        file.write(f"TRACE_COLOR ({trace_color[0]}, {trace_color[1]}, {trace_color[2]})\n")
+        file.write(f"TLIM {tlim}\n")
+        file.write("COST_LINE 1.0\nCOST_DIAG 1.5\nCOST_READ 2.0\nCOST_FIRST_AID 1.0")
+
+
+def generate(folder, width, height, nb_victims, walls=0.1, difficulties=None, block=1, seed=0,
+             base=(0, 0), explorer_tlim=None, rescuer_tlim=None, compiled=True):
+    """ Generate a scenario folder
+    @return: the scenario dictionary (see vs.scenario.read_text) """
+
+    rng = np.random.default_rng(seed)
+    difficulties = difficulties or DIFFICULTIES
+
+    obst = generate_obstacles(rng, width, height, walls, difficulties, block, base)
+    victims = generate_victims(rng, obst, nb_victims, base)
+    signals = generate_signals(rng, nb_victims)
+    config = {"BASE": list(base), "GRID_WIDTH": width, "GRID_HEIGHT": height,
+              "WINDOW_WIDTH": 800, "WINDOW_HEIGHT": 800, "DELAY": 0.0,
+              "STATS_PER_AG": 1, "STATS_ALL_AG": 1}
+
+    os.makedirs(folder, exist_ok=True)
+
+    with open(os.path.join(folder, "env_config.txt"), "w") as file:
+        file.write(f"BASE {base[0]},{base[1]}\n")
+        for keyword in ["GRID_WIDTH", "GRID_HEIGHT", "WINDOW_WIDTH", "WINDOW_HEIGHT", "DELAY", "STATS_PER_AG"]:
+            file.write(f"{keyword} {config[keyword]}\n")
+        file.write(f"STATS_ALL_AG {config['STATS_ALL_AG']}")
+
+    # one line x,y,difficulty per cell
+    x, y = np.indices((width, height))
+    np.savetxt(os.path.join(folder, "env_obst.txt"),
+               np.column_stack((x.ravel(), y.ravel(), obst.ravel())), fmt="%d,%d,%g")
+    np.savetxt(os.path.join(folder, "env_victims.txt"), victims, fmt="%d,%d")
+    np.savetxt(os.path.join(folder, "env_vital_signals.txt"), signals,
+               fmt="%d,%.6f,%.6f,%.6f,%.6f,%.6f,%.6f,%d")
+
+    # time limits proportional to the size of the grid
+    cells = width * height
+    write_agent_config(os.path.join(folder, "explorer_config.txt"), "EXPLORER", (0, 0, 255), (153, 153, 255),
+                       explorer_tlim or float(cells))
+    write_agent_config(os.path.join(folder, "rescuer_config.txt"), "RESCUER", (255, 0, 127), (255, 153, 204),
+                       rescuer_tlim or float(cells))
+
+    data = {"config": config, "obst": obst, "victims": victims, "signals": signals}
+    if compiled:
+        scenario.save(data, os.path.join(folder, scenario.COMPILED_FILE), scenario.source_key(folder))
+
+    return data
+
+
+def parse_difficulties(value):
+    """ Parse 'value:weight,value:weight,...' into a dictionary """
+    difficulties = {}
+    for item in value.split(","):
+        diff, _, weight = item.partition(":")
+        difficulties[float(diff)] = float(weight) if weight else 1.0
+    return difficulties
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a random scenario folder")
+    parser.add_argument("--width", type=int, default=100, help="grid width (columns)")
+    parser.add_argument("--height", type=int, default=100, help="grid height (rows)")
+    parser.add_argument("--victims", type=int, default=400, help="number of victims")
+    parser.add_argument("--walls", type=float, default=0.1, help="density of walls [0, 1]")
+    parser.add_argument("--difficulties", type=parse_difficulties, default=None,
+                        help="difficulty distribution of the other cells as value:weight,... (default: 0.5:1,1:4,1.5:2,2:1,3:0.5)")
+    parser.add_argument("--block", type=int, default=1, help="side of the regions of equal difficulty")
+    parser.add_argument("--base", default="0,0", help="base position x,y")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--explorer-tlim", type=float, default=None, help="default: width * height")
+    parser.add_argument("--rescuer-tlim", type=float, default=None, help="default: width * height")
+    parser.add_argument("--no-compiled", action="store_true", help="do not write env_compiled.npz")
+    parser.add_argument("-o", "--output", help="scenario folder (default: datasets/data_<victims>v_<width>x<height>)")
+    args = parser.parse_args()
+
+    base = tuple(int(i) for i in args.base.split(","))
+    folder = args.output or os.path.join("datasets", f"data_{args.victims}v_{args.width}x{args.height}")
+    generate(folder, args.width, args.height, args.victims, args.walls, args.difficulties, args.block,
+             args.seed, base, args.explorer_tlim, args.rescuer_tlim, not args.no_compiled)
+    print(f"{folder}: {args.width}x{args.height} grid, {args.victims} victims, seed {args.seed}")
@@ -0,0 +1,67 @@
+## MAP RELEASE
+### The search structures kept per map (a_star._engines and the like) must not keep the map
+### alive: once the last reference to a map is dropped, the map and its entry are collected.
+###
+###    python -m pytest tests
+
+import gc
+import weakref
+import numpy as np
+import a_star
+import d_star_lite
+import hpa_star
+import path_cache
+from hpa_star import full_map
+
+
+def grid(size=8):
+    """ @return: a fully known size x size map of difficulty 1, with the base at a corner """
+    return full_map(np.ones((size, size)), (0, 0))
+
+
+def test_a_star_releases_the_map():
+    m = grid()
+    assert a_star.AStar(m, (5, 3)).run()[-1] == (0, 0)
+    assert len(a_star._engines) == 1
+
+    ref = weakref.ref(m)
+    del m
+    gc.collect()
+    assert ref() is None
+    assert len(a_star._engines) == 0
+
+
+def test_d_star_lite_releases_the_map():
+    m = grid()
+    assert d_star_lite.DStarLite(m, (5, 3)).run()[-1] == (0, 0)
+    assert len(d_star_lite._planners) == 1
+
+    ref = weakref.ref(m)
+    del m
+    gc.collect()
+    assert ref() is None
+    assert len(d_star_lite._planners) == 0
+
+
+def test_hpa_star_releases_the_map():
+    m = grid()
+    assert hpa_star.HPAStar(m, (5, 3), cluster_size=4).run()[-1] == (0, 0)
+    assert len(hpa_star._hierarchies) == 1
+
+    ref = weakref.ref(m)
+    del m
+    gc.collect()
+    assert ref() is None
+    assert len(hpa_star._hierarchies) == 0
+
+
+def test_path_cache_releases_the_map():
+    m = grid()
+    assert path_cache.CachedAStar(m, (5, 3), goal=(1, 6)).run()[-1] == (1, 6)
+    assert len(path_cache._caches) == 1
+
+    ref = weakref.ref(m)
+    del m
+    gc.collect()
+    assert ref() is None
+    assert len(path_cache._caches) == 0
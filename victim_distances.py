@@ -0,0 +1,225 @@
+## VICTIM DISTANCES
+### Shortest-path costs between the base and the victims over the explored (merged) map: one
+### Dijkstra per source, as a dense matrix, cost[i, j] = cost of walking from positions[i]
+### to positions[j]. The routes are reconstructed only when asked for.
+###
+### Walking into a cell costs COST_LINE or COST_DIAG times its difficulty, as charged by the
+### environment; walls (difficulty VS.OBST_WALL) and unknown cells cannot be entered. The costs
+### are not symmetric: the cost of a step is the difficulty of the cell entered.
+###
+### The Dijkstra runs are made in this process by default. A caller that computes many matrices
+### can opt in to a DistancePool, a process pool reused across the calls: the map is copied
+### once per call into shared memory (the cost of entering each cell of its bounding box); each
+### worker builds the sparse graph from it and returns only the rows of its sources. The agents
+### do not use it: under batch.py they already run in the processes of a pool.
+###
+### The matrices are cached per map and version: the rescuers ask for the matrix of the base
+### and all the victims once (GlobalResources.victim_distances) and take the submatrices of
+### their clusters, so they share the work.
+###
+### To time the matrix of data_400v_90x90 (base and 400 victims):
+###    python victim_distances.py datasets/data_400v_90x90 --workers 4
+
+import os
+import time
+import weakref
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from map import Map
+from vs.constants import VS
+
+# increments of the 8 directions
+NEIGHBORS = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)]
+
+
+def grid_graph(enter, cost_line, cost_diag):
+    """ @param enter: the difficulty of entering each cell of a box, inf where the cell cannot be entered
+        @return: the sparse graph of the moves between the cells of the box; the cell [i, j] is the
+            node i * height + j and the weight of an edge is the cost of entering its target """
+    width, height = enter.shape
+    index = np.arange(width * height).reshape(width, height)
+    passable = np.isfinite(enter)
+    rows, cols, weights = [], [], []
+    for dx, dy in NEIGHBORS:
+        source = (slice(max(0, -dx), width - max(0, dx)), slice(max(0, -dy), height - max(0, dy)))
+        target = (slice(max(0, dx), width - max(0, -dx)), slice(max(0, dy), height - max(0, -dy)))
+        ok = passable[source] & passable[target]
+        step = cost_line if dx == 0 or dy == 0 else cost_diag
+        rows.append(index[source][ok])
+        cols.append(index[target][ok])
+        weights.append(step * enter[target][ok])
+    return csr_matrix((np.concatenate(weights), (np.concatenate(rows), np.concatenate(cols))),
+                      shape=(width * height, width * height))
+
+
+# graph of the map of the current call in a worker process, built once per call
+_worker = {}
+
+
+def _rows(name, shape, cost_line, cost_diag, sources, targets):
+    """ @param name: the shared memory with the cost of entering the cells (see DistancePool.rows)
+        @return: the costs from the sources to the targets (nodes of the graph) """
+    if _worker.get("key") != (name, cost_line, cost_diag):
+        memory = shared_memory.SharedMemory(name=name)
+        enter = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+        _worker["graph"] = grid_graph(enter, cost_line, cost_diag)
+        _worker["key"] = (name, cost_line, cost_diag)
+        memory.close()
+    return dijkstra(_worker["graph"], indices=sources)[:, targets]
+
+
+class DistancePool:
+    def __init__(self, workers):
+        """ A process pool for distance_matrix, kept until close (or the end of a with block)
+            @param workers: number of processes """
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def rows(self, enter, sources, cost_line, cost_diag):
+        """ Split the Dijkstra runs among the processes, with the costs of the cells in shared memory
+            @return: the costs between the sources """
+        memory = shared_memory.SharedMemory(create=True, size=enter.nbytes)
+        try:
+            np.ndarray(enter.shape, dtype=np.float64, buffer=memory.buf)[:] = enter
+            chunks = [sources[i::self.workers] for i in range(self.workers) if sources[i::self.workers]]
+            futures = [self.executor.submit(_rows, memory.name, enter.shape, cost_line, cost_diag, chunk, sources)
+                       for chunk in chunks]
+            results = [future.result() for future in futures]
+        finally:
+            memory.close()
+            memory.unlink()
+
+        rows = np.empty((len(sources), len(sources)))
+        for i, result in enumerate(results):
+            rows[i::len(chunks)] = result
+        return rows
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class DistanceMatrix:
+    def __init__(self, positions, cost, graph, min_x, min_y, height):
+        """ @param positions: the positions (x, y), in the order of the rows and columns
+            @param cost: the matrix of the costs, inf where there is no path
+            @param graph: the graph the costs were computed on (see grid_graph)
+            @param min_x, min_y, height: the box of the graph """
+        self.positions = list(positions)
+        self.index = {position: i for i, position in enumerate(self.positions)}
+        self.cost = cost
+        self.graph = graph
+        self.min_x, self.min_y, self.height = min_x, min_y, height
+        self.predecessors = {}     # source position -> predecessors of its shortest-path tree
+
+    def submatrix(self, positions):
+        """ @return: the DistanceMatrix of some of the positions, sharing the graph and the routes """
+        rows = [self.index[position] for position in positions]
+        matrix = DistanceMatrix(positions, self.cost[np.ix_(rows, rows)], self.graph,
+                                self.min_x, self.min_y, self.height)
+        matrix.predecessors = self.predecessors
+        return matrix
+
+    def route(self, source, target):
+        """ @return: the list of positions from source to target (both included), or None if unreachable """
+        if self.cost[self.index[source], self.index[target]] == np.inf:
+            return None
+        predecessors = self.predecessors.get(source)
+        if predecessors is None:
+            _, predecessors = dijkstra(self.graph, indices=self.node(source), return_predecessors=True)
+            self.predecessors[source] = predecessors
+
+        route = []
+        node = self.node(target)
+        while node >= 0:
+            x, y = divmod(int(node), self.height)
+            route.append((x + self.min_x, y + self.min_y))
+            node = predecessors[node]
+        return route[::-1]
+
+    def node(self, position):
+        return (position[0] - self.min_x) * self.height + position[1] - self.min_y
+
+
+# matrices computed per map: {(version, cost_line, cost_diag, positions): DistanceMatrix}
+_cache = weakref.WeakKeyDictionary()
+
+
+def distance_matrix(map:Map, positions, cost_line=1.0, cost_diag=1.5, pool:DistancePool=None):
+    """ The costs between every pair of positions of the map, computed once per map version
+        @param map: the explored map
+        @param positions: the positions (x, y), e.g. the base and the victims
+        @param pool: a DistancePool to split the Dijkstra runs among its processes (default: in this process)
+        @return: a DistanceMatrix """
+    positions = tuple(positions)
+    cached = _cache.setdefault(map, {})
+    key = (map.version, cost_line, cost_diag)
+    for (version, line, diag, known), matrix in list(cached.items()):
+        if (version, line, diag) != key:
+            del cached[(version, line, diag, known)]       # older version of the map
+        elif set(positions) <= matrix.index.keys():
+            return matrix if known == positions else matrix.submatrix(positions)
+
+    min_x, max_x, min_y, max_y = map.bounds()
+    difficulty, known = map.region(min_x, min_y, max_x - min_x + 1, max_y - min_y + 1)
+    enter = np.where(known & (difficulty < VS.OBST_WALL), difficulty, np.inf)
+    height = enter.shape[1]
+    nodes = [(x - min_x) * height + y - min_y for x, y in positions]
+    reachable = [i for i, (x, y) in enumerate(positions) if min_x <= x <= max_x and min_y <= y <= max_y]
+
+    graph = grid_graph(enter, cost_line, cost_diag)
+    cost = np.full((len(positions), len(positions)), np.inf)
+    if reachable:
+        sources = [nodes[i] for i in reachable]
+        if pool is not None and len(sources) > 1:
+            rows = pool.rows(enter, sources, cost_line, cost_diag)
+        else:
+            rows = dijkstra(graph, indices=sources)[:, sources]
+        cost[np.ix_(reachable, reachable)] = rows
+    np.fill_diagonal(cost, 0.0)
+
+    matrix = DistanceMatrix(positions, cost, graph, min_x, min_y, height)
+    cached[key + (positions,)] = matrix
+    return matrix
+
+
+if __name__ == '__main__':
+    from vs import scenario
+    from hpa_star import full_map
+
+    parser = argparse.ArgumentParser(description="Time of the distance matrix of the base and the victims")
+    parser.add_argument("data_folder", nargs="?", default="datasets/data_400v_90x90")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes of the pool")
+    args = parser.parse_args()
+
+    data = scenario.load(args.data_folder)
+    obst, (bx, by) = data["obst"], data["config"]["BASE"]
+    m = full_map(obst, (bx, by))
+    positions = [(0, 0)] + [(int(x) - bx, int(y) - by) for x, y in data["victims"]]
+
+    start = time.perf_counter()
+    matrix = distance_matrix(m, positions)
+    print(f"{args.data_folder}: {len(positions)} positions, in this process: {time.perf_counter() - start:.3f} s")
+    if args.workers > 1:
+        with DistancePool(args.workers) as pool:
+            for call in ("first call", "pool reused"):
+                _cache.clear()
+                start = time.perf_counter()
+                pooled = distance_matrix(m, positions, pool=pool)
+                print(f"   {args.workers} workers, {call}: {time.perf_counter() - start:.3f} s")
+        assert np.array_equal(pooled.cost, matrix.cost)
+    start = time.perf_counter()
+    distance_matrix(m, positions[:len(positions) // 4])
+    print(f"   submatrix of a quarter of the positions (cached): {(time.perf_counter() - start) * 1000:.3f} ms")
+    start = time.perf_counter()
+    routes = [matrix.route(positions[0], position) for position in positions[1:]]
+    print(f"   routes from the base to every victim: {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -37,6 +37,8 @@ class AbstAgent:
         self.COST_DIAG = 0.0        # public: basic cost to walk one step diagonally
         self.COST_READ = 0.0        # public: basic cost to read a victim's vital sign
         self.COST_FIRST_AID = 0.0   # public: basic cost to drop the first aid package to a victim
+        self.PATHFINDER = "field"   # public: path search engine of the agent (see explorer.PATHFINDERS)
+        self.PLANNER = "ga"         # public: rescue planner of the agent (see rescuer.PLANNERS)
         self.COLOR = (100,100,100)  # public: color of the agent
         self.TRACE_COLOR = (140,140,140) # public: color for the visited cells
                
@@ -75,6 +77,10 @@ class AbstAgent:
                     self.COST_FIRST_AID = float(words[1])
                 elif keyword=="COST_READ":    
                     self.COST_READ = float(words[1])
+                elif keyword=="PATHFINDER":
+                    self.PATHFINDER = words[1]
+                elif keyword=="PLANNER":
+                    self.PLANNER = words[1]
                     
         # Register the agent within the environment 
         self.__body = env.add_agent(self)
@@ -101,7 +107,7 @@ class AbstAgent:
 
     def set_state(self, value):
         """ This protected method allows the environment to change the state of the agent"""
-        self.__body._state  = value
+        self.__body._set_state(value)
         
     def walk(self, dx, dy):
         """ Public method for moving the agent's body one cell to any direction (if possible)
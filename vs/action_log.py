@@ -0,0 +1,132 @@
+## ACTION LOG
+### It records every action executed by the physical agents (walk, read vital
+### signals, first aid and changes of state) with its result and the remaining
+### time of the agent, in a compact binary file. Env.replay re-executes a log
+### against the physical agents without running the agents' deliberate method.
+###
+### To replay (and benchmark the environment core):
+###    python -m vs.action_log mission.npz [--render] [--start CYCLE] [--end CYCLE]
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# Actions
+WALK = 0
+READ = 1
+FIRST_AID = 2
+STATE = 3       # the state of the agent changed; the new state is in the result field
+
+# One record per action: 17 bytes
+RECORD = np.dtype([("cycle", "<u4"),
+                   ("agent", "<u2"),
+                   ("action", "u1"),
+                   ("dx", "i1"),
+                   ("dy", "i1"),
+                   ("result", "i1"),
+                   ("rtime", "<f8")])
+
+
+class LoggedMind:
+    """ Stands for the mind of an agent during a replay: it only holds the attributes read
+    by the environment and by the physical agent (name, time limit, costs and colors) """
+
+    def __init__(self, attributes):
+        self.NAME = attributes["NAME"]
+        self.TLIM = attributes["TLIM"]
+        self.COST_LINE = attributes["COST_LINE"]
+        self.COST_DIAG = attributes["COST_DIAG"]
+        self.COST_READ = attributes["COST_READ"]
+        self.COST_FIRST_AID = attributes["COST_FIRST_AID"]
+        self.COLOR = tuple(attributes["COLOR"])
+        self.TRACE_COLOR = tuple(attributes["TRACE_COLOR"])
+
+    def deliberate(self):
+        return False
+
+
+class ActionLog:
+    """ Recorder of the actions of the physical agents of an environment """
+
+    def __init__(self, env):
+        """ @param env: the environment; its agents must already be added """
+        self.env = env
+        self.__index = {body: i for i, body in enumerate(env.agents)}
+        self.__records = []
+        self.header = {"version": FORMAT_VERSION,
+                       "data_folder": os.path.abspath(env.data_folder),
+                       "agents": [{"NAME": body.mind.NAME,
+                                   "TLIM": body.mind.TLIM,
+                                   "COST_LINE": body.mind.COST_LINE,
+                                   "COST_DIAG": body.mind.COST_DIAG,
+                                   "COST_READ": body.mind.COST_READ,
+                                   "COST_FIRST_AID": body.mind.COST_FIRST_AID,
+                                   "COLOR": list(body.mind.COLOR),
+                                   "TRACE_COLOR": list(body.mind.TRACE_COLOR),
+                                   "state": body._state} for body in env.agents]}
+
+    def add(self, body, action, dx, dy, result):
+        """ Record an action executed by a physical agent in the current cycle of the environment
+        @param result: the value returned by the action, encoded as an int (see encode_result) """
+        self.__records.append((self.env.cycles, self.__index[body], action, dx, dy, result, body._rtime))
+
+    def __len__(self):
+        return len(self.__records)
+
+    def save(self, file_name):
+        """ Write the header and the records into a compressed .npz file """
+        self.header["cycles"] = self.env.cycles
+        records = np.array(self.__records, dtype=RECORD)
+        np.savez_compressed(file_name, header=np.array(json.dumps(self.header)), records=records)
+
+
+def encode_result(result):
+    """ Encode the value returned by an action as a small int:
+    walk: VS.EXECUTED, VS.BUMPED, VS.TIME_EXCEEDED; read: 1 (signals), 0 (no victim), VS.TIME_EXCEEDED;
+    first aid: 1 (True), 0 (False), VS.TIME_EXCEEDED """
+
+    if isinstance(result, bool):
+        return int(result)
+    if isinstance(result, list):
+        return 1 if result else 0
+    return result
+
+
+def load(file_name):
+    """ Read an action log
+    @return: the header (dictionary) and the records (structured array of RECORD) """
+
+    with np.load(file_name, allow_pickle=False) as data:
+        header = json.loads(str(data["header"]))
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"{file_name}: format version {header['version']}, expected {FORMAT_VERSION}")
+        return header, data["records"]
+
+
+if __name__ == '__main__':
+    from .environment import Env
+
+    parser = argparse.ArgumentParser(description="Replay an action log recorded by Env.run")
+    parser.add_argument("log_file")
+    parser.add_argument("--render", action="store_true", help="show the replay in the pygame window")
+    parser.add_argument("--start", type=int, default=0, help="cycle to seek to before rendering")
+    parser.add_argument("--end", type=int, default=None, help="last cycle to replay")
+    parser.add_argument("--data-folder", help="scenario folder (default: the one recorded in the log)")
+    args = parser.parse_args()
+
+    header, records = load(args.log_file)
+    env = Env(args.data_folder or header["data_folder"], headless=not args.render)
+
+    start = time.perf_counter()
+    results = env.replay(args.log_file, start_cycle=args.start, end_cycle=args.end)
+    elapsed = time.perf_counter() - start
+
+    nb_actions = len(records) if args.end is None else int(np.count_nonzero(records["cycle"] <= args.end))
+    print(f"REPLAY: {nb_actions} actions, {results['cycles']} cycles in {elapsed:.3f}s "
+          f"({nb_actions/max(elapsed, 1e-9):.0f} actions/s)")
+    print(f"REPLAY: found Ve={results['found']['Ve']} Veg={results['found']['Veg']:.3f}, "
+          f"saved Vs={results['saved']['Vs']} Vsg={results['saved']['Vsg']:.3f}")
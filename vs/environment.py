@@ -9,9 +9,14 @@ import csv
 import time
 import math
 import colorsys
+import numpy as np
 from .abstract_agent import AbstAgent
 from .physical_agent import PhysAgent
 from .constants import VS
+from .render_scheduler import RenderScheduler
+from .ledger import Ledger
+from . import scenario
+from . import action_log
 
 
 ## Class Environment
@@ -20,89 +25,73 @@ class Env:
     IDX_GRAVITY = 6
     IDX_SEVERITY = 7
 
-    def __init__(self, data_folder):
+    def __init__(self, data_folder, headless=False, use_cache=True):
         # instance attributes
         self.data_folder = data_folder # folder for the config and data files
+        self.headless = headless       # True: batch mode - no window, no delay and no prompts
+        self.cycles = 0                # number of cycles executed by the last run (current cycle while running)
+        self.action_log = None         # recorder of the actions of the agents (see run)
         self.dic = {}          # configuration of grid and window
         self.agents = []       # list of running agents
-        self.obst  = None      # list of obstacles: ]0.0, VS.OBST_WALL] float representing the multiplying factor for the walk action
+        self.obst  = None      # array of obstacles: ]0.0, VS.OBST_WALL] float representing the multiplying factor for the walk action
                                # for an agent to enter into a cell.
                                # explorer agent cannot access this attribute, it has to find!
+        self.neighbors = None  # array with the state of the 8 neighbors of each cell packed in 2 bits per direction
+        self.neighbors_states = {} # packed neighbors -> tuple of 8 states {CLEAR, WALL, END}
         self.nb_of_victims = 0 # total number of victims
         self.victims = []      # positional: the coordinates of the victims [(x1,y1), ..., (xn, yn)]
+        self.victim_seq = {}   # index of the victims by position {(x, y): seq} for O(1) perception
         self.severity = []     # positional: the injury severity for each victim (label)
         self.gravity = []      # positional: the injury gravity for each victim (float value)
         self.sum_gravity = 0   # sum of all gravity values for peg and psg calculation
         self.signals = []      # positional: the vital signals of the victims [[i,s1,...,s5,g,l],...]
         self.found   = [[]]    # positional: Physical agents that found each victim [[ag1] [ag2, ag3], ...] ag1 found vict 0, ag2 and 3, vict 1, ... 
         self.saved   = [[]]    # positional: Physical agents that saved each victim
+        self.found_ledger = Ledger()  # victims found by at least one agent with counters per severity
+        self.saved_ledger = Ledger()  # victims saved by at least one agent with counters per severity
+        self.nb_per_severity = [0] * 4  # number of victims per severity label (index 0 is label 1)
         self.__max_obst = 0             # max value for obstacle for coloring - to be calculated
         self.__min_obst = VS.OBST_WALL  # min value for obstacle for coloring - to be calculated
+        self.__background = None        # pre-rendered grid and obstacles - created at the first draw
+        self.__dirty = set()            # cells (x, y) to be redrawn at the next draw
+        self.__drawn_agents = {}        # position of each active agent at the last draw
         
-        # Read the environment config file
-        self.__read_config()
+        # Load the scenario: config, obstacles, victims and vital signals (compiled file or text files)
+        data = scenario.load(self.data_folder, use_cache)
+        self.dic = data["config"]
         # print(self.dic)
 
-        # Set up the obstacles - it's a list composed of GRID_WIDTH lists. Each sublist is a column (y=0, 1, ...)
-        # 1 means that there is no obstacle - it is a regular terrain
-        self.obst = [[1 for y in range(self.dic["GRID_HEIGHT"])] for x in range(self.dic["GRID_WIDTH"])]
-        obst_file = os.path.join(self.data_folder,"env_obst.txt")
-        self.__max_obst = 1
-
-        with open(obst_file, 'r') as csvfile:
-            csvreader = csv.reader(csvfile)
-            for row in csvreader:
-                x = int(row[0])
-                y = int(row[1])
-                # absolute multiplying factor representing the degree of difficulty/facility for the agent to enter the cell
-                # values ]0, 1[ means a descent; 1 = VS.OBST_NONE; ]1, 100[ = ascent; 100 = VS.OBST_WALL
-                obst = float(row[2])
-                
-                if obst > 100:
-                    obst = VS.OBST_WALL   # wall
-                elif obst <= 0:
-                    obst = VS.OBST_NONE     # no obstacle
+        # Decides in which cycles the grid is drawn (FPS and FRAME_SKIP are optional in the config file)
+        self.scheduler = RenderScheduler(self.dic.get("FPS", 0), self.dic.get("FRAME_SKIP", 1))
 
-                if obst != VS.OBST_WALL and obst > self.__max_obst:
-                    self.__max_obst = obst
+        # Set up the obstacles - it's a float64 array GRID_WIDTH x GRID_HEIGHT indexed by [x, y]
+        # 1 means that there is no obstacle - it is a regular terrain
+        self.obst = data["obst"]
+        not_wall = self.obst[self.obst != VS.OBST_WALL]
+        self.__max_obst = max(1, float(not_wall.max())) if not_wall.size > 0 else 1
 
-                    
-                self.obst[x][y] = obst
-                #print(self.obst)
+        # Precompute what an agent perceives around each cell
+        self.__set_neighbors()
 
         #print(f"ENV: max_obst = {self.__max_obst} min_obst={self.__min_obst}")
         # Read and put the victims into the grid
-
-        victims_file = os.path.join(self.data_folder,"env_victims.txt")
-        
-        with open(victims_file, 'r') as csvfile:
-            csvreader = csv.reader(csvfile)
-            for row in csvreader:
-                x = int(row[0])
-                y = int(row[1])
-                self.victims.append((x, y))   # append tuples
+        self.victims = [tuple(v) for v in data["victims"].tolist()]   # tuples (x, y)
+        for seq, pos in enumerate(self.victims):
+            # the first victim at a position is the one perceived by the agents
+            if pos not in self.victim_seq:
+                self.victim_seq[pos] = seq
 
         self.nb_of_victims = len(self.victims)
 
-        # Load the vital signals of the victims
-        vs_file = os.path.join(self.data_folder,"env_vital_signals.txt")
-        
-        with open(vs_file, 'r') as csvfile:
-            csvreader = csv.reader(csvfile)
-            for row in csvreader:
-                seq = int(row[0])  # seq number
-                sp = float(row[1]) # sistolic pression
-                dp = float(row[2]) # diastolic pression
-                qp = float(row[3]) # quality of pression
-                pf = float(row[4]) # pulse frequency
-                rf = float(row[5]) # respiratory frequency
-                gr = float(row[Env.IDX_GRAVITY]) # injury severity value
-                lb = int(row[Env.IDX_SEVERITY])  # label of the injury severity
-                
-                self.signals.append([seq, sp, dp, qp, pf, rf, gr, lb])
-                self.severity.append(lb)
-                self.gravity.append(gr)
-                self.sum_gravity = self.sum_gravity + gr
+        # Load the vital signals of the victims [[seq, sp, dp, qp, pf, rf, gr, lb], ...]
+        # seq: seq number; sp, dp: sistolic and diastolic pression; qp: quality of pression;
+        # pf: pulse frequency; rf: respiratory frequency; gr: injury severity value; lb: label of the injury severity
+        signals = data["signals"]
+        self.signals = [[int(row[0]), *row[1:Env.IDX_SEVERITY], int(row[Env.IDX_SEVERITY])] for row in signals.tolist()]
+        self.severity = signals[:, Env.IDX_SEVERITY].astype(int).tolist()
+        self.gravity = signals[:, Env.IDX_GRAVITY].tolist()
+        self.nb_per_severity = np.bincount(self.severity, minlength=5)[1:5].tolist()
+        self.sum_gravity = sum(self.gravity)
 
         if self.nb_of_victims > len(self.signals):
             print("ENV: number of victims of env_victims.txt greater than vital signals")
@@ -117,36 +106,32 @@ class Env:
         self.found = [[] for v in range(self.nb_of_victims)]
         self.saved = [[] for v in range(self.nb_of_victims)]
                 
-        # Set up with the trace color of the last physical agent who visited the cell
-        self.visited = [[[] for y in range(self.dic["GRID_HEIGHT"])] for x in range(self.dic["GRID_WIDTH"])]
+        # Set up with the physical agents who visited each cell {(x, y): [ag1, ag2, ...]} (only visited cells)
+        self.visited = {}
         
 
     
-    def __read_config(self):
-        """ Read the size of the grid and window and loads into a dictionary """   
-        # Open config file
-        size_file = os.path.join(self.data_folder, "env_config.txt")
-        with open(size_file, "r") as file:
-            # Read each line of the file
-            for line in file:
-                # Split the line into words
-                words = line.split()
-
-                # Get the keyword and value
-                keyword = words[0]
-                raw_value = words[1]
-
-                # casts the value 
-                if keyword == "BASE":
-                    value = [int(i) for i in raw_value.split(',')]
-                elif keyword == "DELAY":
-                    value = float(raw_value)
-                else:
-                    value = int(raw_value)
+    def __set_neighbors(self):
+        """ Precompute, for each cell, the state of its 8 neighbors as returned by check_walls_and_lim.
+        The states {CLEAR, WALL, END} need 2 bits per direction, so they are packed in an uint16
+        per cell (direction i in bits 2i and 2i+1)"""
 
-                self.dic[keyword] = value               
+        width = self.dic["GRID_WIDTH"]
+        height = self.dic["GRID_HEIGHT"]
+
+        # one cell of padding around the grid represents the end of the grid
+        padded = np.full((width + 2, height + 2), VS.END, dtype=np.uint16)
+        padded[1:-1, 1:-1] = np.where(self.obst == VS.OBST_WALL, VS.WALL, VS.CLEAR)
+
+        self.neighbors = np.zeros((width, height), dtype=np.uint16)
+        for i, (dx, dy) in AbstAgent.AC_INCR.items():
+            self.neighbors |= padded[1 + dx:1 + dx + width, 1 + dy:1 + dy + height] << (2 * i)
+
+        # decoded states of each distinct packed value
+        self.neighbors_states = {}
+        for packed in np.unique(self.neighbors).tolist():
+            self.neighbors_states[packed] = tuple((packed >> (2 * i)) & 3 for i in range(8))
 
-    
     def add_agent(self, ag, state=VS.IDLE):
         """ This public method adds an agent to the simulator.
         It creates a representation for the agent in the 2D environment
@@ -159,15 +144,23 @@ class Env:
         self.agents.append(body)
         return body
 
-    def __draw(self):
-        """ This private method draw the grid and its items """
+    def _mark_dirty(self, x, y):
+        """ This protected method allows the physical agents to signal that the cell (x, y)
+        changed (agent entered or left, victim found or saved) and must be redrawn """
+        if self.headless or self.__background is None:
+            return      # nothing drawn yet: the first draw draws every item
+        self.__dirty.add((x, y))
+
+    def __draw_background(self):
+        """ This private method pre-renders the static part of the scene, the grid and the
+        obstacles, into a surface. Redrawing a cell starts by copying its area from it. """
 
         # Set cell width and height
         cell_w = self.dic["WINDOW_WIDTH"]/self.dic["GRID_WIDTH"]
         cell_h = self.dic["WINDOW_HEIGHT"]/self.dic["GRID_HEIGHT"]
 
-        # Clear the screen
-        self.screen.fill(VS.WHITE)
+        background = pygame.Surface((self.dic["WINDOW_WIDTH"], self.dic["WINDOW_HEIGHT"]))
+        background.fill(VS.WHITE)
 
         # configuration for obstacles coloring
         # h,  s,   lc, ld:
@@ -180,25 +173,19 @@ class Env:
         lightness_clear = 100  #         100= White 
         lightness_dark = 40    #         0  = Black
 
-        # configuration for ploting the trace marks
-        nb_of_ag = len(self.agents)
-        #print(f"ENV: number of agents {nb_of_ag}")
-        nb_of_rects = math.ceil(math.sqrt(nb_of_ag))
-        mark_radius = min(cell_w/nb_of_rects, cell_h/nb_of_rects) / 2
-
         # Draw the grid
         for x in range(self.dic["GRID_WIDTH"]):
             for y in range(self.dic["GRID_HEIGHT"]):
                 rect = pygame.Rect(x * cell_w, y * cell_h, cell_w, cell_h)
-                pygame.draw.rect(self.screen, (230,230,230), rect, 1)
+                pygame.draw.rect(background, (230,230,230), rect, 1)
 
-                if self.obst[x][y] == VS.OBST_WALL: # wall
+                if self.obst[x, y] == VS.OBST_WALL: # wall
                     rgb_int = VS.BLACK
                 else:
-                    if self.obst[x][y] == VS.OBST_NONE:
+                    if self.obst[x, y] == VS.OBST_NONE:
                         rgb_int = VS.WHITE
                     else:
-                        perc = self.obst[x][y]/self.__max_obst
+                        perc = float(self.obst[x, y])/self.__max_obst
                         lightness = (1 - perc) * lightness_clear + perc * lightness_dark
 
                         # convert HSL color to RGB
@@ -208,64 +195,136 @@ class Env:
                         rgb_int = tuple(int(c * 255) for c in rgb_color)
                     
                 obst_rect = pygame.Rect(x * cell_w + 1, y * cell_h + 1, cell_w - 2, cell_h - 2)
-                pygame.draw.rect(self.screen, rgb_int, obst_rect)                   
-
-                # Trace: plot a dot for each agent who has visited a cell
-                visitors = self.visited[x][y]
-                v = 0
-
-                if visitors:
-                    for i in range(nb_of_rects):
-                        for j in range(nb_of_rects):
-                            if v < len(visitors):
-                                trace_color = visitors[v].mind.TRACE_COLOR
-                                xc = x * cell_w + mark_radius * (i+1) 
-                                yc = y * cell_h + mark_radius * (j+1)
-                                pygame.draw.circle(self.screen, trace_color, (xc, yc), 0.7*mark_radius)
-                                v += 1
+                pygame.draw.rect(background, rgb_int, obst_rect)                   
+
+        self.__background = background
+
+        # victims indexed by position for redrawing single cells
+        self.__victims_at = {}
+        for v, victim in enumerate(self.victims):
+            self.__victims_at.setdefault(victim, []).append(v)
+
+    def __draw_cell(self, x, y, agents_at):
+        """ This private method redraws the dynamic items of one cell over the background:
+        trace marks, base marker, victims and active agents
+        @param agents_at: a dictionary (x, y): [bodies] of the active agents
+        @return: the rectangle of the cell to be updated in the display"""
+
+        cell_w = self.__cell_w
+        cell_h = self.__cell_h
+        mark_radius = self.__mark_radius
+        nb_of_rects = self.__nb_of_rects
+
+        rect = pygame.Rect(x * cell_w, y * cell_h, cell_w, cell_h)
+        self.screen.set_clip(rect)
+        self.screen.blit(self.__background, rect, rect)
+
+        # Trace: plot a dot for each agent who has visited a cell
+        visitors = self.visited.get((x, y))
+        v = 0
+
+        if visitors:
+            for i in range(nb_of_rects):
+                for j in range(nb_of_rects):
+                    if v < len(visitors):
+                        trace_color = visitors[v].mind.TRACE_COLOR
+                        xc = x * cell_w + mark_radius * (i+1) 
+                        yc = y * cell_h + mark_radius * (j+1)
+                        pygame.draw.circle(self.screen, trace_color, (xc, yc), 0.7*mark_radius)
+                        v += 1
 
         # Draw a marker at the base
-        rect = pygame.Rect(self.dic["BASE"][0] * cell_w, self.dic["BASE"][1] * cell_h, cell_w, cell_h)
-        pygame.draw.rect(self.screen, VS.CYAN, rect, 4)       
+        if x == self.dic["BASE"][0] and y == self.dic["BASE"][1]:
+            pygame.draw.rect(self.screen, VS.CYAN, rect, 4)       
 
         # Draw the victims
-        v=0
-        for victim in self.victims:
-            victim_rect = pygame.Rect(victim[0] * cell_w + 1, victim[1] * cell_h + 1, cell_w - 1, cell_h - 1)
+        for v in self.__victims_at.get((x, y), []):
+            victim_rect = pygame.Rect(x * cell_w + 1, y * cell_h + 1, cell_w - 1, cell_h - 1)
             c = self.severity[v]-1
             pygame.draw.ellipse(self.screen, VS.VIC_COLOR_LIST[c], victim_rect)
             if self.saved[v] != []:
                 pygame.draw.ellipse(self.screen, VS.WHITE, victim_rect, 3)
             elif self.found[v] != []:
                 pygame.draw.ellipse(self.screen, VS.BLACK, victim_rect, 3)
-            v = v + 1
 
         # Draw the physical agents
+        for body in agents_at.get((x, y), []):
+            p_x1 = body.x * cell_w + 0.2 * cell_w
+            p_x2 = body.x * cell_w + cell_w/2 
+            p_x3 = body.x * cell_w + 0.8 * cell_w
+            p_y1 = body.y * cell_h + cell_h/2 
+            p_y2 = body.y * cell_h + 0.2 * cell_h
+            p_y3 = body.y * cell_h + 0.8 * cell_h
+            
+            triangle = [(p_x1, p_y1), (p_x2, p_y2), (p_x3, p_y1), (p_x2, p_y3)]
+            pygame.draw.polygon(self.screen, body.mind.COLOR, triangle)
+
+        self.screen.set_clip(None)
+        return rect
+
+    def __draw(self):
+        """ This private method draws the grid and its items. The first call blits the
+        pre-rendered background and draws every item; the next ones redraw only the dirty
+        cells (marked by the physical agents or where an agent changed its state) and
+        update only their rectangles in the display """
+
+        # Active agents by position
+        agents_at = {}
+        drawn_agents = {}
         for body in self.agents:
             if body._state == VS.ACTIVE:
-               #ag_rect = pygame.Rect(body.x * cell_w, body.y * cell_h, cell_w, cell_h)
-               #pygame.draw.rect(self.screen, body.mind.COLOR, ag_rect)
-               p_x1 = body.x * cell_w + 0.2 * cell_w
-               p_x2 = body.x * cell_w + cell_w/2 
-               p_x3 = body.x * cell_w + 0.8 * cell_w
-               p_y1 = body.y * cell_h + cell_h/2 
-               p_y2 = body.y * cell_h + 0.2 * cell_h
-               p_y3 = body.y * cell_h + 0.8 * cell_h
-               
-               triangle = [(p_x1, p_y1), (p_x2, p_y2), (p_x3, p_y1), (p_x2, p_y3)]
-               pygame.draw.polygon(self.screen, body.mind.COLOR, triangle)
-               active_idle = True
+                agents_at.setdefault((body.x, body.y), []).append(body)
+                drawn_agents[body] = (body.x, body.y)
+
+        # Agents that moved, appeared or disappeared since the last draw (the first draw draws them all)
+        if not self.headless and self.__background is not None:
+            for body in drawn_agents.keys() | self.__drawn_agents.keys():
+                old = self.__drawn_agents.get(body)
+                new = drawn_agents.get(body)
+                if old != new:
+                    if old is not None:
+                        self.__dirty.add(old)
+                    if new is not None:
+                        self.__dirty.add(new)
+        self.__drawn_agents = drawn_agents
+
+        if self.__background is None:
+            # Set cell width and height
+            self.__cell_w = self.dic["WINDOW_WIDTH"]/self.dic["GRID_WIDTH"]
+            self.__cell_h = self.dic["WINDOW_HEIGHT"]/self.dic["GRID_HEIGHT"]
+
+            # configuration for ploting the trace marks
+            nb_of_ag = len(self.agents)
+            self.__nb_of_rects = math.ceil(math.sqrt(nb_of_ag))
+            self.__mark_radius = min(self.__cell_w/self.__nb_of_rects, self.__cell_h/self.__nb_of_rects) / 2
+
+            self.__draw_background()
+            self.screen.blit(self.__background, (0, 0))
+
+            # Every cell with a dynamic item is drawn once
+            self.__dirty.update(self.__victims_at.keys())
+            self.__dirty.add((self.dic["BASE"][0], self.dic["BASE"][1]))
+            self.__dirty.update(agents_at.keys())
+            self.__dirty.update(self.visited.keys())
+
+            for x, y in self.__dirty:
+                self.__draw_cell(x, y, agents_at)
+            self.__dirty.clear()
+
+            pygame.display.update()
+            return
+
+        rects = [self.__draw_cell(x, y, agents_at) for x, y in self.__dirty]
+        self.__dirty.clear()
 
         # Update the display
-        pygame.display.update()
+        if rects:
+            pygame.display.update(rects)
         
                 
-    def run(self):
-        """ This public method is the engine of the simulator. It calls the deliberate
-        method of each ACTIVE agent situated in the environment. Then, it updates the state
-        of the agents and of the environment"""
+    def __init_display(self):
+        """ This private method opens the pygame window and draws the environment """
 
-        cycle = 0
         # Set up Pygame
         pygame.init()
 
@@ -277,15 +336,38 @@ class Env:
 
         # Draw the environment with items
         self.__draw()
+        self.scheduler.start()
+
+    def run(self, log_file=None):
+        """ This public method is the engine of the simulator. It calls the deliberate
+        method of each ACTIVE agent situated in the environment. Then, it updates the state
+        of the agents and of the environment.
+        In headless mode, the same scheduling loop runs without pygame, without the DELAY
+        and without waiting for the user at the end.
+        @param log_file: if given, every action of the agents is recorded in this file (see replay)
+        @return: a dictionary with the final stats (see get_results)"""
+
+        cycle = 0
+
+        if log_file is not None:
+            self.action_log = action_log.ActionLog(self)
+
+        if not self.headless:
+            self.__init_display()
         
         # Create the main loop
         running = True
 
         while running:
+            self.cycles = cycle
+
             # Handle events
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:                 
-                    running = False
+            if not self.headless:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:                 
+                        running = False
+                    elif event.type == pygame.KEYDOWN:
+                        self.scheduler.handle_key(event.key)
                     
             # control whether or not there are active or idle agents
             active_or_idle = False
@@ -303,30 +385,40 @@ class Env:
 
                     # Test if the agent exceeded the time limit
                     if body._end_of_time():
-                        body._state = VS.DEAD
+                        body._set_state(VS.DEAD)
                         print("ENV: " + body.mind.NAME + ": time limit reached, no batt, it is dead")
                     elif not more_actions_to_do: # agent do not have more actions to do
                         if body._at_base():
                             print("ENV: ag " + body.mind.NAME + " succesfully terminated, it is at the base")
-                            body._state = VS.ENDED
+                            body._set_state(VS.ENDED)
                         else:
                             print("ENV: ag " + body.mind.NAME + " is not at the base and asked for termination. Now, it's dead")
-                            body._state = VS.DEAD
+                            body._set_state(VS.DEAD)
 
                 elif body._state == VS.IDLE:
                     active_or_idle = True
 
-            # Update the grid after the delay
-            if self.dic["DELAY"] > 0:
-                time.sleep(self.dic["DELAY"])
-                
-            self.__draw()
+            if not self.headless:
+                # Update the grid after the delay
+                if self.dic["DELAY"] > 0:
+                    time.sleep(self.dic["DELAY"])
+
+                # Draw only when the render scheduler says a frame is due
+                if self.scheduler.tick():
+                    self.__draw()
+                    self.scheduler.frame_drawn()
 
             cycle += 1
 
             # Show metrics when there is no more active or idle agents
             if not active_or_idle:
                 print("ENV: no active or idle agent scheduled for execution... terminating")
+                if not self.headless:
+                    # the last frame shows the final state
+                    self.__draw()
+                    self.scheduler.frame_drawn()
+                    print(f"ENV: {self.scheduler.report()}")
+
                 if self.dic["STATS_PER_AG"] == 1:
                     print("RESULTS PER AGENT")
                     self.print_results()
@@ -334,58 +426,136 @@ class Env:
                 if self.dic["STATS_ALL_AG"] == 1:
                     print("\n--------------")
                     self.print_acum_results()
-                    
-                input("ENV: Tecle qualquer coisa para encerrar >>")
+
+                if not self.headless:
+                    input("ENV: Tecle qualquer coisa para encerrar >>")
                 running = False
    
+        self.cycles = cycle
+
+        if self.action_log is not None:
+            self.action_log.save(log_file)
+            print(f"ENV: {len(self.action_log)} actions recorded in {log_file}")
+            self.action_log = None
 
         # Quit Pygame
-        pygame.quit()
+        if not self.headless:
+            pygame.quit()
+
+        return self.get_results()
 
-    def __print_victims(self, victims, type_str, sub, ident=3):
+    def replay(self, log_file, start_cycle=0, end_cycle=None):
+        """ This public method re-executes the actions recorded by run(log_file) against new
+        physical agents, without calling any deliberate method. The environment must not have
+        agents. Each result and remaining time is checked against the recorded ones.
+        @param log_file: the action log
+        @param start_cycle: when rendering, the cycles before this one are replayed without drawing (seek)
+        @param end_cycle: the last cycle to replay (None: replay the whole log)
+        @return: a dictionary with the stats at the end of the replay (see get_results)"""
+
+        header, records = action_log.load(log_file)
+
+        # Physical agents with the recorded configuration
+        for attributes in header["agents"]:
+            self.add_agent(action_log.LoggedMind(attributes), attributes["state"])
+
+        mismatches = 0
+        current = -1
+        running = True
+        displayed = False
+
+        for cycle, agent, action, dx, dy, result, rtime in records.tolist():
+            if end_cycle is not None and cycle > end_cycle:
+                break
+
+            # A new cycle begins: draw the previous one if a frame is due
+            if cycle != current:
+                current = cycle
+                if not self.headless and cycle >= start_cycle:
+                    if not displayed:
+                        self.__init_display()
+                        displayed = True
+                    for event in pygame.event.get():
+                        if event.type == pygame.QUIT:
+                            running = False
+                        elif event.type == pygame.KEYDOWN:
+                            self.scheduler.handle_key(event.key)
+                    if not running:
+                        break
+                    if self.scheduler.tick():
+                        self.__draw()
+                        self.scheduler.frame_drawn()
+
+            body = self.agents[agent]
+            if action == action_log.WALK:
+                got = body._walk(dx, dy)
+            elif action == action_log.READ:
+                got = body._read_vital_signals()
+            elif action == action_log.FIRST_AID:
+                got = body._first_aid()
+            else:
+                body._state = result
+                got = result
+
+            if action_log.encode_result(got) != result or body._rtime != rtime:
+                mismatches += 1
+
+        if end_cycle is None and running:
+            self.cycles = header["cycles"]
+        else:
+            self.cycles = current + 1
+
+        if mismatches > 0:
+            print(f"ENV: replay of {log_file} diverged from the log in {mismatches} actions")
+
+        if not self.headless:
+            if not displayed:
+                self.__init_display()
+            self.__draw()
+            self.scheduler.frame_drawn()
+            print(f"ENV: {self.scheduler.report()}")
+            input("ENV: Tecle qualquer coisa para encerrar >>")
+            pygame.quit()
+
+        return self.get_results()
+
+    def __print_victims(self, ledger, type_str, sub, ident=3):
         """ Print either the found or the saved victims list
-        @param victims: it is the list to be printed
+        @param ledger: it is the ledger (found or saved victims) to be printed
         @param type_str: it is a string for composing the pring
         @param sub: it is a character representing the metric"""
 
         idents = ' ' * ident
+        sev = ledger.per_severity
+        tot = self.nb_per_severity
 
-        if len(victims) > 0:
-            sev = []
-            grav = []
-            tot_grav = 0        # for peg or psg calculation
-            for v in victims:
-                sev.append(self.severity[v])
-                grav.append(self.gravity[v])
-                tot_grav = tot_grav + self.gravity[v]
-
+        if len(ledger) > 0:
             print(f"\n{idents}{type_str} victims: (id, severity, gravity)")
-            for i in range(len(victims)):
-                print(f"{idents}({victims[i]:d}, {sev[i]:d}, {grav[i]:.1f})", end=' ')
+            for v in ledger.seqs():
+                print(f"{idents}({v:d}, {self.severity[v]:d}, {self.gravity[v]:.1f})", end=' ')
 
             print("\n")
-            if self.severity.count(1) > 0:
-                print(f"{idents}Critical victims {type_str}     (V{sub}1) = {sev.count(1):3d} out of {self.severity.count(1)} ({100*sev.count(1)/self.severity.count(1):.1f})%")
-            if self.severity.count(2) > 0:
-                print(f"{idents}Instable victims {type_str}     (V{sub}2) = {sev.count(2):3d} out of {self.severity.count(2)} ({100*sev.count(2)/self.severity.count(2):.1f})%")
-            if self.severity.count(3) > 0:
-                print(f"{idents}Pot. inst. victims {type_str}   (V{sub}3) = {sev.count(3):3d} out of {self.severity.count(3)} ({100*sev.count(3)/self.severity.count(3):.1f})%")
-            if self.severity.count(4) > 0:
-                print(f"{idents}Stable victims {type_str}       (V{sub}4) = {sev.count(4):3d} out of {self.severity.count(4)} ({100*sev.count(4)/self.severity.count(4):.1f})%")
+            if tot[0] > 0:
+                print(f"{idents}Critical victims {type_str}     (V{sub}1) = {sev[0]:3d} out of {tot[0]} ({100*sev[0]/tot[0]:.1f})%")
+            if tot[1] > 0:
+                print(f"{idents}Instable victims {type_str}     (V{sub}2) = {sev[1]:3d} out of {tot[1]} ({100*sev[1]/tot[1]:.1f})%")
+            if tot[2] > 0:
+                print(f"{idents}Pot. inst. victims {type_str}   (V{sub}3) = {sev[2]:3d} out of {tot[2]} ({100*sev[2]/tot[2]:.1f})%")
+            if tot[3] > 0:
+                print(f"{idents}Stable victims {type_str}       (V{sub}4) = {sev[3]:3d} out of {tot[3]} ({100*sev[3]/tot[3]:.1f})%")
             print(f"{idents}--------------------------------------")
-            print(f"{idents}Total of {type_str} victims     (V{sub})  = {len(sev):3d} ({100*float(len(sev)/self.nb_of_victims):.2f}%)")
+            print(f"{idents}Total of {type_str} victims     (V{sub})  = {len(ledger):3d} ({100*float(len(ledger)/self.nb_of_victims):.2f}%)")
 
-            weighted = ((6*sev.count(1) + 3*sev.count(2) + 2*sev.count(3) + sev.count(4))/
-            (6*self.severity.count(1)+3*self.severity.count(2)+2*self.severity.count(3)+self.severity.count(4)))
+            weighted = self.__weighted(ledger)
 
             print(f"{idents}Weighted {type_str} victims per severity (V{sub}g) = {weighted:.2f}\n")
             
-            print(f"{idents}Sum of gravities of all {type_str} victims = {tot_grav:.2f} of a total of {self.sum_gravity:.2f}")
-            print(f"{idents}  % of gravities of all {type_str} victims = {tot_grav/self.sum_gravity:.2f}")
+            print(f"{idents}Sum of gravities of all {type_str} victims = {ledger.sum_gravity:.2f} of a total of {self.sum_gravity:.2f}")
+            print(f"{idents}  % of gravities of all {type_str} victims = {ledger.sum_gravity/self.sum_gravity:.2f}")
             print(f"{idents}--------------------------------------")
             print(f"{idents}CSV of {type_str} victims")
             print(f"{idents}V{sub}1,V{sub}2,V{sub}3,V{sub}4,V{sub}g")
-            print(f"{idents}{sev.count(1)},{sev.count(2)},{sev.count(3)},{sev.count(4)},{weighted}")
+            print(f"{idents}{sev[0]},{sev[1]},{sev[2]},{sev[3]},{weighted}")
         else:
             print(f"{idents}No {type_str} victims")
             print(f"{idents}--------------------------------------")
@@ -409,47 +579,96 @@ class Env:
             print(f"{body.mind.TLIM - body._rtime:.2f} of {body.mind.TLIM:.2f}")
         
             # Found victims
-            found = body._get_found_victims()
-            self.__print_victims(found, "found","e", ident=5)
+            self.__print_victims(body._found, "found","e", ident=5)
 
             # Saved victims
-            saved = body._get_saved_victims()
-            self.__print_victims(saved, "saved","s", ident=5)
+            self.__print_victims(body._saved, "saved","s", ident=5)
  
             
     def print_acum_results(self):
         """ Print found victims and saved victims by severity for all agents.
         This is what actually happened in the environment"""
 
+        tot = self.nb_per_severity
 
         print("\n\n*** ACUMULATED RESULTS - FOR ALL AGENTS ***\n")
         print(f" *** Numbers of Victims in the Environment ***")
-        print(f"   Critical victims    (V1) = {self.severity.count(1):3d}")
-        print(f"   Instable victims    (V2) = {self.severity.count(2):3d}")
-        print(f"   Pot. inst. victims  (V3) = {self.severity.count(3):3d}")
-        print(f"   Stable victims      (V4) = {self.severity.count(4):3d}")
+        print(f"   Critical victims    (V1) = {tot[0]:3d}")
+        print(f"   Instable victims    (V2) = {tot[1]:3d}")
+        print(f"   Pot. inst. victims  (V3) = {tot[2]:3d}")
+        print(f"   Stable victims      (V4) = {tot[3]:3d}")
         print(f"   --------------------------------------")
         print(f"   Total of victims    (V)  = {self.nb_of_victims:3d}")
         print(f"   Sum of all gravities(SG) = {self.sum_gravity:.2f}")
         print(f"   --------------------------------------")
         print(f"   CSV of nb. total of victims")
         print(f"   V1,V2,V3,V4,SG")
-        print(f"   {self.severity.count(1)},{self.severity.count(2)},{self.severity.count(3)},{self.severity.count(4)},{self.sum_gravity}")
+        print(f"   {tot[0]},{tot[1]},{tot[2]},{tot[3]},{self.sum_gravity}")
 
-        found = []
-        for index, agents in enumerate(self.found, start=0):
-            if agents:
-                found.append(index)
         print(f"")
         print(f" *** FOUND victims by all explorer agents ***")
-        self.__print_victims(found, "found", "e", ident=5)
+        self.__print_victims(self.found_ledger, "found", "e", ident=5)
     
-        saved = []
-        for index, agents in enumerate(self.saved, start=0):
-            if agents:
-                saved.append(index)
         print(f"")
         print(f" *** SAVED victims by all rescuer agents ***")
-        self.__print_victims(saved, "saved", "s", ident=5)
+        self.__print_victims(self.saved_ledger, "saved", "s", ident=5)
         print(f"\n *** END OF STATS ***")
 
+    def __weighted(self, ledger):
+        """ Weighted number of victims per severity of a ledger against all the victims """
+        sev = ledger.per_severity
+        tot = self.nb_per_severity
+        return ((6*sev[0] + 3*sev[1] + 2*sev[2] + sev[3])/
+                (6*tot[0] + 3*tot[1] + 2*tot[2] + tot[3]))
+
+    def __victims_stats(self, ledger, sub):
+        """ Compute the metrics of either the found or the saved victims ledger
+        @param ledger: the ledger of found or saved victims
+        @param sub: it is a character representing the metric (e: found, s: saved)
+        @return: a dictionary with the keys V<sub>1..V<sub>4, V<sub>, V<sub>g and SG<sub>"""
+
+        sev = ledger.per_severity
+
+        weighted = 0.0
+        if len(ledger) > 0:
+            weighted = self.__weighted(ledger)
+
+        return {f"V{sub}1": sev[0],
+                f"V{sub}2": sev[1],
+                f"V{sub}3": sev[2],
+                f"V{sub}4": sev[3],
+                f"V{sub}": len(ledger),
+                f"V{sub}g": weighted,
+                f"SG{sub}": ledger.sum_gravity}
+
+    def get_results(self):
+        """ Return the final stats of the simulation as a dictionary. It contains the same
+        metrics printed by print_results and print_acum_results, so it can be used by
+        scripts running the simulator in batch (headless) mode.
+        @return: {"cycles": int,
+                  "victims": {V1, V2, V3, V4, V, SG},
+                  "found": {Ve1, Ve2, Ve3, Ve4, Ve, Veg, SGe},
+                  "saved": {Vs1, Vs2, Vs3, Vs4, Vs, Vsg, SGs},
+                  "agents": [{name, state, tlim, consumed_time, found: {...}, saved: {...}}, ...]}"""
+
+        tot = self.nb_per_severity
+        results = {"cycles": self.cycles,
+                   "victims": {"V1": tot[0],
+                               "V2": tot[1],
+                               "V3": tot[2],
+                               "V4": tot[3],
+                               "V": self.nb_of_victims,
+                               "SG": self.sum_gravity},
+                   "found": self.__victims_stats(self.found_ledger, "e"),
+                   "saved": self.__victims_stats(self.saved_ledger, "s"),
+                   "agents": []}
+
+        for body in self.agents:
+            results["agents"].append({"name": body.mind.NAME,
+                                      "state": body._state,
+                                      "tlim": body.mind.TLIM,
+                                      "consumed_time": body.mind.TLIM - body._rtime,
+                                      "found": self.__victims_stats(body._found, "e"),
+                                      "saved": self.__victims_stats(body._saved, "s")})
+
+        return results
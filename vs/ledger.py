@@ -0,0 +1,34 @@
+## LEDGER
+### It keeps the victims found or saved by an agent (or by all the agents)
+### with running counters per severity, so the final stats do not need to
+### scan the lists of the environment.
+
+class Ledger:
+    """ A set of victims' sequential numbers with counters updated at each new entry """
+
+    def __init__(self):
+        self.victims = set()            # sequential numbers of the victims
+        self.per_severity = [0] * 4     # number of victims by severity label: index 0 is label 1 (critical)
+        self.sum_gravity = 0.0          # sum of the gravity values of the victims
+
+    def add(self, seq, severity, gravity):
+        """ Register a victim; a victim already in the ledger is not counted twice
+        @param seq: the sequential number of the victim
+        @param severity: the severity label of the victim [1, 4]
+        @param gravity: the gravity value of the victim
+        @return: True if the victim is new in the ledger """
+
+        if seq in self.victims:
+            return False
+
+        self.victims.add(seq)
+        self.per_severity[severity - 1] += 1
+        self.sum_gravity += gravity
+        return True
+
+    def seqs(self):
+        """ @return: the sorted list of the sequential numbers of the victims """
+        return sorted(self.victims)
+
+    def __len__(self):
+        return len(self.victims)
@@ -5,6 +5,8 @@ import random
 import csv
 import time
 from .constants import VS
+from .ledger import Ledger
+from . import action_log
 
 ## Class PhysAgent
 """ It is the representation of an agent in the environment
@@ -26,6 +28,8 @@ class PhysAgent:
         self.y = y_base               # current y coordinate
         self._rtime = mind.TLIM       # current remaining time
         self._state = state           # -1=dead  0=successfully ended 1=alive
+        self._found = Ledger()        # victims found by this agent
+        self._saved = Ledger()        # victims saved by this agent
        
 
     def _end_of_time(self):
@@ -47,7 +51,21 @@ class PhysAgent:
        
         return False
 
+    def _set_state(self, value):
+        """ This protected method changes the state of the agent (see VS) and records the change in the action log """
+        self._state = value
+        if self.env.action_log is not None:
+            self.env.action_log.add(self, action_log.STATE, 0, 0, value)
+
     def _walk(self, dx, dy):
+        """ Public method for moving the agent's body one cell to any direction (if possible).
+        The action is recorded in the action log of the environment, if any (see __walk) """
+        result = self.__walk(dx, dy)
+        if self.env.action_log is not None:
+            self.env.action_log.add(self, action_log.WALK, dx, dy, result)
+        return result
+
+    def __walk(self, dx, dy):
         """ Public method for moving the agent's body one cell to any direction (if possible)
         @param dx: an int value corresponding to deplacement in the x axis
         @param dy: an int value corresponding to deplacement in the y axis
@@ -68,18 +86,21 @@ class PhysAgent:
         
         if (new_x >= 0 and new_x < self.env.dic["GRID_WIDTH"]and
             new_y >= 0 and new_y < self.env.dic["GRID_HEIGHT"] and
-            self.env.obst[new_x][new_y] != 100):
-            #print(f"{self.mind.NAME}: obstacle difficulty {self.env.obst[new_x][new_y]}")
-            self._rtime -= base * self.env.obst[new_x][new_y]
+            self.env.obst[new_x, new_y] != 100):
+            #print(f"{self.mind.NAME}: obstacle difficulty {self.env.obst[new_x, new_y]}")
+            self._rtime -= base * float(self.env.obst[new_x, new_y])
             
             ## agent is dead: not enough time
             if self._rtime < 0:
                 return VS.TIME_EXCEEDED
             else:
+                self.env._mark_dirty(self.x, self.y)
+                self.env._mark_dirty(new_x, new_y)
                 self.x = new_x
                 self.y = new_y
-                if self not in self.env.visited[new_x][new_y]:
-                    self.env.visited[new_x][new_y].append(self)
+                visitors = self.env.visited.setdefault((new_x, new_y), [])
+                if self not in visitors:
+                    visitors.append(self)
                 return VS.EXECUTED
         else:
             ## when the agent bumps, we penalize the agent subtracting only the base time from the remaing time 
@@ -96,24 +117,9 @@ class PhysAgent:
         END means the end of the grid (value = 2)
         """
         
-        delta = [(0,-1),(1,-1),(1,0),(1,1),(0,1),(-1,1),(-1,0),(-1,-1)]
-        obstacles = [VS.CLEAR] * 8
-        i = 0
-
-        for d in delta:
-            new_x = self.x + d[0]
-            new_y = self.y + d[1]
-
-            if new_x < 0 or new_x >= self.env.dic["GRID_WIDTH"] or new_y < 0 or new_y >= self.env.dic["GRID_HEIGHT"]:
-                obstacles[i] = VS.END
-            elif self.env.obst[new_x][new_y] == 100:
-                obstacles[i] = VS.WALL
-
-            i += 1
-
-        #print(f"({self.x},{self.y}): obstacles={obstacles}")
-  
-        return obstacles 
+        # the states of the neighbors are precomputed by the environment
+        packed = int(self.env.neighbors[self.x, self.y])
+        return list(self.env.neighbors_states[packed])
 
 
     def _check_for_victim(self):
@@ -121,14 +127,17 @@ class PhysAgent:
         @returns: the sequential number of the victim - an integer starting from zero that corresponds to the position of
         the victim in the data files victims.txt and vital_signals.txt or VS.NO_VICTIMif there is no victim at the current position of the agent"""
 
-        seq = VS.NO_VICTIM
-
-        if (self.x, self.y) in self.env.victims:
-            seq = self.env.victims.index((self.x, self.y))
-
-        return seq
+        return self.env.victim_seq.get((self.x, self.y), VS.NO_VICTIM)
 
     def _read_vital_signals(self):
+        """ Public method for reading the vital signals and marking a victim as found.
+        The action is recorded in the action log of the environment, if any (see __read_vital_signals) """
+        result = self.__read_vital_signals()
+        if self.env.action_log is not None:
+            self.env.action_log.add(self, action_log.READ, 0, 0, action_log.encode_result(result))
+        return result
+
+    def __read_vital_signals(self):
         """ Public method for reading the vital signals and marking a victim as found. The agent can only
         successfully execute this method if it is in the same position of the victim.
         Every tentative of reading the vital signal out of position consumes time.
@@ -152,9 +161,22 @@ class PhysAgent:
         # Mark the victim as found by this agent.
         # More than one agent can found the same victim, so it's a list
         self.env.found[seq].append(self)
+        self.env._mark_dirty(self.x, self.y)
+
+        # Update the ledgers (counters per severity) of the agent and of the environment
+        self._found.add(seq, self.env.severity[seq], self.env.gravity[seq])
+        self.env.found_ledger.add(seq, self.env.severity[seq], self.env.gravity[seq])
         return self.env.signals[seq][:-2] # remove the last two elements: label and value of severity
 
     def _first_aid(self):
+        """ Public method for dropping the first aid package to the victim located at the same position of the agent.
+        The action is recorded in the action log of the environment, if any (see __first_aid) """
+        result = self.__first_aid()
+        if self.env.action_log is not None:
+            self.env.action_log.add(self, action_log.FIRST_AID, 0, 0, action_log.encode_result(result))
+        return result
+
+    def __first_aid(self):
         """ Public method for dropping the first aid package to the victim located at the same position of the agent.
         This method marks the victim as saved.
         @returns:
@@ -177,34 +199,21 @@ class PhysAgent:
         # Mark the victim as found by this agent.
         # More than one agent can drop a first-aid package to the same victim, so it's a list
         self.env.saved[seq].append(self)
+        self.env._mark_dirty(self.x, self.y)
+
+        # Update the ledgers (counters per severity) of the agent and of the environment
+        self._saved.add(seq, self.env.severity[seq], self.env.gravity[seq])
+        self.env.saved_ledger.add(seq, self.env.severity[seq], self.env.gravity[seq])
         return True
 
     def _get_found_victims(self):
         """ Public method for returning the number of found victims by the agent
         @returns a list with the sequential number of found victims """
 
-        victims = []
-
-        v = 0
-        for finders in self.env.found:
-            if self in finders:
-                victims.append(v)
-            v = v + 1
-  
-        return victims
+        return self._found.seqs()
 
     def _get_saved_victims(self):
         """ Public method for returning the number of saved victims by the agent
         @returns a list with the sequential number of saved victims """
 
-        victims = []
-
-        v = 0
-        for rescuers in self.env.saved:
-            if self in rescuers:
-                victims.append(v)
-            v = v + 1
-  
-        return victims 
-                
-            
+        return self._saved.seqs()
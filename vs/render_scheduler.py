@@ -0,0 +1,94 @@
+## RENDER SCHEDULER
+### It decides in which simulation cycles the environment is drawn, so the
+### simulation may run as fast as it can while the display is refreshed at
+### a fixed rate.
+
+import time
+import pygame
+
+
+class RenderScheduler:
+    """ Decouples the render rate from the simulation rate. Two modes:
+    - FPS: a frame is drawn when at least 1/fps seconds of wall time have passed since the last one
+    - frame skip: a frame is drawn every frame_skip cycles (frame_skip=1 draws every cycle)
+    Both are configured in env_config.txt by the keywords FPS and FRAME_SKIP. FPS has
+    precedence when it is greater than zero.
+    At runtime: [+] renders more often, [-] renders less often, [m] switches the mode """
+
+    DEFAULT_FPS = 30.0   # target fps when switching to the FPS mode without a configured value
+
+    def __init__(self, fps=0.0, frame_skip=1):
+        """ @param fps: target frames per second; 0 means no time based limit
+            @param frame_skip: number of cycles between two frames when fps is 0 """
+        self.fps = float(fps)
+        self.frame_skip = max(1, int(frame_skip))
+        self.__last_fps = self.fps if self.fps > 0 else RenderScheduler.DEFAULT_FPS
+
+        self.cycles = 0      # simulation cycles since start
+        self.frames = 0      # frames drawn since start
+        self.__start = time.perf_counter()
+        self.__last_frame = self.__start
+        self.__last_frame_cycle = 0
+
+    def start(self):
+        """ Reset the counters and the clock; called when the simulation starts """
+        self.cycles = 0
+        self.frames = 0
+        self.__start = time.perf_counter()
+        self.__last_frame = self.__start
+        self.__last_frame_cycle = 0
+
+    def tick(self):
+        """ Count one simulation cycle and tell if a frame is due
+        @return: True if the environment should be drawn in this cycle """
+        self.cycles += 1
+
+        if self.fps > 0:
+            return time.perf_counter() - self.__last_frame >= 1.0 / self.fps
+
+        return self.cycles - self.__last_frame_cycle >= self.frame_skip
+
+    def frame_drawn(self):
+        """ Register that a frame was drawn """
+        self.frames += 1
+        self.__last_frame = time.perf_counter()
+        self.__last_frame_cycle = self.cycles
+
+    def handle_key(self, key):
+        """ Change the render rate according to a pygame key
+        @param key: the pygame key code of a KEYDOWN event
+        @return: True if the key was handled """
+
+        if key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            if self.fps > 0:
+                self.fps = self.fps * 2
+            else:
+                self.frame_skip = max(1, self.frame_skip // 2)
+        elif key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            if self.fps > 0:
+                self.fps = max(1.0, self.fps / 2)
+            else:
+                self.frame_skip = self.frame_skip * 2
+        elif key == pygame.K_m:
+            if self.fps > 0:
+                self.__last_fps = self.fps
+                self.fps = 0.0
+            else:
+                self.fps = self.__last_fps
+        else:
+            return False
+
+        print(f"ENV: render {self.mode()}")
+        return True
+
+    def mode(self):
+        """ @return: a string describing the current render mode """
+        if self.fps > 0:
+            return f"at {self.fps:.1f} frames/s"
+        return f"every {self.frame_skip} cycle(s)"
+
+    def report(self):
+        """ @return: a string with the achieved cycles/s against frames/s """
+        elapsed = max(time.perf_counter() - self.__start, 1e-9)
+        return (f"{self.cycles} cycles in {elapsed:.2f}s ({self.cycles/elapsed:.1f} cycles/s), "
+                f"{self.frames} frames ({self.frames/elapsed:.1f} frames/s), render {self.mode()}")
@@ -0,0 +1,190 @@
+## SCENARIO
+### It loads the data of an environment (config, obstacles, victims and vital
+### signals). The text files are parsed once and compiled into a single .npz
+### file kept in the data folder; the next loads read the compiled file while
+### the text files are not modified.
+###
+### To compile scenarios ahead of time:
+###    python -m vs.scenario datasets/data_400v_90x90 [other folders...]
+
+import os
+import sys
+import json
+import zipfile
+import argparse
+import numpy as np
+from .constants import VS
+
+FORMAT_VERSION = 1
+COMPILED_FILE = "env_compiled.npz"
+SOURCE_FILES = ["env_config.txt", "env_obst.txt", "env_victims.txt", "env_vital_signals.txt"]
+
+
+def read_config(data_folder):
+    """ Read the size of the grid and window and other parameters of env_config.txt
+    @return: a dictionary keyword: value """
+
+    dic = {}
+    size_file = os.path.join(data_folder, "env_config.txt")
+    with open(size_file, "r") as file:
+        # Read each line of the file
+        for line in file:
+            # Split the line into words
+            words = line.split()
+            if not words:
+                continue
+
+            # Get the keyword and value
+            keyword = words[0]
+            raw_value = words[1]
+
+            # casts the value
+            if keyword == "BASE":
+                value = [int(i) for i in raw_value.split(',')]
+            elif keyword == "DELAY" or keyword == "FPS":
+                value = float(raw_value)
+            else:
+                value = int(raw_value)
+
+            dic[keyword] = value
+
+    return dic
+
+
+def read_text(data_folder):
+    """ Parse the text files of a scenario
+    @return: a dictionary with
+       config:  the dictionary of env_config.txt
+       obst:    float64 array GRID_WIDTH x GRID_HEIGHT with the difficulty of each cell ]0, 100]
+       victims: int32 array (n, 2) with the coordinates of the victims
+       signals: float64 array (m, 8) with the vital signals [seq, sp, dp, qp, pf, rf, gr, lb] """
+
+    config = read_config(data_folder)
+
+    # absolute multiplying factor representing the degree of difficulty/facility for the agent to enter the cell
+    # values ]0, 1[ means a descent; 1 = VS.OBST_NONE; ]1, 100[ = ascent; 100 = VS.OBST_WALL
+    obst = np.ones((config["GRID_WIDTH"], config["GRID_HEIGHT"]), dtype=np.float64)
+    rows = np.loadtxt(os.path.join(data_folder, "env_obst.txt"), delimiter=",", ndmin=2)
+    if len(rows) > 0:
+        values = rows[:, 2]
+        values = np.where(values > 100, VS.OBST_WALL, values)   # wall
+        values = np.where(values <= 0, VS.OBST_NONE, values)    # no obstacle
+        obst[rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64)] = values
+
+    victims = np.loadtxt(os.path.join(data_folder, "env_victims.txt"), delimiter=",", dtype=np.int32, ndmin=2)
+    signals = np.loadtxt(os.path.join(data_folder, "env_vital_signals.txt"), delimiter=",", ndmin=2)
+
+    return {"config": config,
+            "obst": obst,
+            "victims": victims.reshape(-1, 2),
+            "signals": signals.reshape(-1, 8)}
+
+
+def source_key(data_folder):
+    """ A key that changes whenever one of the text files changes (name, size and modification time)
+    @return: a string, or None if one of the text files does not exist """
+
+    parts = [f"v{FORMAT_VERSION}"]
+    for name in SOURCE_FILES:
+        path = os.path.join(data_folder, name)
+        if not os.path.exists(path):
+            return None
+        st = os.stat(path)
+        parts.append(f"{name}:{st.st_size}:{st.st_mtime_ns}")
+
+    return "|".join(parts)
+
+
+def save(scenario, file_name, key=""):
+    """ Write a scenario (as returned by read_text) into a compiled .npz file. The file is written
+    under a temporary name in the same folder and then renamed, so a process loading the scenario
+    at the same time reads either the former file or the new one, never a partial file """
+
+    temp_name = f"{file_name}.{os.getpid()}.tmp"     # one per process: batch.py may compile in several
+    try:
+        with open(temp_name, "wb") as f:
+            np.savez(f,
+                     version=np.array(FORMAT_VERSION),
+                     key=np.array(key),
+                     config=np.array(json.dumps(scenario["config"])),
+                     obst=scenario["obst"],
+                     victims=scenario["victims"],
+                     signals=scenario["signals"])
+        os.replace(temp_name, file_name)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+
+
+def read_compiled(file_name):
+    """ Read a compiled .npz file
+    @return: the scenario dictionary and the key of the text files it was compiled from """
+
+    with np.load(file_name, allow_pickle=False) as data:
+        if int(data["version"]) != FORMAT_VERSION:
+            raise ValueError(f"{file_name}: format version {int(data['version'])}, expected {FORMAT_VERSION}")
+
+        scenario = {"config": json.loads(str(data["config"])),
+                    "obst": data["obst"],
+                    "victims": data["victims"],
+                    "signals": data["signals"]}
+        return scenario, str(data["key"])
+
+
+def compile_scenario(data_folder, file_name=None):
+    """ Parse the text files of a scenario and write the compiled file
+    @param file_name: the compiled file; by default COMPILED_FILE in the data folder
+    @return: the scenario dictionary """
+
+    if file_name is None:
+        file_name = os.path.join(data_folder, COMPILED_FILE)
+
+    scenario = read_text(data_folder)
+    save(scenario, file_name, source_key(data_folder))
+    return scenario
+
+
+def load(data_folder, use_cache=True):
+    """ Load a scenario. The compiled file is used when it is up to date with the text files
+    (or when there are no text files). Otherwise, the text files are parsed and, if possible,
+    compiled for the next time.
+    @param use_cache: False to always parse the text files
+    @return: the scenario dictionary (see read_text) """
+
+    compiled = os.path.join(data_folder, COMPILED_FILE)
+    if not use_cache:
+        return read_text(data_folder)
+
+    key = source_key(data_folder)
+    if os.path.exists(compiled):
+        try:
+            scenario, compiled_key = read_compiled(compiled)
+            if key is None or key == compiled_key:
+                return scenario
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+            print(f"ENV: ignoring compiled scenario {compiled}: {e}")
+
+    scenario = read_text(data_folder)
+    try:
+        save(scenario, compiled, key)
+    except OSError as e:
+        print(f"ENV: could not write compiled scenario {compiled}: {e}")
+
+    return scenario
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile the text files of scenarios into " + COMPILED_FILE)
+    parser.add_argument("data_folders", nargs="+", help="folders with env_config.txt, env_obst.txt, env_victims.txt and env_vital_signals.txt")
+    parser.add_argument("-o", "--output", help="output file (only with one folder); default: <folder>/" + COMPILED_FILE)
+    args = parser.parse_args()
+
+    if args.output and len(args.data_folders) > 1:
+        parser.error("--output requires a single data folder")
+
+    for folder in args.data_folders:
+        out = args.output or os.path.join(folder, COMPILED_FILE)
+        scenario = compile_scenario(folder, out)
+        print(f"{folder}: {scenario['obst'].shape[0]}x{scenario['obst'].shape[1]} grid, "
+              f"{len(scenario['victims'])} victims -> {out}")